@@ -3,7 +3,7 @@ from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
 class ArgsUtils():
 
     @staticmethod
-    def initialiseParser(scriptUsesMealieApi: bool = False):
+    def initialiseParser(scriptUsesMealieApi: bool = False, scriptPreprocessesImages: bool = False):
         parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
 
         parser.add_argument(
@@ -51,4 +51,45 @@ class ArgsUtils():
                 default=3600 # 1 hour
             )
 
+        if scriptPreprocessesImages:
+            parser.add_argument(
+                "--targetDpi",
+                help="Resolution images are downscaled to before OCR. Set to 0 to keep their resolution.",
+                type=int,
+                default=0
+            )
+
+            parser.add_argument(
+                "--sourceDpi",
+                help="Resolution of images without resolution metadata, used when downscaling",
+                type=int,
+                default=300
+            )
+
+            parser.add_argument(
+                "--grayscale",
+                help="Convert images to grayscale before OCR",
+                action="store_true"
+            )
+
+            parser.add_argument(
+                "--binarise",
+                help="Convert images to black and white before OCR",
+                action="store_true"
+            )
+
+            parser.add_argument(
+                "--deskew",
+                help="Straighten images rotated by up to 5 degrees before OCR",
+                action="store_true"
+            )
+
+            parser.add_argument(
+                "--ocrRegion",
+                help="Only run OCR on this region of images, as 'left,top,right,bottom' fractions of their "
+                     "width and height (e.g. '0,0,1,0.3' for the top 30%%), or 'title' for the band of "
+                     "largest text near the top",
+                default=None
+            )
+
         return parser
@@ -0,0 +1,115 @@
+import numpy as np
+import re
+import unicodedata
+
+from models.Recipe import Recipe
+from scipy import sparse
+from typing import Iterator
+
+
+htmlTagPattern = re.compile(r"<[^>]+>")
+wordPattern = re.compile(r"[a-z0-9]+")
+
+
+# Lowercase words without accents (much faster than slugify() on whole instructions)
+def splitWords(text: str) -> list[str]:
+    asciiText = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    return wordPattern.findall(asciiText)
+
+
+# Words of a recipe's ingredients (foods and notes) and instructions, lowercased and without
+# accents. Parsed foods are also added as whole terms, so "pommes de terre" counts as one food.
+def recipeTerms(recipe: Recipe, minWordLength: int = 3) -> list[str]:
+    texts = []
+    terms = []
+
+    for ingredient in recipe.ingredients:
+        texts.append(ingredient.note or "")
+
+        if ingredient.food and ingredient.food.name:
+            foodWords = splitWords(ingredient.food.name)
+            terms.append(f"food:{'-'.join(foodWords)}")
+            texts.append(" ".join(foodWords))
+
+    for step in recipe.instructions:
+        texts.append(htmlTagPattern.sub(" ", step.text or ""))
+
+    for text in texts:
+        terms.extend(
+            word
+            for word in splitWords(text)
+            if len(word) >= minWordLength and not word.isdigit()
+        )
+
+    return terms
+
+
+# Builds the L2-normalised TF-IDF matrix (one row per document, one column per term) of tokenised
+# documents. Term frequencies are dampened (1 + log(count)) and terms found in more than
+# maxDocumentFrequency of the documents are dropped, since they say little about similarity and
+# would make the similarity products much denser.
+def buildTfidfMatrix(documents: list[list[str]], maxDocumentFrequency: float = 0.5) -> sparse.csr_matrix:
+    vocabulary: dict[str, int] = {}
+    rows = []
+    columns = []
+    counts = []
+
+    for i, terms in enumerate(documents):
+        termCounts: dict[int, int] = {}
+
+        for term in terms:
+            column = vocabulary.setdefault(term, len(vocabulary))
+            termCounts[column] = termCounts.get(column, 0) + 1
+
+        rows.extend([i] * len(termCounts))
+        columns.extend(termCounts.keys())
+        counts.extend(termCounts.values())
+
+    shape = (len(documents), len(vocabulary))
+    matrix = sparse.csr_matrix((np.array(counts, dtype=np.float64), (rows, columns)), shape=shape)
+
+    documentFrequencies = np.bincount(matrix.indices, minlength=len(vocabulary))
+    idf = np.log((1 + len(documents)) / (1 + documentFrequencies)) + 1
+    idf[documentFrequencies > max(1, maxDocumentFrequency * len(documents))] = 0
+
+    matrix.data = 1 + np.log(matrix.data)
+    matrix = matrix @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+
+    matrix = sparse.diags(1 / norms) @ matrix
+    matrix.eliminate_zeros()
+
+    return matrix.tocsr()
+
+
+# Yields the pairs (i, j), i < j, of rows with a cosine similarity of at least minSimilarity,
+# sorted. Similarities are computed chunkSize rows at a time with sparse products, so only one
+# chunk's similarities are held in memory.
+def findSimilarDocuments(matrix: sparse.csr_matrix,
+                         minSimilarity: float,
+                         chunkSize: int = 256) -> Iterator[tuple[int, int, float]]:
+    transposed = matrix.T.tocsc()
+
+    for start in range(0, matrix.shape[0], chunkSize):
+        similarities = (matrix[start:start + chunkSize] @ transposed).tocoo()
+
+        # Only the upper triangle, without each row's similarity with itself
+        mask = (similarities.col > similarities.row + start) & (similarities.data >= minSimilarity)
+        rows = similarities.row[mask]
+        columns = similarities.col[mask]
+        values = similarities.data[mask]
+        order = np.lexsort((columns, rows))
+
+        for row, column, value in zip(rows[order].tolist(), columns[order].tolist(), values[order].tolist()):
+            yield start + row, column, value
+
+
+# Yields (i, j, similarity) for each pair of recipes with similar ingredients and instructions
+def findSimilarRecipes(recipes: list[Recipe],
+                       minSimilarity: float,
+                       chunkSize: int = 256) -> Iterator[tuple[int, int, float]]:
+    matrix = buildTfidfMatrix([recipeTerms(r) for r in recipes])
+
+    return findSimilarDocuments(matrix, minSimilarity, chunkSize)
@@ -0,0 +1,33 @@
+import unittest
+
+from ContentSimilarity import buildTfidfMatrix, findSimilarDocuments
+
+
+class TestFindSimilarDocuments(unittest.TestCase):
+    def test_whenChunkedThenSameAsFullProduct(self):
+        # Arrange
+        documents = [
+            ["poulet", "beurre", "tomate", "creme", "cari"],
+            ["poulet", "beurre", "tomate", "creme", "garam"],
+            ["boeuf", "oignon", "vin", "carotte"],
+            ["boeuf", "oignon", "vin", "champignon"],
+            ["laitue", "croutons", "parmesan", "citron"],
+            ["poulet", "laitue", "croutons", "parmesan"],
+            [],
+        ]
+        matrix = buildTfidfMatrix(documents, maxDocumentFrequency=1.0)
+        similarities = (matrix @ matrix.T).toarray()
+        minSimilarity = 0.3
+        expectedResult = [
+            (i, j)
+            for i in range(len(documents))
+            for j in range(i + 1, len(documents))
+            if similarities[i, j] >= minSimilarity
+        ]
+
+        # Act
+        result = [(i, j) for i, j, _ in findSimilarDocuments(matrix, minSimilarity, chunkSize=2)]
+
+        # Assert
+        self.assertEqual(result, expectedResult, "Expected same pairs as the full similarity matrix")
+        self.assertTrue(expectedResult, "Expected some similar documents")
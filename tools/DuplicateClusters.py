@@ -0,0 +1,43 @@
+# Union-find (i.e. disjoint set) of recipe slugs. Potential duplicate pairs are merged into
+# clusters of recipes that are all similar to each other, directly or through other recipes, so
+# e.g. 3 versions of a recipe show up as one cluster instead of 3 overlapping pairs.
+class DuplicateClusters():
+    def __init__(self) -> None:
+        self.parents: dict[str, str] = {}
+        self.sizes: dict[str, int] = {}
+
+    def find(self, slug: str) -> str:
+        if slug not in self.parents:
+            self.parents[slug] = slug
+            self.sizes[slug] = 1
+            return slug
+
+        # Path halving: each visited slug skips to its grandparent, keeping trees shallow
+        while self.parents[slug] != slug:
+            self.parents[slug] = self.parents[self.parents[slug]]
+            slug = self.parents[slug]
+
+        return slug
+
+    def union(self, slug: str, other: str) -> None:
+        root = self.find(slug)
+        otherRoot = self.find(other)
+
+        if root == otherRoot:
+            return
+
+        # Smaller cluster goes under the larger one
+        if self.sizes[root] < self.sizes[otherRoot]:
+            root, otherRoot = otherRoot, root
+
+        self.parents[otherRoot] = root
+        self.sizes[root] += self.sizes[otherRoot]
+
+    # Returns each cluster's sorted slugs, sorted by first slug
+    def getClusters(self) -> list[list[str]]:
+        clusters: dict[str, list[str]] = {}
+
+        for slug in self.parents:
+            clusters.setdefault(self.find(slug), []).append(slug)
+
+        return sorted(sorted(c) for c in clusters.values())
@@ -0,0 +1,35 @@
+import unittest
+
+from DuplicateClusters import DuplicateClusters
+
+
+class TestDuplicateClusters(unittest.TestCase):
+    def test_whenPairsOverlapThenSameCluster(self):
+        # Arrange
+        clusters = DuplicateClusters()
+        pairs = [
+            ("poulet-au-beurre", "poulet-au-beurre-2"),
+            ("salade-cesar", "salade-cesar-maison"),
+            ("poulet-au-beurre-2", "poulet-beurre"),
+            ("poulet-beurre", "poulet-au-beurre"),
+        ]
+        expectedResult = [
+            ["poulet-au-beurre", "poulet-au-beurre-2", "poulet-beurre"],
+            ["salade-cesar", "salade-cesar-maison"],
+        ]
+
+        # Act
+        for slug, other in pairs:
+            clusters.union(slug, other)
+
+        result = clusters.getClusters()
+
+        # Assert
+        self.assertEqual(result, expectedResult, "Expected overlapping pairs to be merged")
+
+    def test_whenNoPairsThenNoClusters(self):
+        # Act
+        result = DuplicateClusters().getClusters()
+
+        # Assert
+        self.assertEqual(result, [], "Expected no clusters")
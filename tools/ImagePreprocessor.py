@@ -0,0 +1,239 @@
+import math
+import numpy as np
+
+from MealieOcr import MealieOcr
+from PIL import Image
+
+
+# Where a preprocessed image's pixels come from in the original image, so OCR coordinates can be
+# mapped back to it
+class PreprocessingTransform():
+    def __init__(self, offset: tuple[int, int] = (0, 0), scale: float = 1, angle: float = 0, size: tuple[int, int] = None) -> None:
+        self.offset = offset  # Top left corner of the cropped region, in original pixels
+        self.scale = scale    # Preprocessed pixels per original pixel
+        self.angle = angle    # Degrees the image was rotated counterclockwise by, around its centre
+        self.size = size      # Size of the rotated image, in preprocessed pixels
+
+    # Boxes keep their size and are moved so their centre matches the original image. Rotated
+    # boxes aren't rotated back, since skew is at most a few degrees.
+    def restoreCoordinates(self, ocrData) -> MealieOcr.OcrResult:
+        result = MealieOcr.OcrResult.fromChunks(ocrData)
+        left = result.columns["left"].astype(np.float64)
+        top = result.columns["top"].astype(np.float64)
+        width = result.columns["width"].astype(np.float64)
+        height = result.columns["height"].astype(np.float64)
+
+        if self.angle:
+            # Inverse of PIL's Image.rotate(), which maps output pixels back to input pixels the same way
+            centreX, centreY = self.size[0] / 2, self.size[1] / 2
+            x = left + width / 2 - centreX
+            y = top + height / 2 - centreY
+            radians = -math.radians(self.angle)
+            left = math.cos(radians) * x + math.sin(radians) * y + centreX - width / 2
+            top = -math.sin(radians) * x + math.cos(radians) * y + centreY - height / 2
+
+        columns = dict(result.columns)
+        columns["left"] = np.rint(left / self.scale + self.offset[0]).astype(np.int32)
+        columns["top"] = np.rint(top / self.scale + self.offset[1]).astype(np.int32)
+        columns["width"] = np.rint(width / self.scale).astype(np.int32)
+        columns["height"] = np.rint(height / self.scale).astype(np.int32)
+
+        return MealieOcr.OcrResult(columns, result.conf, result.text, result.textOffsets)
+
+
+# Prepares scans for Tesseract, which is faster and usually more accurate on small black and white
+# images than on high resolution colour photos of pages. Steps run in this order, each optional:
+# * Crop to a region of interest, given as fractions of the image's width and height, or to the
+#   band of the title (titleRegion, see findTitleRegion())
+# * Downscale to targetDpi, using the image's DPI metadata or sourceDpi when it has none
+# * Convert to grayscale
+# * Deskew: find the rotation (up to maxSkew degrees) giving the sharpest horizontal text lines
+# * Binarise with Otsu's threshold
+#
+# Deskewing and binarising imply grayscale. OCR coordinates are mapped back to the original image,
+# so results can be used the same way as results on unprocessed images.
+class ImagePreprocessor():
+    titleRegion = "title"
+
+    def __init__(self,
+                 targetDpi: int = None,
+                 sourceDpi: int = 300,
+                 grayscale: bool = False,
+                 binarise: bool = False,
+                 deskew: bool = False,
+                 maxSkew: float = 5,
+                 region: tuple[float, float, float, float] | str = None) -> None:
+        self.targetDpi = targetDpi
+        self.sourceDpi = sourceDpi
+        self.grayscale = grayscale or binarise or deskew
+        self.binarise = binarise
+        self.deskew = deskew
+        self.maxSkew = maxSkew
+        self.region = region if region == ImagePreprocessor.titleRegion or not region else tuple(region)
+
+    # Returns None when no preprocessing is requested
+    @staticmethod
+    def fromArgs(args) -> "ImagePreprocessor":
+        region = args.ocrRegion
+
+        if region and region != ImagePreprocessor.titleRegion:
+            region = [float(r) for r in region.split(",")]
+
+            if len(region) != 4 or not 0 <= region[0] < region[2] <= 1 or not 0 <= region[1] < region[3] <= 1:
+                raise ValueError(
+                    f"Invalid OCR region '{args.ocrRegion}'; expected '{ImagePreprocessor.titleRegion}' or "
+                    "'left,top,right,bottom' fractions between 0 and 1"
+                )
+
+        preprocessor = ImagePreprocessor(
+            targetDpi=args.targetDpi or None,
+            sourceDpi=args.sourceDpi,
+            grayscale=args.grayscale,
+            binarise=args.binarise,
+            deskew=args.deskew,
+            region=region
+        )
+
+        return preprocessor if preprocessor.isEnabled() else None
+
+    def isEnabled(self) -> bool:
+        return bool(self.targetDpi or self.grayscale or self.region)
+
+    # Everything that changes the preprocessed image, e.g. to tell cached OCR results apart
+    def getParameters(self) -> dict:
+        return {
+            "targetDpi": self.targetDpi,
+            "sourceDpi": self.sourceDpi if self.targetDpi else None,
+            "grayscale": self.grayscale,
+            "binarise": self.binarise,
+            "maxSkew": self.maxSkew if self.deskew else None,
+            "region": list(self.region) if isinstance(self.region, tuple) else self.region
+        }
+
+    def process(self, image: Image.Image) -> tuple[Image.Image, PreprocessingTransform]:
+        transform = PreprocessingTransform()
+        sourceDpi = image.info.get("dpi", (self.sourceDpi,))[0] or self.sourceDpi
+
+        if self.region:
+            width, height = image.size
+            left, top, right, bottom = self.findTitleRegion(image) if self.region == ImagePreprocessor.titleRegion else self.region
+            box = (round(left * width), round(top * height), round(right * width), round(bottom * height))
+            image = image.crop(box)
+            transform.offset = box[:2]
+
+        if self.targetDpi and self.targetDpi < sourceDpi:
+            transform.scale = self.targetDpi / sourceDpi
+            size = (max(1, round(image.width * transform.scale)), max(1, round(image.height * transform.scale)))
+
+            # Grayscale first, so there's less to resample
+            if self.grayscale:
+                image = image.convert("L")
+
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        if self.grayscale:
+            image = image.convert("L")
+
+        if self.deskew:
+            transform.angle = self.findSkewAngle(image)
+            transform.size = image.size
+
+            if transform.angle:
+                image = image.rotate(transform.angle, resample=Image.Resampling.BICUBIC, fillcolor=255)
+
+        if self.binarise:
+            threshold = self.findThreshold(np.asarray(image))
+            image = image.point([0 if i <= threshold else 255 for i in range(256)])
+
+        return image, transform
+
+    # Otsu's method: the threshold best separating dark and light pixels into 2 classes
+    @staticmethod
+    def findThreshold(pixels: np.ndarray) -> int:
+        histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+        levels = np.arange(256)
+        darkCounts = np.cumsum(histogram)
+        darkSums = np.cumsum(histogram * levels)
+        lightCounts = darkCounts[-1] - darkCounts
+        lightSums = darkSums[-1] - darkSums
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variances = darkCounts * lightCounts * (darkSums / darkCounts - lightSums / lightCounts) ** 2
+
+        return int(np.nanargmax(variances)) if np.any(np.isfinite(variances)) else 127
+
+    # Region of the page's title, as fractions of the image's width and height: the lines with the
+    # largest text in the top searchHeight of the page, found from dark pixel counts per row of a
+    # small copy of the image. Lines are rows with some dark pixels, and rows mostly dark (e.g.
+    # photos) or lines taller than maxLineHeight of the page aren't text. Title lines right below
+    # each other are kept together. The whole search area is returned when no line is found.
+    @staticmethod
+    def findTitleRegion(image: Image.Image,
+                        searchHeight: float = 0.4,
+                        maxLineHeight: float = 0.1,
+                        width: int = 600) -> tuple[float, float, float, float]:
+        thumbnail = image.convert("L")
+        thumbnail.thumbnail((width, width * 4))
+        pixels = np.asarray(thumbnail)
+        pixels = pixels[:max(1, round(pixels.shape[0] * searchHeight))]
+        darkRatios = (pixels <= ImagePreprocessor.findThreshold(pixels)).mean(axis=1)
+        isText = (darkRatios > 0.005) & (darkRatios < 0.5)
+
+        # Runs of text rows, as (top, bottom) row pairs. Runs a row or 2 apart are the same line
+        # (e.g. accents or ascenders above lowercase letters).
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], isText.astype(np.int8), [0])))).tolist()
+        runs = []
+
+        for top, bottom in zip(edges[::2], edges[1::2]):
+            if runs and top - runs[-1][1] <= 2:
+                runs[-1] = (runs[-1][0], bottom)
+            else:
+                runs.append((top, bottom))
+
+        pageHeight = thumbnail.height
+        lines = [(top, bottom) for top, bottom in runs if 1 < bottom - top <= maxLineHeight * pageHeight]
+
+        if not lines:
+            return 0, 0, 1, searchHeight
+
+        titleIndex = max(range(len(lines)), key=lambda i: lines[i][1] - lines[i][0])
+        lineHeight = lines[titleIndex][1] - lines[titleIndex][0]
+        first = last = titleIndex
+
+        def isTitleLine(i: int, previous: int) -> bool:
+            top, bottom = lines[i]
+            gap = top - lines[previous][1] if i > previous else lines[previous][0] - bottom
+
+            return bottom - top >= 0.7 * lineHeight and gap <= lineHeight
+
+        while first > 0 and isTitleLine(first - 1, first):
+            first -= 1
+
+        while last < len(lines) - 1 and isTitleLine(last + 1, last):
+            last += 1
+
+        # Some margin, so letters touching the band's edges are fully kept
+        top = max(0, lines[first][0] - lineHeight / 2) / pageHeight
+        bottom = min(pixels.shape[0], lines[last][1] + lineHeight / 2) / pageHeight
+
+        return 0, top, 1, bottom
+
+    # Projection profile: rows of text lines up with pixel rows at the right angle, so dark pixel
+    # counts per row change most sharply between text lines and the gaps between them. Angles are
+    # tried on a small copy of the image, a degree apart then refined around the best one.
+    def findSkewAngle(self, image: Image.Image, width: int = 800) -> float:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((width, width * 4))
+        pixels = np.asarray(thumbnail)
+        dark = Image.fromarray(((pixels <= self.findThreshold(pixels)) * 255).astype(np.uint8))
+
+        def score(angle: float) -> float:
+            rows = np.asarray(dark.rotate(angle, resample=Image.Resampling.NEAREST), dtype=np.float64).sum(axis=1)
+            return float(np.sum(np.diff(rows) ** 2))
+
+        steps = int(self.maxSkew)
+        bestAngle = max(range(-steps, steps + 1), key=lambda a: (score(a), -abs(a)))
+        angles = np.clip(np.arange(bestAngle - 0.9, bestAngle + 0.95, 0.1), -self.maxSkew, self.maxSkew)
+        bestAngle = max((round(float(a), 1) for a in angles), key=lambda a: (score(a), -abs(a)))
+
+        return bestAngle
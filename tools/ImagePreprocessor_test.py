@@ -0,0 +1,87 @@
+import numpy as np
+import unittest
+
+from ImagePreprocessor import ImagePreprocessor
+from MealieOcr import MealieOcr
+from PIL import Image, ImageDraw, ImageFont
+
+
+# Page with lines of "text" and a square at the given box
+def createPage(squareBox: tuple[int, int, int, int], angle: float = 0) -> Image.Image:
+    image = Image.new("RGB", (1200, 1600), (250, 245, 235))
+    draw = ImageDraw.Draw(image)
+
+    for top in range(100, 1500, 50):
+        draw.rectangle((100, top, 1100, top + 20), fill=(30, 30, 30))
+
+    draw.rectangle(squareBox, fill=(200, 0, 0))
+
+    return image.rotate(angle, resample=Image.Resampling.BICUBIC, fillcolor=(250, 245, 235))
+
+
+# OCR result with a single word at the given box
+def createResult(left: int, top: int, width: int, height: int) -> MealieOcr.OcrResult:
+    values = [5, 1, 1, 1, 1, 1, left, top, width, height]
+    columns = {name: np.array([v], dtype=np.int32) for name, v in zip(MealieOcr.OcrResult.intColumns, values)}
+
+    return MealieOcr.OcrResult.fromTexts(columns, np.array([95.0]), ["Poulet"])
+
+
+# Box of the red square in a preprocessed colour page
+def findSquare(image: Image.Image) -> tuple[int, int, int, int]:
+    pixels = np.asarray(image, dtype=np.int32)
+    ys, xs = np.nonzero(pixels[:, :, 0] - pixels[:, :, 1] > 100)
+
+    return int(xs.min()), int(ys.min()), int(xs.max() - xs.min() + 1), int(ys.max() - ys.min() + 1)
+
+
+class TestImagePreprocessor(unittest.TestCase):
+    def test_whenPageRotatedThenSkewFound(self):
+        # Arrange
+        preprocessor = ImagePreprocessor(binarise=True, deskew=True)
+        page = createPage((500, 700, 540, 740), angle=-3)
+
+        # Act
+        image, transform = preprocessor.process(page)
+
+        # Assert
+        self.assertEqual(transform.angle, 3, "Expected rotation straightening the page")
+        self.assertEqual(image.mode, "L", "Expected grayscale image")
+        self.assertEqual(set(np.unique(np.asarray(image)).tolist()), {0, 255}, "Expected black and white image")
+
+    def test_whenCroppedAndDownscaledThenCoordinatesRestored(self):
+        # Arrange
+        preprocessor = ImagePreprocessor(targetDpi=150, sourceDpi=300, region=(0.25, 0.25, 1, 1))
+        page = createPage((600, 800, 680, 840))
+        image, transform = preprocessor.process(page)
+        left, top, width, height = findSquare(image)
+
+        # Act
+        result = transform.restoreCoordinates(createResult(left, top, width, height))
+
+        # Assert
+        self.assertEqual(image.size, (450, 600), "Expected cropped image at half resolution")
+        chunk = result[0]
+        self.assertAlmostEqual(chunk.left, 600, delta=2, msg="Expected left in original image")
+        self.assertAlmostEqual(chunk.top, 800, delta=2, msg="Expected top in original image")
+        self.assertAlmostEqual(chunk.width, 81, delta=2, msg="Expected width in original image")
+        self.assertEqual(chunk.text, "Poulet", "Expected text to be kept")
+
+    def test_whenPageHasTitleThenTitleRegionFound(self):
+        # Arrange
+        page = Image.new("RGB", (1200, 1600), (250, 245, 235))
+        draw = ImageDraw.Draw(page)
+        page.paste((90, 120, 60), (0, 0, 1200, 250)) # Photo
+        draw.text((100, 300), "Poulet beurré", font=ImageFont.load_default(size=60), fill=(30, 30, 30))
+        draw.text((100, 380), "et riz au jasmin", font=ImageFont.load_default(size=60), fill=(30, 30, 30))
+
+        for top in range(500, 1500, 30):
+            draw.text((100, top), "Ingrédients et étapes", font=ImageFont.load_default(size=20), fill=(30, 30, 30))
+
+        # Act
+        left, top, right, bottom = ImagePreprocessor.findTitleRegion(page)
+
+        # Assert
+        self.assertLessEqual(top * 1600, 300, "Expected title's first line in region")
+        self.assertGreaterEqual(bottom * 1600, 440, "Expected title's second line in region")
+        self.assertLess(bottom * 1600, 500, "Expected ingredients not to be in region")
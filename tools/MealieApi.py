@@ -179,27 +179,36 @@ class MealieApi():
 
         return r.status_code == 200
 
-    def getRecipe(self, recipeTitle: str) -> Recipe:
+    def getRecipe(self, recipeTitle: str, useCache: bool = True) -> Recipe:
         self.logger.debug(f"Getting recipe '{recipeTitle}'")
 
         slug = slugify(recipeTitle)
         url = f"{self.url}/api/recipes/{slug}"
-        r = self.session.get(url, auth=BearerAuth(self.token), verify=self.requestVerify)
 
-        if r.status_code == 200:
-            return Recipe.from_json(r.json())
+        if useCache:
+            r = self.session.get(url, auth=BearerAuth(self.token), verify=self.requestVerify)
+        else:
+            with self.session.cache_disabled():
+                r = self.session.get(url, auth=BearerAuth(self.token), verify=self.requestVerify)
 
-        return None
+        # Only a missing recipe returns None, so failed requests aren't mistaken for deleted recipes
+        if r.status_code == 404:
+            return None
 
-    def getAllRecipes(self) -> list[Recipe]:
-        self.logger.debug(f"Getting all recipes")
+        r.raise_for_status()
+
+        return Recipe.from_json(r.json())
+
+    # Returns the raw recipe summaries (id, slug, updateAt, etc.) without fetching full recipes
+    def getAllRecipeSummaries(self) -> list[dict]:
+        self.logger.debug("Getting all recipe summaries")
 
         url = f"{self.url}/api/recipes"
 
         page = 1
         totalPages = 1 # Small number to reduce loop count in case of logic error
 
-        slugs = []
+        summaries = []
 
         while page <= totalPages:
             params = {
@@ -209,15 +218,55 @@ class MealieApi():
             response = r.json()
             totalPages = response["total_pages"]
 
-            for item in response["items"]:
-                slugs.append(item["slug"])
+            summaries.extend(response["items"])
 
             page += 1
 
+        return summaries
+
+    # Returns the raw summaries of recipes updated at or after updatedSince, most recently updated
+    # first. Pages are only fetched until an older recipe shows up, so checking for changes usually
+    # takes a single request. Responses are never cached.
+    def getRecipeSummariesUpdatedSince(self, updatedSince: str, perPage: int = 50) -> list[dict]:
+        self.logger.debug(f"Getting recipe summaries updated since {updatedSince}")
+
+        url = f"{self.url}/api/recipes"
+
+        page = 1
+        totalPages = 1 # Small number to reduce loop count in case of logic error
+
+        summaries = []
+
+        with self.session.cache_disabled():
+            while page <= totalPages:
+                params = {
+                    "page": page,
+                    "perPage": perPage,
+                    "orderBy": "updateAt",
+                    "orderDirection": "desc"
+                }
+                r = self.session.get(url, auth=BearerAuth(self.token), verify=self.requestVerify, params=params)
+                r.raise_for_status()
+                response = r.json()
+                totalPages = response["total_pages"]
+
+                for summary in response["items"]:
+                    if updatedSince and (summary.get("updateAt") or "") < updatedSince:
+                        return summaries
+
+                    summaries.append(summary)
+
+                page += 1
+
+        return summaries
+
+    def getAllRecipes(self) -> list[Recipe]:
+        self.logger.debug(f"Getting all recipes")
+
         recipes: list[Recipe] = []
 
-        for slug in slugs:
-            recipe = self.getRecipe(slug)
+        for summary in self.getAllRecipeSummaries():
+            recipe = self.getRecipe(summary["slug"])
             recipes.append(recipe)
 
         return recipes
@@ -308,6 +357,29 @@ class MealieApi():
         r = self.session.patch(url, auth=BearerAuth(self.token), json=data, verify=self.requestVerify)
         r.raise_for_status()
 
+    # Adds tags to several recipes in a single call; existing recipe tags are kept
+    def bulkTagRecipes(self, recipeSlugs: list[str], tags: list[RecipeTag]) -> None:
+        self.logger.debug(f"Bulk tagging recipes {recipeSlugs} with tags: {tags}")
+
+        url = f"{self.url}/api/recipes/bulk-actions/tag"
+        data = {
+            "recipes": recipeSlugs,
+            "tags": [t.to_json() for t in tags]
+        }
+
+        r = self.session.post(url, auth=BearerAuth(self.token), json=data, verify=self.requestVerify)
+        r.raise_for_status()
+
+    # Patches several recipes in a single call; each patch needs the recipe's "id" and "slug" along
+    # with the fields to update
+    def patchRecipes(self, patches: list[dict]) -> None:
+        self.logger.debug(f"Patching {len(patches)} recipes")
+
+        url = f"{self.url}/api/recipes"
+
+        r = self.session.patch(url, auth=BearerAuth(self.token), json=patches, verify=self.requestVerify)
+        r.raise_for_status()
+
     def updateRecipeServings(self, recipeSlug: str, servingsText: str) -> None:
         self.logger.debug(f"Updating recipe '{recipeSlug}' with servings: {servingsText}")
 
@@ -330,22 +402,37 @@ class MealieApi():
         r = self.session.patch(url, auth=BearerAuth(self.token), json=data, verify=self.requestVerify)
         r.raise_for_status()
 
-    def runOcrOnFile(self, filePath: str):
+    def getAppVersion(self) -> str:
+        url = f"{self.url}/api/app/about"
+
+        with self.session.cache_disabled():
+            r = self.session.get(url, auth=BearerAuth(self.token), verify=self.requestVerify)
+
+        r.raise_for_status()
+
+        return r.json()["version"]
+
+    # timeout is in seconds; None waits for the server indefinitely
+    def runOcrOnFile(self, filePath: str, timeout: float = None):
         self.logger.debug(f"Running OCR on '{filePath}'")
 
         with open(filePath, 'rb') as file:
+            return self.runOcrOnImage(file.read(), os.path.basename(filePath), timeout)
 
-            url = f"{self.url}/api/ocr/file-to-tsv"
-            data = {
-                "file": file
-            }
+    # Same as runOcrOnFile(), for images in memory (e.g. preprocessed scans)
+    def runOcrOnImage(self, imageData: bytes, fileName: str, timeout: float = None):
+        url = f"{self.url}/api/ocr/file-to-tsv"
+        data = {
+            "file": (fileName, imageData)
+        }
 
-            r = self.session.post(
-                url,
-                auth=BearerAuth(self.token),
-                files=data,
-                verify=self.requestVerify
-            )
-            r.raise_for_status()
+        r = self.session.post(
+            url,
+            auth=BearerAuth(self.token),
+            files=data,
+            verify=self.requestVerify,
+            timeout=timeout
+        )
+        r.raise_for_status()
 
         return r.json()
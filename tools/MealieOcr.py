@@ -1,4 +1,5 @@
 import json
+import numpy as np
 import pytesseract
 from io import BytesIO
 from PIL import Image
@@ -34,6 +35,9 @@ class MealieOcr:
 
         class Encoder(json.JSONEncoder):
             def default(self, obj):
+                if isinstance(obj, MealieOcr.OcrResult):
+                    return list(obj)
+
                 return {
                         "level": obj.level,
                         "pageNum": obj.page_num,
@@ -67,52 +71,246 @@ class MealieOcr:
 
                 return ocrChunk
 
-    def image_to_tsv(self, image_data, lang=None):
+    # OCR chunks of an image stored by column: levels, numbers, coordinates and confidences in
+    # typed arrays, and texts in one string with offsets, instead of one OcrChunk object per row.
+    # Iterating or indexing it gives OcrChunk objects, so it can be used like a list of chunks.
+    class OcrResult:
+        intColumns = ["level", "page_num", "block_num", "par_num", "line_num", "word_num", "left", "top", "width", "height"]
+
+        def __init__(self, columns: dict[str, np.ndarray], conf: np.ndarray, text: str, textOffsets: np.ndarray) -> None:
+            self.columns = columns
+            self.conf = conf
+            self.text = text
+
+            # Text of row i is text[textOffsets[i]:textOffsets[i + 1]]
+            self.textOffsets = textOffsets
+
+        def __len__(self) -> int:
+            return len(self.conf)
+
+        def __getitem__(self, i: int) -> "MealieOcr.OcrChunk":
+            if isinstance(i, slice):
+                return self.slice(*i.indices(len(self))[:2]) if i.step in (None, 1) else list(self)[i]
+
+            if i < 0:
+                i += len(self)
+
+            if not 0 <= i < len(self):
+                raise IndexError("OCR result index out of range")
+
+            chunk = MealieOcr.OcrChunk()
+
+            for name in self.intColumns:
+                setattr(chunk, name, int(self.columns[name][i]))
+
+            chunk.conf = float(self.conf[i])
+            chunk.text = self.getText(i)
+
+            return chunk
+
+        def __iter__(self):
+            # Columns are converted to lists once, which is much faster than indexing arrays per row
+            columns = [self.columns[name].tolist() for name in self.intColumns]
+            confs = self.conf.tolist()
+            offsets = self.textOffsets.tolist()
+
+            for i, values in enumerate(zip(*columns)):
+                chunk = MealieOcr.OcrChunk()
+
+                for name, value in zip(self.intColumns, values):
+                    setattr(chunk, name, value)
+
+                chunk.conf = confs[i]
+                chunk.text = self.text[offsets[i]:offsets[i + 1]]
+
+                yield chunk
+
+        # Rows start to stop, sharing this result's arrays and text
+        def slice(self, start: int, stop: int) -> "MealieOcr.OcrResult":
+            columns = {name: column[start:stop] for name, column in self.columns.items()}
+            textOffsets = self.textOffsets[start:max(start, stop) + 1]
+
+            return MealieOcr.OcrResult(columns, self.conf[start:stop], self.text, textOffsets)
+
+        # Rows at the given indices, in that order, copied to new arrays
+        def take(self, rows: list[int]) -> "MealieOcr.OcrResult":
+            rows = np.asarray(rows, dtype=np.int64)
+            columns = {name: column[rows] for name, column in self.columns.items()}
+            offsets = self.textOffsets.tolist()
+            texts = [self.text[offsets[i]:offsets[i + 1]] for i in rows.tolist()]
+
+            return MealieOcr.OcrResult.fromTexts(columns, self.conf[rows], texts)
+
+        def getText(self, i: int) -> str:
+            return self.text[self.textOffsets[i]:self.textOffsets[i + 1]]
+
+        # Confidences of recognised words, e.g. to compare OCR quality between settings
+        def getWordConfidences(self) -> np.ndarray:
+            words = (self.columns["level"] == 5) & (self.conf >= 0) & (np.diff(self.textOffsets) > 0)
+
+            return self.conf[words]
+
+        # Bytes used by the arrays and text
+        @property
+        def nbytes(self) -> int:
+            arrays = [*self.columns.values(), self.conf, self.textOffsets]
+
+            return sum(a.nbytes for a in arrays) + len(self.text.encode("utf-8"))
+
+        @staticmethod
+        def fromTexts(columns: dict[str, np.ndarray], conf: np.ndarray, texts: list[str]) -> "MealieOcr.OcrResult":
+            textOffsets = np.zeros(len(texts) + 1, dtype=np.int64)
+            np.cumsum([len(t) for t in texts], out=textOffsets[1:])
+
+            return MealieOcr.OcrResult(columns, conf, "".join(texts), textOffsets)
+
+        @staticmethod
+        def fromChunks(chunks: list["MealieOcr.OcrChunk"]) -> "MealieOcr.OcrResult":
+            if isinstance(chunks, MealieOcr.OcrResult):
+                return chunks
+
+            columns = {
+                name: np.array([getattr(c, name) for c in chunks], dtype=np.int32)
+                for name in MealieOcr.OcrResult.intColumns
+            }
+            conf = np.array([c.conf for c in chunks], dtype=np.float64)
+
+            return MealieOcr.OcrResult.fromTexts(columns, conf, [c.text for c in chunks])
+
+        # Parses Tesseract's TSV output a column at a time: cells are split all at once and each
+        # column is converted to an array by numpy, instead of converting cells one by one. Rows are
+        # parsed chunkSize at a time so split cells don't take more memory than the result.
+        @staticmethod
+        def fromTsv(tsv: str, chunkSize: int = 1024) -> "MealieOcr.OcrResult":
+            lines = tsv.split("\n")
+            titles = [t.strip() for t in lines[0].split("\t")]
+            lines = [line for line in lines[1:] if line]
+            width = len(titles)
+            # Numeric cells are padded with 0 like missing columns, other cells with empty text
+            padding = ["0" if t in MealieOcr.OcrResult.intColumns or t == "conf" else "" for t in titles]
+            columnChunks = {name: [] for name in MealieOcr.OcrResult.intColumns}
+            confChunks = []
+            texts = []
+
+            for start in range(0, len(lines), chunkSize):
+                chunkLines = lines[start:start + chunkSize]
+                rowCount = len(chunkLines)
+                cells = "\t".join(chunkLines).split("\t")
+
+                # Rows with missing or extra cells (e.g. stripped trailing tabs) are padded or cut one by one
+                if len(cells) != rowCount * width:
+                    cells = []
+
+                    for line in chunkLines:
+                        rowCells = line.split("\t", width - 1)
+                        cells.extend(rowCells + padding[len(rowCells):])
+
+                chunkTexts = None
+
+                for i, title in enumerate(titles):
+                    if title in columnChunks:
+                        columnChunks[title].append(np.array(cells[i::width], dtype=np.int32))
+                    elif title == "conf":
+                        confChunks.append(np.array(cells[i::width], dtype=np.float64))
+                    elif title == "text":
+                        chunkTexts = [v.strip() for v in cells[i::width]]
+
+                # Missing columns keep default values
+                for name, chunks in columnChunks.items():
+                    if len(chunks) * chunkSize < start + rowCount:
+                        chunks.append(np.zeros(rowCount, dtype=np.int32))
+
+                if len(confChunks) * chunkSize < start + rowCount:
+                    confChunks.append(np.zeros(rowCount, dtype=np.float64))
+
+                texts.extend(chunkTexts or [""] * rowCount)
+
+            columns = {
+                name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+                for name, chunks in columnChunks.items()
+            }
+            conf = np.concatenate(confChunks) if confChunks else np.zeros(0, dtype=np.float64)
+
+            return MealieOcr.OcrResult.fromTexts(columns, conf, texts)
+
+    # engine: "tesserocr" runs Tesseract in-process and keeps its language model loaded,
+    # "pytesseract" starts a tesseract process per image, "auto" uses tesserocr when installed.
+    # Images are prepared by preprocessor (an ImagePreprocessor) before OCR when given.
+    def __init__(self, engine: str = "auto", preprocessor=None) -> None:
+        self.engine = None
+        self.preprocessor = preprocessor
+
+        if engine != "pytesseract":
+            try:
+                # Only requires tesserocr when running Tesseract in-process
+                from TesseractEngine import TesseractEngine
+                self.engine = TesseractEngine()
+            except ImportError:
+                if engine == "tesserocr":
+                    raise
+
+    # Whether Tesseract can be run locally, in-process or with the tesseract binary
+    @staticmethod
+    def isAvailable() -> bool:
+        try:
+            from TesseractEngine import TesseractEngine
+            TesseractEngine.getVersion()
+            return True
+        except Exception:
+            pass
+
+        try:
+            pytesseract.get_tesseract_version()
+            return True
+        except Exception:
+            return False
+
+    # Name and version of the engine running OCR, e.g. to tell results of different engines apart
+    def getEngineVersion(self) -> tuple[str, str]:
+        if self.engine is not None:
+            return "tesserocr", self.engine.getVersion()
+
+        return "pytesseract", str(pytesseract.get_tesseract_version())
+
+    # image_data is an encoded image or a PIL image. timeout is in seconds; Tesseract is killed
+    # and a RuntimeError raised when it runs longer.
+    def image_to_tsv(self, image_data, lang=None, timeout=0):
+        image = image_data if isinstance(image_data, Image.Image) else Image.open(BytesIO(image_data))
+
         if lang is not None:
-            return pytesseract.image_to_data(Image.open(BytesIO(image_data)), lang=lang)
+            return pytesseract.image_to_data(image, lang=lang, timeout=timeout)
 
-        return pytesseract.image_to_data(Image.open(BytesIO(image_data)))
+        return pytesseract.image_to_data(image, timeout=timeout)
 
-    def format_tsv_output(self, tsv: str) -> list[OcrChunk]:
-        lines = tsv.split("\n")
-        titles = [t.strip() for t in lines[0].split("\t")]
-        response: list[MealieOcr.OcrChunk] = []
+    def format_tsv_output(self, tsv: str) -> OcrResult:
+        return MealieOcr.OcrResult.fromTsv(tsv)
 
-        for i in range(1, len(lines)):
-            if lines[i] == "":
-                continue
+    def runOcrOnFile(self, file: bytes, lang=None, timeout=0) -> OcrResult:
+        if self.preprocessor is None:
+            return self.runOcrOnImage(file, lang, timeout)
 
-            line = MealieOcr.OcrChunk()
-            for key, value in zip(titles, lines[i].split("\t"), strict=False):
-                if isinstance(getattr(line, key), str):
-                    setattr(line, key, value.strip())
-                elif isinstance(getattr(line, key), float):
-                    setattr(line, key, float(value.strip()))
-                elif isinstance(getattr(line, key), int):
-                    setattr(line, key, int(value.strip()))
-                else:
-                    continue
+        # Coordinates are mapped back to the original image
+        image, transform = self.preprocessor.process(Image.open(BytesIO(file)))
 
-            if isinstance(line, MealieOcr.OcrChunk):
-                response.append(line)
+        return transform.restoreCoordinates(self.runOcrOnImage(image, lang, timeout))
 
-        return response
+    def runOcrOnImage(self, image, lang=None, timeout=0) -> OcrResult:
+        if self.engine is not None:
+            return self.engine.runOcr(image, lang, timeout)
 
-    def runOcrOnFile(self, file: bytes, lang=None) -> list[OcrChunk]:
-        tsv = self.image_to_tsv(file, lang)
+        tsv = self.image_to_tsv(image, lang, timeout)
         return self.format_tsv_output(tsv)
 
-    def extractBlocks(self, ocrData: list[OcrChunk]) -> list[list[OcrChunk]]:
-        # Only keep block definitions (level 2) and their words (level 5)
-        filtered = [a for a in ocrData if a.level == 2 or a.level == 5]
-        blocks = [[MealieOcr.OcrChunk]]
-        blockNum = 1
-
-        for i, element in enumerate(filtered):
-            if i != 0 and filtered[i - 1].block_num != element.block_num:
-                blocks.append([])
-                blockNum = element.block_num
+    # Block definitions (level 2) and their words (level 5), one slice of rows per block in reading order
+    def extractBlocks(self, ocrData: list[OcrChunk]) -> list[OcrResult]:
+        # Imported here since OcrLayout depends on this module
+        from OcrLayout import OcrLayout
 
-            blocks[blockNum - 1].append(element)
+        layout = OcrLayout(ocrData)
+        blockRows = layout.getBlockRows()
+        rows = layout.result.take([r for b in blockRows for r in b])
+        offsets = np.zeros(len(blockRows) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blockRows], out=offsets[1:])
+        bounds = offsets.tolist()
 
-        return blocks
+        return [rows.slice(start, stop) for start, stop in zip(bounds, bounds[1:])]
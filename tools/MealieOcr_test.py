@@ -0,0 +1,60 @@
+import unittest
+
+from MealieOcr import MealieOcr
+
+
+tsv = "\n".join([
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+    "1\t1\t0\t0\t0\t0\t0\t0\t2550\t3300\t-1\t",
+    "2\t1\t1\t0\t0\t0\t100\t110\t2000\t160\t-1\t",
+    "5\t1\t1\t1\t1\t1\t100\t150\t300\t36\t96.5\tPoulet",
+    "5\t1\t1\t1\t1\t2\t420\t150\t200\t36\t91.061234\tbeurré",
+    "",
+])
+
+
+class TestMealieOcr(unittest.TestCase):
+    def test_whenParsingTsvThenChunksHaveRowValues(self):
+        # Act
+        result = MealieOcr().format_tsv_output(tsv)
+
+        # Assert
+        self.assertEqual(len(result), 4, "Expected one chunk per row")
+        self.assertEqual([c.level for c in result], [1, 2, 5, 5], "Expected levels of rows")
+        self.assertEqual([c.text for c in result], ["", "", "Poulet", "beurré"], "Expected texts of rows")
+        self.assertEqual(result[-1].conf, 91.061234, "Expected confidence of last row")
+        self.assertEqual(
+            (result[2].left, result[2].top, result[2].width, result[2].height),
+            (100, 150, 300, 36),
+            "Expected coordinates of first word"
+        )
+
+    def test_whenTrailingTabsStrippedThenSameChunks(self):
+        # Arrange
+        strippedTsv = "\n".join(line.rstrip("\t") for line in tsv.split("\n"))
+        expectedResult = [vars(c) for c in MealieOcr().format_tsv_output(tsv)]
+
+        # Act
+        result = [vars(c) for c in MealieOcr().format_tsv_output(strippedTsv)]
+
+        # Assert
+        self.assertEqual(result, expectedResult, "Expected missing cells to be empty texts")
+
+    def test_whenNumericCellsMissingThenDefaultValues(self):
+        # Arrange
+        shortTsv = "\n".join([
+            "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+            "1\t1\t0\t0\t0\t0\t0\t0\t2550\t3300\t-1\t",
+            "2\t1\t1\t0\t0\t0\t100\t110",
+            ""
+        ])
+
+        # Act
+        result = MealieOcr().format_tsv_output(shortTsv)
+
+        # Assert
+        self.assertEqual(
+            (result[1].level, result[1].top, result[1].width, result[1].height, result[1].conf, result[1].text),
+            (2, 110, 0, 0, 0.0, ""),
+            "Expected missing numeric cells to be 0 and missing text to be empty"
+        )
@@ -0,0 +1,157 @@
+import json
+import mmap
+import numpy as np
+import os
+import struct
+
+from MealieOcr import MealieOcr
+
+
+# Compact binary format for OCR data (".ocr" files), written and read by column. Files are memory
+# mapped when read, so loading one doesn't parse anything: columns are numpy arrays backed by the
+# file and only the text is decoded.
+#
+# Layout (little-endian, each section padded to 8 bytes):
+# * Header: magic, version, flags, row count, group count and text size in bytes
+# * One int32 array per MealieOcr.OcrResult integer column, then the float64 confidences
+# * int64 offsets of each row's text, in characters
+# * Grouped files only (e.g. OCR blocks): int64 offsets of each group's first row
+# * Texts of all rows, UTF-8 encoded
+#
+# JSON files written by previous versions (lists of chunks, or lists of blocks of chunks) can
+# still be loaded, and OCR data can be exported to JSON.
+class OcrCache():
+    extension = ".ocr"
+    magic = b"MOCR"
+    version = 1
+    header = struct.Struct("<4sHHIIQ")
+
+    # Set in the header's flags when the file holds groups of rows (e.g. OCR blocks)
+    groupedFlag = 1
+
+    @staticmethod
+    def padding(size: int) -> bytes:
+        return b"\0" * (-size % 8)
+
+    @staticmethod
+    def save(filePath: str, ocrData, groupOffsets: list[int] = None) -> None:
+        result = MealieOcr.OcrResult.fromChunks(ocrData)
+        text = result.text[result.textOffsets[0]:result.textOffsets[-1]].encode("utf-8")
+        isGrouped = groupOffsets is not None
+        groupCount = len(groupOffsets) - 1 if isGrouped else 0
+        arrays = [result.columns[name].astype("<i4") for name in MealieOcr.OcrResult.intColumns]
+        arrays.append(result.conf.astype("<f8"))
+
+        # Offsets of a sliced result don't start at 0
+        arrays.append((result.textOffsets - result.textOffsets[0]).astype("<i8"))
+
+        if isGrouped:
+            arrays.append(np.asarray(groupOffsets, dtype="<i8"))
+
+        # Written to a temporary file first, so an interrupted run doesn't leave a truncated file
+        temporaryPath = f"{filePath}.tmp"
+
+        with open(temporaryPath, "wb") as file:
+            file.write(OcrCache.header.pack(
+                OcrCache.magic,
+                OcrCache.version,
+                OcrCache.groupedFlag if isGrouped else 0,
+                len(result),
+                groupCount,
+                len(text)
+            ))
+
+            for array in arrays:
+                data = array.tobytes()
+                file.write(data)
+                file.write(OcrCache.padding(len(data)))
+
+            file.write(text)
+
+        os.replace(temporaryPath, filePath)
+
+    @staticmethod
+    def read(filePath: str) -> tuple[MealieOcr.OcrResult, np.ndarray]:
+        with open(filePath, "rb") as file:
+            # The mapping stays open as long as arrays reference it, even once the file is closed
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, rowCount, groupCount, textSize = OcrCache.header.unpack_from(data)
+
+        if magic != OcrCache.magic or version != OcrCache.version:
+            raise ValueError(f"'{filePath}' isn't a version {OcrCache.version} OCR cache file")
+
+        offset = OcrCache.header.size
+
+        def readArray(dtype: str, count: int) -> np.ndarray:
+            nonlocal offset
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes + len(OcrCache.padding(array.nbytes))
+            return array
+
+        columns = {name: readArray("<i4", rowCount) for name in MealieOcr.OcrResult.intColumns}
+        conf = readArray("<f8", rowCount)
+        textOffsets = readArray("<i8", rowCount + 1)
+        groupOffsets = readArray("<i8", groupCount + 1) if flags & OcrCache.groupedFlag else None
+        text = data[offset:offset + textSize].decode("utf-8")
+
+        return MealieOcr.OcrResult(columns, conf, text, textOffsets), groupOffsets
+
+    # OCR data of an image
+    @staticmethod
+    def load(filePath: str) -> MealieOcr.OcrResult:
+        if filePath.endswith(".json"):
+            with open(filePath, encoding="utf-8") as jsonFile:
+                return MealieOcr.OcrResult.fromChunks(json.load(jsonFile, object_hook=MealieOcr.OcrChunk.Encoder.decode))
+
+        result, _ = OcrCache.read(filePath)
+
+        return result
+
+    @staticmethod
+    def saveBlocks(filePath: str, blocks: list[list[MealieOcr.OcrChunk]]) -> None:
+        groupOffsets = np.zeros(len(blocks) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blocks], out=groupOffsets[1:])
+
+        OcrCache.save(filePath, [c for b in blocks for c in b], groupOffsets.tolist())
+
+    # OCR blocks (see MealieOcr.extractBlocks()), each a slice of the file's rows
+    @staticmethod
+    def loadBlocks(filePath: str) -> list[MealieOcr.OcrResult]:
+        if filePath.endswith(".json"):
+            with open(filePath, encoding="utf-8") as jsonFile:
+                blocks = json.load(jsonFile, object_hook=MealieOcr.OcrChunk.Encoder.decode)
+
+            return [MealieOcr.OcrResult.fromChunks(b) for b in blocks]
+
+        result, groupOffsets = OcrCache.read(filePath)
+
+        if groupOffsets is None:
+            raise ValueError(f"'{filePath}' doesn't contain OCR blocks")
+
+        bounds = groupOffsets.tolist()
+
+        return [result.slice(start, stop) for start, stop in zip(bounds, bounds[1:])]
+
+    @staticmethod
+    def exportJson(filePath: str, ocrData) -> None:
+        with open(filePath, mode="w", encoding="utf-8") as jsonFile:
+            jsonFile.write(json.dumps(ocrData, cls=MealieOcr.OcrChunk.Encoder, indent=2))
+
+    # Path of an OCR file with the given format ("binary" or "json") and path without extension
+    @staticmethod
+    def getPath(basePath: str, ocrFormat: str) -> str:
+        extension = OcrCache.extension if ocrFormat == "binary" else ".json"
+
+        return f"{basePath}{extension}"
+
+    # Path of the existing OCR file of the given path without extension, binary files first
+    @staticmethod
+    def findPath(basePath: str) -> str:
+        for extension in [OcrCache.extension, ".json"]:
+            filePath = f"{basePath}{extension}"
+
+            if os.path.exists(filePath) and os.stat(filePath).st_size > 0:
+                return filePath
+
+        return None
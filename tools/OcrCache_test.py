@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from MealieOcr import MealieOcr
+from OcrCache import OcrCache
+
+
+tsv = "\n".join([
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+    "1\t1\t0\t0\t0\t0\t0\t0\t2550\t3300\t-1\t",
+    "2\t1\t1\t0\t0\t0\t100\t110\t2000\t160\t-1\t",
+    "5\t1\t1\t1\t1\t1\t100\t150\t300\t36\t96.5\tPoulet",
+    "5\t1\t1\t1\t1\t2\t420\t150\t200\t36\t91.061234\tbeurré",
+    "2\t1\t2\t0\t0\t0\t100\t400\t2000\t60\t-1\t",
+    "5\t1\t2\t1\t1\t1\t100\t410\t300\t36\t88\tÉpicé",
+    "",
+])
+
+
+def toJson(ocrData) -> str:
+    return json.dumps(ocrData, cls=MealieOcr.OcrChunk.Encoder, indent=2)
+
+
+class TestOcrCache(unittest.TestCase):
+    def test_whenSavedThenLoadedDataIsSame(self):
+        # Arrange
+        ocrData = MealieOcr().format_tsv_output(tsv)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filePath = os.path.join(directory, "ocr-front.ocr")
+            OcrCache.save(filePath, ocrData)
+
+            # Act
+            result = OcrCache.load(filePath)
+
+            # Assert
+            self.assertEqual(toJson(result), toJson(ocrData), "Expected same OCR data after loading")
+
+    def test_whenBlocksSavedThenLoadedBlocksAreSame(self):
+        # Arrange
+        mealieOcr = MealieOcr()
+        blocks = mealieOcr.extractBlocks(mealieOcr.format_tsv_output(tsv))
+
+        with tempfile.TemporaryDirectory() as directory:
+            filePath = os.path.join(directory, "ocr-blocks-front.ocr")
+            OcrCache.saveBlocks(filePath, blocks)
+
+            # Act
+            result = OcrCache.loadBlocks(filePath)
+
+            # Assert
+            self.assertEqual(toJson(result), toJson(blocks), "Expected same OCR blocks after loading")
+
+    def test_whenLoadingJsonThenSameAsBinary(self):
+        # Arrange
+        ocrData = MealieOcr().format_tsv_output(tsv)
+
+        with tempfile.TemporaryDirectory() as directory:
+            jsonFilePath = os.path.join(directory, "ocr-front.json")
+            binaryFilePath = os.path.join(directory, "ocr-front.ocr")
+            OcrCache.exportJson(jsonFilePath, ocrData)
+            OcrCache.save(binaryFilePath, ocrData)
+
+            # Act
+            result = OcrCache.load(jsonFilePath)
+
+            # Assert
+            self.assertEqual(toJson(result), toJson(OcrCache.load(binaryFilePath)), "Expected same OCR data from JSON")
@@ -0,0 +1,232 @@
+import numpy as np
+
+from MealieOcr import MealieOcr
+
+
+# Block (level 2), paragraph (level 3) or line (level 4) of an OCR layout. Coordinates are those of
+# Tesseract's row for the node, or the bounding box of the node's words when there's no such row.
+class OcrNode():
+    def __init__(self, layout: "OcrLayout", level: int, num: int, parent: "OcrNode" = None) -> None:
+        self.layout = layout
+        self.level = level
+        self.num = num        # Block, paragraph or line number, as numbered by Tesseract
+        self.parent = parent
+        self.children: list[OcrNode] = []
+        self.row = None       # Index of the node's row in the OCR result, if any
+        self.wordRows: list[int] = []
+        self.left = self.top = self.right = self.bottom = None
+
+    @property
+    def width(self) -> int:
+        return self.right - self.left
+
+    @property
+    def height(self) -> int:
+        return self.bottom - self.top
+
+    def __repr__(self) -> str:
+        return f"OcrNode(level={self.level}, num={self.num}, box={(self.left, self.top, self.width, self.height)})"
+
+    def setBox(self, left: int, top: int, width: int, height: int) -> None:
+        self.left, self.top, self.right, self.bottom = left, top, left + width, top + height
+
+    def extendBox(self, left: int, top: int, width: int, height: int) -> None:
+        if self.left is None:
+            self.setBox(left, top, width, height)
+            return
+
+        self.left = min(self.left, left)
+        self.top = min(self.top, top)
+        self.right = max(self.right, left + width)
+        self.bottom = max(self.bottom, top + height)
+
+    def getWords(self) -> list[MealieOcr.OcrChunk]:
+        return [self.layout.result[i] for i in self.wordRows]
+
+    # Words at least minConf confident, separated by spaces
+    def getText(self, minConf: float = None) -> str:
+        result = self.layout.result
+        texts = [
+            result.getText(i).strip()
+            for i in self.wordRows
+            if minConf is None or result.conf[i] >= minConf
+        ]
+
+        return " ".join(t for t in texts if t)
+
+
+# Bounding boxes sorted into square cells of a grid, so finding boxes in an area only checks the
+# boxes of the cells it overlaps instead of all boxes
+class GridIndex():
+    def __init__(self, boxes: np.ndarray, cellSize: float) -> None:
+        self.boxes = boxes  # One (left, top, right, bottom) row per box
+        self.cellSize = max(1.0, cellSize)
+        self.cells: dict[tuple[int, int], list[int]] = {}
+
+        cellBoxes = np.floor_divide(boxes, self.cellSize).astype(np.int64).tolist()
+
+        for i, (firstX, firstY, lastX, lastY) in enumerate(cellBoxes):
+            for x in range(firstX, lastX + 1):
+                for y in range(firstY, lastY + 1):
+                    self.cells.setdefault((x, y), []).append(i)
+
+    # Indices of boxes overlapping the area, in ascending order
+    def query(self, left: float, top: float, right: float, bottom: float) -> list[int]:
+        firstX, firstY, lastX, lastY = (int(v // self.cellSize) for v in (left, top, right, bottom))
+        candidates = set()
+
+        for x in range(firstX, lastX + 1):
+            for y in range(firstY, lastY + 1):
+                candidates.update(self.cells.get((x, y), ()))
+
+        if not candidates:
+            return []
+
+        indices = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        boxes = self.boxes[indices]
+        overlaps = (boxes[:, 0] < right) & (boxes[:, 2] > left) & (boxes[:, 1] < bottom) & (boxes[:, 3] > top)
+
+        return np.sort(indices[overlaps]).tolist()
+
+
+# Block, paragraph and line tree of OCR data, with words in their lines, and spatial queries on it:
+# e.g. blocks in the top 20% of the page, or words right of a label. Nodes are grouped by page,
+# block, paragraph and line numbers in one pass over the rows, so numbers don't need to be
+# contiguous or start at 1. Nodes and words are found in grid indices, built on first use.
+class OcrLayout():
+    levels = {2: "blocks", 3: "paragraphs", 4: "lines"}
+
+    # gridSize is the number of grid cells along the page's longest side
+    def __init__(self, ocrData, gridSize: int = 32) -> None:
+        self.result = MealieOcr.OcrResult.fromChunks(ocrData)
+        self.gridSize = gridSize
+        self.blocks: list[OcrNode] = []
+        self.paragraphs: list[OcrNode] = []
+        self.lines: list[OcrNode] = []
+        self.width = self.height = 0
+
+        # Grid index of each level, with the nodes (or word rows) its boxes belong to
+        self.indices: dict[int, tuple[GridIndex, list]] = {}
+
+        self.build()
+
+    def build(self) -> None:
+        columns = [self.result.columns[name].tolist() for name in ["level", "page_num", "block_num", "par_num", "line_num"]]
+        boxes = [self.result.columns[name].tolist() for name in ["left", "top", "width", "height"]]
+        nodes: dict[tuple, OcrNode] = {}
+        nodeLists = {2: self.blocks, 3: self.paragraphs, 4: self.lines}
+
+        for i, (level, pageNum, blockNum, parNum, lineNum) in enumerate(zip(*columns)):
+            box = (boxes[0][i], boxes[1][i], boxes[2][i], boxes[3][i])
+
+            if level == 1:
+                self.width = max(self.width, box[0] + box[2])
+                self.height = max(self.height, box[1] + box[3])
+                continue
+
+            if not 2 <= level <= 5:
+                continue
+
+            # Block, paragraph and line the row belongs to, created when first seen
+            path = []
+            parent = None
+
+            for nodeLevel, key in [(2, (pageNum, blockNum)), (3, (pageNum, blockNum, parNum)), (4, (pageNum, blockNum, parNum, lineNum))]:
+                if nodeLevel > min(level, 4):
+                    break
+
+                node = nodes.get(key)
+
+                if node is None:
+                    node = OcrNode(self, nodeLevel, key[-1], parent)
+                    nodes[key] = node
+                    nodeLists[nodeLevel].append(node)
+
+                    if parent is not None:
+                        parent.children.append(node)
+
+                path.append(node)
+                parent = node
+
+            if level < 5:
+                path[-1].row = i
+                path[-1].setBox(*box)
+                continue
+
+            for node in path:
+                node.wordRows.append(i)
+
+                # Nodes without their own row are as large as their words
+                if node.row is None:
+                    node.extendBox(*box)
+
+        # Pages without a page row are as large as their content
+        if not self.width and len(self.result):
+            self.width = int((self.result.columns["left"] + self.result.columns["width"]).max())
+            self.height = int((self.result.columns["top"] + self.result.columns["height"]).max())
+
+    def getNodes(self, level: int) -> list[OcrNode]:
+        return getattr(self, OcrLayout.levels[level])
+
+    def getIndex(self, level: int) -> tuple[GridIndex, list]:
+        if level not in self.indices:
+            if level == 5:
+                columns = self.result.columns
+                words = np.flatnonzero(columns["level"] == 5)
+                left, top = columns["left"][words], columns["top"][words]
+                boxes = np.stack([left, top, left + columns["width"][words], top + columns["height"][words]], axis=1)
+                items = words.tolist()
+            else:
+                items = [n for n in self.getNodes(level) if n.left is not None]
+                boxes = np.array([(n.left, n.top, n.right, n.bottom) for n in items], dtype=np.int64).reshape(-1, 4)
+
+            self.indices[level] = GridIndex(boxes, max(self.width, self.height) / self.gridSize), items
+
+        return self.indices[level]
+
+    # Blocks, paragraphs, lines or words (level 5, as OcrChunk objects) overlapping the area, in
+    # reading order
+    def query(self, left: float, top: float, right: float, bottom: float, level: int = 2) -> list:
+        index, items = self.getIndex(level)
+        indices = index.query(left, top, right, bottom)
+
+        if level == 5:
+            return [self.result[items[i]] for i in indices]
+
+        return [items[i] for i in indices]
+
+    # Same as query(), with the area given as fractions of the page's width and height
+    def queryRegion(self, left: float, top: float, right: float, bottom: float, level: int = 2) -> list:
+        return self.query(left * self.width, top * self.height, right * self.width, bottom * self.height, level)
+
+    # Blocks, paragraphs, lines or words on the same line as the node (or OcrChunk) and right of
+    # it, nearest first. Items overlapping the node's height by less than half of theirs are ignored.
+    def findRightOf(self, node, level: int = 5, maxDistance: float = None) -> list:
+        right = node.left + node.width
+        limit = right + maxDistance if maxDistance is not None else self.width
+        items = self.query(right, node.top, limit, node.top + node.height, level)
+        items = [
+            i for i in items
+            if i.left >= right and min(i.top + i.height, node.top + node.height) - max(i.top, node.top) >= i.height / 2
+        ]
+
+        return sorted(items, key=lambda i: i.left)
+
+    # Blocks, paragraphs, lines or words under the node (or OcrChunk) and overlapping its width,
+    # nearest first
+    def findBelow(self, node, level: int = 4, maxDistance: float = None) -> list:
+        bottom = node.top + node.height
+        limit = bottom + maxDistance if maxDistance is not None else self.height
+        items = self.query(node.left, bottom, node.left + node.width, limit, level)
+
+        return sorted((i for i in items if i.top >= bottom), key=lambda i: i.top)
+
+    # Blocks, paragraphs or lines whose text contains the given text, ignoring case
+    def find(self, text: str, level: int = 4) -> list[OcrNode]:
+        text = text.casefold()
+
+        return [n for n in self.getNodes(level) if text in n.getText().casefold()]
+
+    # Rows of each block: its block row, if any, then its words, as in MealieOcr.extractBlocks()
+    def getBlockRows(self) -> list[list[int]]:
+        return [([b.row] if b.row is not None else []) + b.wordRows for b in self.blocks]
@@ -0,0 +1,62 @@
+import unittest
+
+from MealieOcr import MealieOcr
+from OcrLayout import OcrLayout
+
+
+# Blocks aren't numbered from 1 nor contiguously, as in OCR data of a region of a page
+tsv = "\n".join([
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+    "1\t1\t0\t0\t0\t0\t0\t0\t2550\t3300\t-1\t",
+    "2\t1\t3\t0\t0\t0\t100\t110\t2000\t160\t-1\t",
+    "3\t1\t3\t1\t0\t0\t100\t110\t2000\t160\t-1\t",
+    "4\t1\t3\t1\t1\t0\t100\t150\t520\t36\t-1\t",
+    "5\t1\t3\t1\t1\t1\t100\t150\t300\t36\t96.5\tPoulet",
+    "5\t1\t3\t1\t1\t2\t420\t150\t200\t36\t91\tbeurré",
+    "2\t1\t7\t0\t0\t0\t100\t2000\t2000\t200\t-1\t",
+    "3\t1\t7\t1\t0\t0\t100\t2000\t2000\t200\t-1\t",
+    "4\t1\t7\t1\t1\t0\t100\t2000\t500\t40\t-1\t",
+    "5\t1\t7\t1\t1\t1\t100\t2000\t250\t40\t90\tPortions",
+    "5\t1\t7\t1\t1\t2\t500\t2005\t100\t40\t88\t2",
+    "4\t1\t7\t1\t2\t0\t100\t2100\t400\t40\t-1\t",
+    "5\t1\t7\t1\t2\t1\t100\t2100\t400\t40\t30\tÉpicé",
+    "",
+])
+
+
+class TestOcrLayout(unittest.TestCase):
+    def test_whenBlockNumbersNotContiguousThenEachBlockExtracted(self):
+        # Arrange
+        mealieOcr = MealieOcr()
+        ocrData = mealieOcr.format_tsv_output(tsv)
+
+        # Act
+        blocks = mealieOcr.extractBlocks(ocrData)
+
+        # Assert
+        self.assertEqual([[c.level for c in b] for b in blocks], [[2, 5, 5], [2, 5, 5, 5]], "Expected block definitions and their words")
+        self.assertEqual([b[0].block_num for b in blocks], [3, 7], "Expected blocks in reading order")
+
+    def test_whenQueryingRegionThenBlocksInRegionFound(self):
+        # Arrange
+        layout = OcrLayout(MealieOcr().format_tsv_output(tsv))
+
+        # Act
+        blocks = layout.queryRegion(0, 0, 1, 0.2)
+
+        # Assert
+        self.assertEqual([b.getText() for b in blocks], ["Poulet beurré"], "Expected only the top block")
+        self.assertEqual(len(layout.lines), 3, "Expected lines of all blocks")
+        self.assertEqual(layout.blocks[1].getText(minConf=40), "Portions 2", "Expected confident words only")
+
+    def test_whenFindingTextRightOfLabelThenValueFound(self):
+        # Arrange
+        layout = OcrLayout(MealieOcr().format_tsv_output(tsv))
+        label = layout.query(0, 0, layout.width, layout.height, level=5)[2]
+
+        # Act
+        words = layout.findRightOf(label)
+
+        # Assert
+        self.assertEqual(label.text, "Portions", "Expected label word")
+        self.assertEqual([w.text for w in words], ["2"], "Expected value on the label's line only")
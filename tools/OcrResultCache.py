@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+
+from MealieOcr import MealieOcr
+from OcrCache import OcrCache
+
+
+# OCR results stored by content instead of by output file name, so renamed or moved scans and
+# identical rescans aren't analysed again. Entries are keyed by the image's hash and everything
+# that can change OCR results: OCR engine, its version, language and preprocessing parameters.
+#
+# Entries are OcrCache files in subfolders named after their key's first 2 characters. Each hit
+# updates the entry's modification time, and least recently used entries are removed once the
+# cache is larger than maxSize bytes.
+class OcrResultCache():
+    def __init__(self, logger: logging.Logger, cachePath: str, maxSize: int, isDryRun: bool = False) -> None:
+        self.logger = logger
+        self.cachePath = cachePath
+        self.maxSize = maxSize
+        self.isDryRun = isDryRun
+        self.hits = 0
+        self.misses = 0
+        self.size = None
+
+    @staticmethod
+    def hashImage(imagePath: str) -> str:
+        digest = hashlib.sha256()
+
+        with open(imagePath, "rb") as image:
+            for block in iter(lambda: image.read(1024 * 1024), b""):
+                digest.update(block)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def getKey(imageHash: str, engine: str, version: str, lang: str = None, preprocessing: dict = None) -> str:
+        description = {
+            "image": imageHash,
+            "engine": engine,
+            "version": version,
+            "lang": lang,
+            "preprocessing": preprocessing or {}
+        }
+
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def getEntryPath(self, key: str) -> str:
+        return os.path.join(self.cachePath, key[:2], f"{key}{OcrCache.extension}")
+
+    def get(self, key: str) -> MealieOcr.OcrResult:
+        entryPath = self.getEntryPath(key)
+
+        try:
+            ocrData = OcrCache.load(entryPath)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            self.logger.warning(f"Couldn't read cached OCR data '{entryPath}': {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        if not self.isDryRun:
+            # Marks the entry as recently used
+            os.utime(entryPath)
+
+        return ocrData
+
+    def put(self, key: str, ocrData) -> None:
+        if self.isDryRun:
+            self.logger.debug(f"[DRY RUN] Would've cached OCR data '{key}'")
+            return
+
+        entryPath = self.getEntryPath(key)
+        os.makedirs(os.path.dirname(entryPath), exist_ok=True)
+        OcrCache.save(entryPath, ocrData)
+
+        if self.size is None:
+            self.size = sum(os.stat(p).st_size for p, _ in self.listEntries())
+        else:
+            self.size += os.stat(entryPath).st_size
+
+        if self.size > self.maxSize:
+            self.evict()
+
+    def listEntries(self) -> list[tuple[str, os.stat_result]]:
+        entries = []
+
+        if not os.path.isdir(self.cachePath):
+            return entries
+
+        for folder in os.scandir(self.cachePath):
+            if not folder.is_dir():
+                continue
+
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith(OcrCache.extension):
+                    entries.append((entry.path, entry.stat()))
+
+        return entries
+
+    # Removes least recently used entries until the cache is back under 90% of its maximum size,
+    # so entries aren't evicted one at a time on each new result
+    def evict(self) -> None:
+        entries = sorted(self.listEntries(), key=lambda e: e[1].st_mtime)
+        self.size = sum(s.st_size for _, s in entries)
+        targetSize = self.maxSize * 0.9
+        evictedCount = 0
+
+        for entryPath, stat in entries:
+            if self.size <= targetSize:
+                break
+
+            try:
+                os.remove(entryPath)
+            except FileNotFoundError:
+                pass
+
+            self.size -= stat.st_size
+            evictedCount += 1
+
+        self.logger.debug(f"Evicted {evictedCount} OCR cache entries; cache size is now {self.size} bytes")
@@ -0,0 +1,60 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from MealieOcr import MealieOcr
+from OcrResultCache import OcrResultCache
+
+
+logger = logging.getLogger("test")
+
+tsv = "\n".join([
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+    "1\t1\t0\t0\t0\t0\t0\t0\t2550\t3300\t-1\t",
+    "5\t1\t1\t1\t1\t1\t100\t150\t300\t36\t96.5\tPoulet",
+    "",
+])
+
+
+class TestOcrResultCache(unittest.TestCase):
+    def test_whenKeyPartsDifferThenKeysDiffer(self):
+        # Act
+        keys = {
+            OcrResultCache.getKey("abc", "pytesseract", "5.3.0"),
+            OcrResultCache.getKey("abc", "pytesseract", "5.3.1"),
+            OcrResultCache.getKey("abc", "tesserocr", "5.3.0"),
+            OcrResultCache.getKey("abc", "pytesseract", "5.3.0", lang="fra"),
+            OcrResultCache.getKey("abc", "pytesseract", "5.3.0", preprocessing={"dpi": 300}),
+            OcrResultCache.getKey("abd", "pytesseract", "5.3.0"),
+        }
+
+        # Assert
+        self.assertEqual(len(keys), 6, "Expected a different key for each image, engine and parameters")
+
+    def test_whenCacheFullThenLeastRecentlyUsedEvicted(self):
+        # Arrange
+        ocrData = MealieOcr().format_tsv_output(tsv)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = OcrResultCache(logger, directory, maxSize=1024 * 1024)
+            cache.put("aa01", ocrData)
+
+            # Room for 2 entries
+            cache.maxSize = os.stat(cache.getEntryPath("aa01")).st_size * 2.5
+            cache.put("bb02", ocrData)
+            os.utime(cache.getEntryPath("aa01"), (0, 0))
+            os.utime(cache.getEntryPath("bb02"), (1, 1))
+            cache.get("aa01")
+
+            # Act
+            cache.put("cc03", ocrData)
+
+            # Assert
+            self.assertIsNotNone(cache.get("aa01"), "Expected recently used entry to be kept")
+            self.assertIsNone(cache.get("bb02"), "Expected least recently used entry to be evicted")
+            self.assertEqual(
+                [c.text for c in cache.get("cc03")],
+                [c.text for c in ocrData],
+                "Expected new entry to be cached"
+            )
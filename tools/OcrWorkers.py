@@ -0,0 +1,360 @@
+import contextlib
+import functools
+import logging
+import os
+import time
+
+from concurrent.futures import Executor, FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from ImagePreprocessor import ImagePreprocessor
+from io import BytesIO
+from MealieApi import MealieApi
+from MealieOcr import MealieOcr
+from PIL import Image
+from typing import Callable, Hashable, Iterable, Iterator
+
+
+# OCR engine created once per worker process by initialiseWorker()
+workerOcr: MealieOcr = None
+
+
+def initialiseWorker(verbosity: str, engine: str, preprocessor: ImagePreprocessor = None):
+    global workerOcr
+
+    logging.getLogger().setLevel(getattr(logging, verbosity))
+
+    # Kept for the worker's lifetime, so an in-process Tesseract engine loads its model only once.
+    # Images are also preprocessed in the worker, since it's as CPU-bound as OCR.
+    workerOcr = MealieOcr(engine, preprocessor)
+
+
+# Runs in a worker process; images are read there so they aren't pickled to the worker
+def runOcrOnImage(imagePath: str, timeout: float) -> list[MealieOcr.OcrChunk]:
+    with open(imagePath, "rb") as image:
+        return workerOcr.runOcrOnFile(image.read(), timeout=timeout)
+
+
+# Submits (key, image path) jobs to the executor, with at most maxPending of them queued at once so a
+# large batch isn't loaded up front, and yields (key, OCR data) as each job completes, or
+# (key, None) if it failed
+def runJobs(logger: logging.Logger,
+            executor: Executor,
+            runJob: Callable[[str], list[MealieOcr.OcrChunk]],
+            jobs: Iterable[tuple[Hashable, str]],
+            maxPending: int) -> Iterator[tuple[Hashable, list[MealieOcr.OcrChunk]]]:
+    jobs = iter(jobs)
+    pending: dict[Future, tuple[Hashable, str]] = {}
+
+    while True:
+        while len(pending) < maxPending:
+            job = next(jobs, None)
+
+            if job is None:
+                break
+
+            pending[executor.submit(runJob, job[1])] = job
+
+        if not pending:
+            return
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            key, imagePath = pending.pop(future)
+
+            try:
+                yield key, future.result()
+            except Exception as e:
+                # Tesseract timeouts are raised as RuntimeError("Tesseract process timeout")
+                logger.error(f"OCR failed on '{imagePath}': {e}")
+                yield key, None
+
+
+# Runs local Tesseract OCR on images in a pool of worker processes, since Tesseract only uses one
+# CPU core per page. Tesseract is killed after timeout seconds (0 for no timeout) on an image.
+# Images are preprocessed by preprocessor, if any, before OCR.
+class OcrWorkerPool():
+    name = "local"
+
+    def __init__(self,
+                 logger: logging.Logger,
+                 workers: int,
+                 timeout: float = 0,
+                 maxPending: int = None,
+                 verbosity: str = "INFO",
+                 engine: str = "auto",
+                 preprocessor: ImagePreprocessor = None) -> None:
+        self.logger = logger
+        self.workers = workers
+        self.timeout = timeout
+        self.maxPending = maxPending or workers * 2
+        self.verbosity = verbosity
+        self.engine = engine
+        self.preprocessor = preprocessor
+
+        # Module-level function so it can be pickled to worker processes
+        self.runJob = functools.partial(runOcrOnImage, timeout=timeout)
+
+    # Same engine as the workers, since they run in the same environment
+    def getEngineVersion(self) -> tuple[str, str]:
+        return MealieOcr(self.engine).getEngineVersion()
+
+    def createExecutor(self) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=initialiseWorker,
+            initargs=(self.verbosity, self.engine, self.preprocessor)
+        )
+
+    def run(self, jobs: Iterable[tuple[Hashable, str]]) -> Iterator[tuple[Hashable, list[MealieOcr.OcrChunk]]]:
+        with self.createExecutor() as executor:
+            yield from runJobs(self.logger, executor, self.runJob, jobs, self.maxPending)
+
+
+# Uploads images to Mealie's OCR endpoint, workers at a time. Mealie runs Tesseract for each
+# request, so this is mostly waiting on the server and threads are enough. Images are
+# preprocessed by preprocessor, if any, before they're uploaded, which also makes uploads smaller.
+class ServerOcrPool():
+    name = "server"
+
+    def __init__(self,
+                 logger: logging.Logger,
+                 mealieApi: MealieApi,
+                 workers: int,
+                 timeout: float = 0,
+                 maxPending: int = None,
+                 preprocessor: ImagePreprocessor = None) -> None:
+        self.logger = logger
+        self.mealieApi = mealieApi
+        self.workers = workers
+        self.timeout = timeout
+        self.maxPending = maxPending or workers * 2
+        self.preprocessor = preprocessor
+
+    def runJob(self, imagePath: str) -> list[MealieOcr.OcrChunk]:
+        if self.preprocessor is None:
+            ocrData = self.mealieApi.runOcrOnFile(imagePath, timeout=self.timeout or None)
+
+            return [MealieOcr.OcrChunk.Encoder.decode(c) for c in ocrData]
+
+        with Image.open(imagePath) as image:
+            preprocessedImage, transform = self.preprocessor.process(image)
+
+        imageData = BytesIO()
+        preprocessedImage.save(imageData, format="PNG")
+        ocrData = self.mealieApi.runOcrOnImage(
+            imageData.getvalue(),
+            f"{os.path.splitext(os.path.basename(imagePath))[0]}.png",
+            timeout=self.timeout or None
+        )
+
+        return transform.restoreCoordinates([MealieOcr.OcrChunk.Encoder.decode(c) for c in ocrData])
+
+    def getEngineVersion(self) -> tuple[str, str]:
+        return "mealie", self.mealieApi.getAppVersion()
+
+    def createExecutor(self) -> Executor:
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def run(self, jobs: Iterable[tuple[Hashable, str]]) -> Iterator[tuple[Hashable, list[MealieOcr.OcrChunk]]]:
+        with self.createExecutor() as executor:
+            yield from runJobs(self.logger, executor, self.runJob, jobs, self.maxPending)
+
+
+# Runs in a pool's worker; returns how long OCR took, without time spent queued in the pool
+def timeJob(runJob: Callable[[str], list[MealieOcr.OcrChunk]], imagePath: str) -> tuple[float, list[MealieOcr.OcrChunk]]:
+    start = time.perf_counter()
+    ocrData = runJob(imagePath)
+
+    return time.perf_counter() - start, ocrData
+
+
+# One OCR attempt of a job on a pool
+class OcrAttempt():
+    def __init__(self, jobId: int, poolIndex: int) -> None:
+        self.jobId = jobId
+        self.poolIndex = poolIndex
+        self.submitTime = time.perf_counter()
+
+
+# Dispatches images to several OCR pools at once (e.g. local Tesseract workers and Mealie's OCR
+# endpoint), so none of them sits idle:
+# * Each image goes to the pool expected to finish it first, based on the pool's observed
+#   latency (moving average of OCR times) and how many images are already queued on it.
+# * Pools queue at most maxPending images each, so a slow pool doesn't hoard the batch.
+# * When a pool has free workers and nothing is left to dispatch, it steals images that have
+#   been waiting on another pool for more than stealFactor times that pool's latency. Whichever
+#   attempt finishes first is kept, and queued attempts that didn't start yet are cancelled.
+class HybridOcrScheduler():
+    def __init__(self,
+                 logger: logging.Logger,
+                 pools: list,
+                 stealFactor: float = 2,
+                 pollInterval: float = 0.5,
+                 latencySmoothing: float = 0.3) -> None:
+        self.logger = logger
+        self.pools = pools
+        self.stealFactor = stealFactor
+        self.pollInterval = pollInterval
+        self.latencySmoothing = latencySmoothing
+
+        # Seconds per image, per pool. None until a pool completes its first image.
+        self.latencies: list[float] = [None] * len(pools)
+        self.completedCounts = [0] * len(pools)
+        self.stolenCount = 0
+
+    # Results can come from any pool, so they're told apart from each pool's results
+    def getEngineVersion(self) -> tuple[str, str]:
+        return "hybrid", "+".join(":".join(p.getEngineVersion()) for p in self.pools)
+
+    def getLatency(self, poolIndex: int) -> float:
+        latency = self.latencies[poolIndex]
+
+        if latency is not None:
+            return latency
+
+        # Unknown pools are assumed as fast as the fastest known one, so they get tried early
+        known = [l for l in self.latencies if l is not None]
+
+        return min(known) if known else 0
+
+    # Seconds until an extra image sent to the pool would be done
+    def estimateCompletion(self, poolIndex: int, queuedCount: int) -> float:
+        pool = self.pools[poolIndex]
+
+        return self.getLatency(poolIndex) * (queuedCount // pool.workers + 1)
+
+    def recordLatency(self, poolIndex: int, latency: float) -> None:
+        previous = self.latencies[poolIndex]
+
+        if previous is None:
+            self.latencies[poolIndex] = latency
+        else:
+            self.latencies[poolIndex] = previous + self.latencySmoothing * (latency - previous)
+
+        self.completedCounts[poolIndex] += 1
+
+    def run(self, jobs: Iterable[tuple[Hashable, str]]) -> Iterator[tuple[Hashable, list[MealieOcr.OcrChunk]]]:
+        with contextlib.ExitStack() as stack:
+            executors = [stack.enter_context(p.createExecutor()) for p in self.pools]
+            yield from self.schedule(executors, jobs)
+
+        self.logger.debug(
+            f"OCR scheduler done; completed images per pool: "
+            f"{dict(zip([p.name for p in self.pools], self.completedCounts))}, stolen images: {self.stolenCount}"
+        )
+
+    def schedule(self, executors: list[Executor], jobs: Iterable[tuple[Hashable, str]]) -> Iterator[tuple[Hashable, list[MealieOcr.OcrChunk]]]:
+        jobs = iter(jobs)
+        isExhausted = False
+        jobsById: dict[int, tuple[Hashable, str]] = {}
+        attempts: dict[Future, OcrAttempt] = {}
+        attemptsByJob: dict[int, list[Future]] = {}
+        queuedCounts = [0] * len(self.pools)
+        nextJobId = 0
+
+        def submit(jobId: int, poolIndex: int) -> None:
+            pool = self.pools[poolIndex]
+            future = executors[poolIndex].submit(timeJob, pool.runJob, jobsById[jobId][1])
+            attempts[future] = OcrAttempt(jobId, poolIndex)
+            attemptsByJob.setdefault(jobId, []).append(future)
+            queuedCounts[poolIndex] += 1
+
+        def finish(future: Future) -> None:
+            attempt = attempts.pop(future)
+            queuedCounts[attempt.poolIndex] -= 1
+            attemptsByJob[attempt.jobId].remove(future)
+
+        while True:
+            # Dispatch new images to the pools expected to finish them first
+            while not isExhausted:
+                available = [i for i, p in enumerate(self.pools) if queuedCounts[i] < p.maxPending]
+
+                if not available:
+                    break
+
+                job = next(jobs, None)
+
+                if job is None:
+                    isExhausted = True
+                    break
+
+                poolIndex = min(available, key=lambda i: (self.estimateCompletion(i, queuedCounts[i]), i))
+                jobsById[nextJobId] = job
+                submit(nextJobId, poolIndex)
+                nextJobId += 1
+
+            if isExhausted:
+                self.stealStalledJobs(attempts, attemptsByJob, queuedCounts, submit, finish)
+
+            if not attempts:
+                return
+
+            done, _ = wait(attempts, timeout=self.pollInterval, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                # Already dropped when another attempt of the same image completed
+                if future not in attempts:
+                    continue
+
+                attempt = attempts[future]
+                finish(future)
+                key, imagePath = jobsById[attempt.jobId]
+
+                try:
+                    latency, ocrData = future.result()
+                except Exception as e:
+                    self.logger.error(f"OCR failed on '{imagePath}' ({self.pools[attempt.poolIndex].name}): {e}")
+
+                    # Another pool may still succeed
+                    if attemptsByJob[attempt.jobId]:
+                        continue
+
+                    del jobsById[attempt.jobId], attemptsByJob[attempt.jobId]
+                    yield key, None
+                    continue
+
+                self.recordLatency(attempt.poolIndex, latency)
+
+                # Attempts on other pools are no longer needed. Running ones can't be stopped, so
+                # their results are ignored.
+                for other in list(attemptsByJob[attempt.jobId]):
+                    other.cancel()
+                    finish(other)
+
+                del jobsById[attempt.jobId], attemptsByJob[attempt.jobId]
+                yield key, ocrData
+
+    def stealStalledJobs(self, attempts, attemptsByJob, queuedCounts, submit, finish) -> None:
+        # Nothing to compare waiting times with until an image is done
+        if all(l is None for l in self.latencies):
+            return
+
+        now = time.perf_counter()
+
+        for poolIndex, pool in enumerate(self.pools):
+            while queuedCounts[poolIndex] < pool.workers:
+                stalled = [
+                    (now - a.submitTime, f)
+                    for f, a in attempts.items()
+                    if a.poolIndex != poolIndex
+                    and len(attemptsByJob[a.jobId]) == 1
+                    and now - a.submitTime > self.stealFactor * self.getLatency(a.poolIndex)
+                    and now - a.submitTime > self.getLatency(poolIndex)
+                ]
+
+                if not stalled:
+                    break
+
+                # Oldest first, since it's the most likely to be stuck
+                _, future = max(stalled, key=lambda s: s[0])
+                attempt = attempts[future]
+                self.logger.debug(
+                    f"Stealing image from {self.pools[attempt.poolIndex].name} OCR for {pool.name} OCR"
+                )
+                self.stolenCount += 1
+
+                # Images that didn't start yet are moved; others are raced
+                if future.cancel():
+                    finish(future)
+
+                submit(attempt.jobId, poolIndex)
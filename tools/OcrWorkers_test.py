@@ -0,0 +1,93 @@
+import json
+import logging
+import threading
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from MealieOcr import MealieOcr
+from OcrWorkers import HybridOcrScheduler, ServerOcrPool
+
+
+logger = logging.getLogger("test")
+
+tsv = "\n".join([
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+    "1\t1\t0\t0\t0\t0\t0\t0\t2550\t3300\t-1\t",
+    "2\t1\t1\t0\t0\t0\t100\t110\t2000\t160\t-1\t",
+    "5\t1\t1\t1\t1\t1\t100\t150\t300\t36\t96.5\tPoulet",
+    "5\t1\t1\t1\t1\t2\t420\t150\t200\t36\t91\tbeurre",
+    "",
+])
+
+
+class FakePool():
+    def __init__(self, name: str, workers: int, delay: float, stallEvent: threading.Event = None) -> None:
+        self.name = name
+        self.workers = workers
+        self.maxPending = workers * 2
+        self.delay = delay
+        self.stallEvent = stallEvent
+
+    def runJob(self, imagePath: str) -> list[MealieOcr.OcrChunk]:
+        if self.stallEvent:
+            self.stallEvent.wait(5)
+
+        time.sleep(self.delay)
+        chunk = MealieOcr.OcrChunk()
+        chunk.text = f"{self.name}:{imagePath}"
+
+        return [chunk]
+
+    def createExecutor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+
+class FakeMealieApi():
+    def runOcrOnFile(self, filePath: str, timeout: float = None) -> list[dict]:
+        ocrData = MealieOcr().format_tsv_output(tsv)
+
+        return json.loads(json.dumps(ocrData, cls=MealieOcr.OcrChunk.Encoder))
+
+
+class TestOcrWorkers(unittest.TestCase):
+    def test_whenServerOcrThenSameChunksAsLocalOcr(self):
+        # Arrange
+        pool = ServerOcrPool(logger, FakeMealieApi(), workers=1)
+        expectedResult = MealieOcr().format_tsv_output(tsv)
+
+        # Act
+        result = pool.runJob("front.png")
+
+        # Assert
+        self.assertEqual(
+            [vars(c) for c in result],
+            [vars(c) for c in expectedResult],
+            "Expected same OCR chunks from both backends"
+        )
+
+    def test_whenPoolStallsThenImagesStolenByOtherPool(self):
+        # Arrange
+        stallEvent = threading.Event()
+        fastPool = FakePool("fast", workers=2, delay=0.01)
+        stalledPool = FakePool("stalled", workers=2, delay=0.01, stallEvent=stallEvent)
+        scheduler = HybridOcrScheduler(logger, [fastPool, stalledPool], pollInterval=0.01)
+        jobs = [(i, f"scan-{i}.png") for i in range(20)]
+
+        # Act
+        result = []
+
+        for key, ocrData in scheduler.run(jobs):
+            result.append((key, ocrData))
+
+            # Releases the stalled pool once every image is done, so the scheduler can stop
+            if len(result) == len(jobs):
+                stallEvent.set()
+
+        # Assert
+        self.assertEqual(sorted(k for k, _ in result), list(range(20)), "Expected every image to be analysed once")
+        self.assertTrue(
+            all(d[0].text.startswith("fast:") for _, d in result),
+            "Expected stalled pool's images to be analysed by the other pool"
+        )
+        self.assertGreater(scheduler.stolenCount, 0, "Expected images to be stolen")
@@ -0,0 +1,219 @@
+import random
+import uuid
+
+from models.CategorySummary import CategorySummary
+from models.RecipeTag import RecipeTag
+from slugify import slugify
+
+
+mainIngredients = [
+    "poulet", "boeuf", "porc", "saumon", "crevettes", "tofu", "morue", "dinde", "veau", "agneau",
+    "haddock", "tilapia", "halloumi", "saucisses", "pois chiches", "lentilles", "champignons",
+]
+dishes = [
+    "bol", "tacos", "salade", "burger", "pâtes", "risotto", "curry", "sauté", "pizza", "soupe",
+    "poke", "quesadillas", "gratin", "brochettes", "nouilles", "ramen", "bibimbap", "mijoté",
+]
+styles = [
+    "à la moutarde", "au beurre", "à l'érable", "façon thaï", "teriyaki", "au pesto", "épicé",
+    "grillé", "fumé", "à la crème", "au cari", "bbq", "au miel et à l'ail", "à la grecque",
+    "au parmesan", "glacé", "croustillant", "rôti", "poêlé", "à l'orange",
+]
+sides = [
+    "riz au jasmin", "purée de pommes de terre", "légumes rôtis", "salade de chou", "couscous",
+    "quinoa", "haricots verts", "maïs grillé", "patates douces", "orzo", "épinards",
+]
+units = ["tasse", "c. à soupe", "c. à thé", "g", "ml", "unité", "gousse", "pincée"]
+verbs = ["Préchauffer", "Couper", "Mélanger", "Cuire", "Ajouter", "Servir", "Émincer", "Réserver"]
+
+# Common OCR mistakes (missing accents, logo text, separators) applied to generated titles
+ocrNoise = [
+    ("à ", "a "), ("rôti", "roti"), ("poêlé", "poele"), ("fumé", "fume"), ("façon", "facon"),
+    ("thaï", "thai"), ("crème", "creme"), ("purée", "puree"), ("épicé", "epice"), ("glacé", "glace"),
+    ("grillé", "grille"), ("maïs", "mais"), ("légumes", "legumes"),
+]
+ocrPrefixes = ["goodfood ", "Le choix de Nick | ", "Sain + Sensé: ", "| ", "— ", ""]
+
+tsvHeader = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+
+
+# Generates reproducible, realistic-looking synthetic data (recipes as returned by Mealie's API,
+# Tesseract TSV output and OCR'd titles) to benchmark the tools without a Mealie instance
+class RecipeCorpus():
+    tags: list[dict]
+    categories: list[dict]
+
+    def __init__(self,
+                 seed: int = 0,
+                 tagSlugs: list[str] = [],
+                 extraTagCount: int = 50,
+                 categorySlugs: list[str] = ["breakfast", "dessert", "dinner", "sauce", "vinaigrette"]) -> None:
+        self.random = random.Random(seed)
+        self.recipeCount = 0
+
+        tagSlugs = list(tagSlugs) + [f"tag-{i}" for i in range(extraTagCount)]
+        self.tags = [self.generateOrganizer(s) for s in tagSlugs]
+        self.categories = [self.generateOrganizer(s) for s in categorySlugs]
+
+    def generateId(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def generateOrganizer(self, slug: str) -> dict:
+        return {
+            "id": self.generateId(),
+            "slug": slug,
+            "name": slug.replace("-", " ").title()
+        }
+
+    def getAllTags(self) -> list[RecipeTag]:
+        return [RecipeTag.from_json(t) for t in self.tags]
+
+    def getAllCategories(self) -> list[CategorySummary]:
+        return [CategorySummary.from_json(c) for c in self.categories]
+
+    def generateTitle(self) -> str:
+        title = f"{self.random.choice(dishes)} de {self.random.choice(mainIngredients)}"
+
+        if self.random.random() < 0.7:
+            title += f" {self.random.choice(styles)}"
+
+        if self.random.random() < 0.5:
+            title += f" et {self.random.choice(sides)}"
+
+        return title.capitalize()
+
+    def generateIngredient(self, isParsed: bool) -> dict:
+        food = self.random.choice(mainIngredients + sides)
+        quantity = self.random.choice([0.25, 0.5, 1, 2, 3, 250])
+        unit = self.random.choice(units)
+
+        return {
+            "title": "Spice Mix" if self.random.random() < 0.02 else None,
+            "note": f"{quantity} {unit} {food}",
+            "unit": {"id": self.generateId(), "name": unit} if isParsed else None,
+            "food": {"id": self.generateId(), "name": food} if isParsed else None,
+            "quantity": quantity if isParsed else 0,
+            "disableAmount": not isParsed,
+            "originalText": f"{quantity} {unit} {food}",
+            "isFood": True,
+            "display": f"{quantity} {unit} {food}"
+        }
+
+    def generateStep(self) -> dict:
+        words = [self.random.choice(verbs)] + self.random.choices(mainIngredients + sides, k=8)
+        text = " ".join(words) + "."
+
+        if self.random.random() < 0.3:
+            text += f' <img src="/api/media/recipes/{self.generateId()}/images/step.webp">'
+
+        return {
+            "id": self.generateId(),
+            "title": "",
+            "text": text,
+            "ingredientReferences": []
+        }
+
+    def generateRecipe(self,
+                       tagsPerRecipe: int = 5,
+                       ingredientsPerRecipe: int = 10,
+                       stepsPerRecipe: int = 6) -> dict:
+        self.recipeCount += 1
+
+        name = self.generateTitle()
+        isParsed = self.random.random() < 0.7
+        hasNutrition = self.random.random() < 0.8
+        optional = lambda value, probability=0.8: value if self.random.random() < probability else None
+
+        return {
+            "id": self.generateId(),
+            "userId": self.generateId(),
+            "groupId": self.generateId(),
+            "name": name,
+            "slug": f"{slugify(name)}-{self.recipeCount}",
+            "image": optional("abcd"),
+            "recipeYield": optional(f"{self.random.choice([2, 4, 6])} portions"),
+            "totalTime": optional("30 minutes"),
+            "prepTime": optional("10 minutes"),
+            "cookTime": None,
+            "performTime": optional("20 minutes"),
+            "description": optional("Une recette rapide pour les soirs de semaine.") or "",
+            "recipeCategory": self.random.sample(self.categories, k=self.random.randint(0, 2)),
+            "tags": self.random.sample(self.tags, k=min(tagsPerRecipe, len(self.tags))),
+            "tools": [
+                {"id": self.generateId(), "slug": "poele", "name": "Poêle", "onHand": False}
+            ] if self.random.random() < 0.6 else [],
+            "rating": optional(self.random.randint(1, 5), 0.5),
+            "orgUrl": None,
+            "dateAdded": "2024-01-01",
+            "dateUpdated": "2024-01-01T00:00:00",
+            "createdAt": "2024-01-01T00:00:00",
+            "updateAt": f"2024-01-01T00:00:{self.recipeCount % 60:02}",
+            "lastMade": None,
+            "recipeIngredient": [self.generateIngredient(isParsed) for _ in range(ingredientsPerRecipe)],
+            "recipeInstructions": [self.generateStep() for _ in range(stepsPerRecipe)],
+            "nutrition": {
+                key: str(self.random.randint(1, 500)) if hasNutrition else None
+                for key in [
+                    "calories", "fatContent", "proteinContent", "carbohydrateContent",
+                    "fiberContent", "sodiumContent", "sugarContent"
+                ]
+            },
+            "settings": {
+                "public": True,
+                "showNutrition": True,
+                "showAssets": True,
+                "landscapeView": False,
+                "disableComments": False,
+                "disableAmount": not isParsed,
+                "locked": False
+            },
+            "assets": [],
+            "notes": [],
+            "extras": {"duplicate": "https://mealie/g/home/r/other"} if self.random.random() < 0.05 else {},
+            "isOcrRecipe": False,
+            "comments": []
+        }
+
+    def generateRecipes(self, count: int, **kwargs) -> list[dict]:
+        return [self.generateRecipe(**kwargs) for _ in range(count)]
+
+    # Title as it would come out of OCR, before cleanTitles()
+    def generateOcrTitle(self) -> str:
+        title = self.generateTitle()
+
+        for original, mistake in ocrNoise:
+            if self.random.random() < 0.5:
+                title = title.replace(original, mistake)
+
+        return self.random.choice(ocrPrefixes) + title.replace(" ", "  ", self.random.randint(0, 1))
+
+    # Output of pytesseract.image_to_data() for a page of wordCount words, split into blocks of
+    # paragraphs of lines
+    def generateOcrTsv(self, wordCount: int, wordsPerLine: int = 8, linesPerBlock: int = 4) -> str:
+        rows = [tsvHeader, "1\t1\t0\t0\t0\t0\t0\t0\t2550\t3300\t-1\t"]
+        blockNum = 0
+        top = 50
+
+        for wordNum in range(wordCount):
+            lineIndex = wordNum // wordsPerLine
+
+            if wordNum % (wordsPerLine * linesPerBlock) == 0:
+                blockNum += 1
+                top += 60
+                rows.append(f"2\t1\t{blockNum}\t0\t0\t0\t100\t{top}\t2000\t{40 * linesPerBlock}\t-1\t")
+                rows.append(f"3\t1\t{blockNum}\t1\t0\t0\t100\t{top}\t2000\t{40 * linesPerBlock}\t-1\t")
+
+            lineNum = lineIndex % linesPerBlock + 1
+
+            if wordNum % wordsPerLine == 0:
+                top += 40
+                rows.append(f"4\t1\t{blockNum}\t1\t{lineNum}\t0\t100\t{top}\t2000\t36\t-1\t")
+
+            word = self.random.choice(mainIngredients + sides + verbs).split(" ")[0]
+            left = 100 + (wordNum % wordsPerLine) * 240
+            conf = round(self.random.uniform(20, 96), 6)
+
+            rows.append(f"5\t1\t{blockNum}\t1\t{lineNum}\t{wordNum % wordsPerLine + 1}"
+                        f"\t{left}\t{top}\t220\t36\t{conf}\t{word}")
+
+        return "\n".join(rows) + "\n"
@@ -0,0 +1,143 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from MealieApi import MealieApi
+
+
+# Both watchers return changes as dicts with at least the recipe's "slug". Polled changes are recipe
+# summaries (with "id" and "updateAt"); webhook changes have "isDeleted" set for deleted recipes.
+# Changes are returned again until commit() is called, so a batch that couldn't be processed is retried.
+
+# Polls Mealie for recipes updated since the most recent update seen so far
+class RecipePoller():
+    def __init__(self, logger: logging.Logger, mealieApi: MealieApi, interval: float, cursor: str) -> None:
+        self.logger = logger
+        self.mealieApi = mealieApi
+        self.interval = interval
+        self.cursor = cursor
+        self.nextCursor = cursor
+
+    def waitForChanges(self) -> list[dict]:
+        time.sleep(self.interval)
+
+        # Recipes updated at exactly the cursor are returned again, since another recipe could've
+        # been updated at the same time; already validated ones are filtered out by the caller
+        summaries = self.mealieApi.getRecipeSummariesUpdatedSince(self.cursor)
+
+        self.logger.debug(f"Polled {len(summaries)} recipe(s) updated since {self.cursor}")
+
+        if summaries:
+            self.nextCursor = max(self.cursor or "", *(s.get("updateAt") or "" for s in summaries))
+
+        return summaries
+
+    def commit(self) -> None:
+        self.cursor = self.nextCursor
+
+    def close(self) -> None:
+        pass
+
+
+# Listens for Mealie's event notifications (JSON notifier) on a local port. Recipe events carry
+# the recipe's slug and operation in "document_data", e.g.:
+#   {"event_type": "recipe_updated", "document_data": {"document_type": "recipe",
+#    "operation": "update", "recipe_slug": "my-recipe"}, ...}
+class WebhookListener():
+    def __init__(self,
+                 logger: logging.Logger,
+                 host: str,
+                 port: int,
+                 debounce: float = 1.0,
+                 retryInterval: float = 30.0) -> None:
+        self.logger = logger
+        self.debounce = debounce
+        self.retryInterval = retryInterval
+        self.changes = queue.Queue()
+        self.pendingChanges = []
+
+        listener = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except (ValueError, UnicodeDecodeError):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+
+                listener.handleEvent(payload)
+
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                listener.logger.debug(f"Webhook request: {format % args}")
+
+        self.server = ThreadingHTTPServer((host, port), RequestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.logger.info(f"Listening for Mealie events on {host}:{self.server.server_port}")
+
+    def handleEvent(self, payload: dict) -> None:
+        documentData = payload.get("document_data") or {}
+        slug = documentData.get("recipe_slug") or payload.get("slug")
+
+        if not slug:
+            self.logger.debug(f"Ignoring event without recipe: {payload.get('event_type')}")
+            return
+
+        self.logger.debug(f"Received event '{payload.get('event_type')}' for recipe '{slug}'")
+
+        self.changes.put({
+            "slug": slug,
+            "isDeleted": documentData.get("operation") == "delete"
+        })
+
+    def waitForChanges(self) -> list[dict]:
+        changes = list(self.pendingChanges)
+
+        if changes:
+            # Uncommitted changes are retried after a while, along with any events received meanwhile
+            deadline = time.monotonic() + self.retryInterval
+
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    changes.append(self.changes.get(timeout=min(remaining, 1)))
+                except queue.Empty:
+                    continue
+        else:
+            # Short timeouts keep the main thread responsive to Ctrl+C
+            while True:
+                try:
+                    changes = [self.changes.get(timeout=1)]
+                    break
+                except queue.Empty:
+                    continue
+
+            # Mealie sends several events when a recipe is saved; batch them together
+            deadline = time.monotonic() + self.debounce
+
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    changes.append(self.changes.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+        # Latest event per recipe wins
+        self.pendingChanges = list({c["slug"]: c for c in changes}.values())
+
+        return self.pendingChanges
+
+    def commit(self) -> None:
+        self.pendingChanges = []
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
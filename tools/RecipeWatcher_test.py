@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+import unittest
+import urllib.request
+
+from RecipeWatcher import RecipePoller, WebhookListener
+
+
+logger = logging.getLogger("test")
+
+
+class FakeMealieApi():
+    def __init__(self, responses: list[list[dict]]) -> None:
+        self.responses = responses
+        self.cursors = []
+
+    def getRecipeSummariesUpdatedSince(self, updatedSince: str) -> list[dict]:
+        self.cursors.append(updatedSince)
+        return self.responses.pop(0)
+
+
+def createEvent(slug: str, operation: str = "update") -> dict:
+    return {
+        "event_type": f"recipe_{operation}d",
+        "document_data": {"document_type": "recipe", "operation": operation, "recipe_slug": slug}
+    }
+
+
+class TestRecipePoller(unittest.TestCase):
+    def test_whenRecipesUpdatedThenCursorAdvances(self):
+        # Arrange
+        summaries = [
+            {"id": "1", "slug": "recipe-a", "updateAt": "2024-01-02T10:00:00"},
+            {"id": "2", "slug": "recipe-b", "updateAt": "2024-01-03T10:00:00"}
+        ]
+        mealieApi = FakeMealieApi([summaries, [], [summaries[1]]])
+        poller = RecipePoller(logger, mealieApi, interval=0, cursor="2024-01-01T10:00:00")
+
+        # Act
+        changes = []
+
+        for _ in range(3):
+            changes.append(poller.waitForChanges())
+            poller.commit()
+
+        # Assert
+        self.assertEqual(changes, [summaries, [], [summaries[1]]], "Expected polled summaries")
+        self.assertEqual(mealieApi.cursors, [
+            "2024-01-01T10:00:00",
+            "2024-01-03T10:00:00",
+            "2024-01-03T10:00:00"
+        ], "Expected cursor to advance to the latest update only")
+
+    def test_whenNoCursorThenFirstUpdateBecomesCursor(self):
+        # Arrange
+        mealieApi = FakeMealieApi([[{"id": "1", "slug": "recipe-a", "updateAt": "2024-01-02T10:00:00"}]])
+        poller = RecipePoller(logger, mealieApi, interval=0, cursor=None)
+
+        # Act
+        poller.waitForChanges()
+        poller.commit()
+
+        # Assert
+        self.assertEqual(poller.cursor, "2024-01-02T10:00:00", "Expected cursor to be set")
+
+    def test_whenChangesNotCommittedThenPolledAgain(self):
+        # Arrange
+        summaries = [{"id": "1", "slug": "recipe-a", "updateAt": "2024-01-02T10:00:00"}]
+        mealieApi = FakeMealieApi([summaries, summaries])
+        poller = RecipePoller(logger, mealieApi, interval=0, cursor="2024-01-01T10:00:00")
+
+        # Act
+        firstChanges = poller.waitForChanges()
+        secondChanges = poller.waitForChanges()
+
+        # Assert
+        self.assertEqual((firstChanges, secondChanges), (summaries, summaries), "Expected changes to be polled again")
+        self.assertEqual(mealieApi.cursors, ["2024-01-01T10:00:00", "2024-01-01T10:00:00"],
+                         "Expected cursor not to advance")
+
+
+class TestWebhookListener(unittest.TestCase):
+    def setUp(self):
+        self.listener = WebhookListener(logger, "127.0.0.1", 0, debounce=0.2, retryInterval=0.2)
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_whenRecipeEventThenChangeQueued(self):
+        # Act
+        self.listener.handleEvent(createEvent("recipe-a"))
+        self.listener.handleEvent(createEvent("recipe-b", "delete"))
+
+        # Assert
+        self.assertEqual(self.listener.waitForChanges(), [
+            {"slug": "recipe-a", "isDeleted": False},
+            {"slug": "recipe-b", "isDeleted": True}
+        ], "Expected one change per recipe")
+
+    def test_whenEventWithoutRecipeThenIgnored(self):
+        # Act
+        self.listener.handleEvent({"event_type": "user_signup", "document_data": {"document_type": "user"}})
+
+        # Assert
+        self.assertTrue(self.listener.changes.empty(), "Expected no change")
+
+    def test_whenSeveralEventsForRecipeThenLatestWins(self):
+        # Arrange
+        self.listener.handleEvent(createEvent("recipe-a"))
+
+        # Act
+        self.listener.handleEvent(createEvent("recipe-a"))
+        self.listener.handleEvent(createEvent("recipe-a", "delete"))
+
+        # Assert
+        self.assertEqual(self.listener.waitForChanges(), [{"slug": "recipe-a", "isDeleted": True}],
+                         "Expected a single change with the latest event")
+
+    def test_whenEventsArriveWithinDebounceThenBatched(self):
+        # Arrange
+        self.listener.handleEvent(createEvent("recipe-a"))
+
+        # Act
+        def sendLaterEvent():
+            time.sleep(0.05)
+            self.listener.handleEvent(createEvent("recipe-b"))
+
+        thread = threading.Thread(target=sendLaterEvent)
+        thread.start()
+        changes = self.listener.waitForChanges()
+        thread.join()
+
+        # Assert
+        self.assertEqual([c["slug"] for c in changes], ["recipe-a", "recipe-b"], "Expected events to be batched")
+
+    def test_whenEventsArriveAfterDebounceThenNextBatch(self):
+        # Arrange
+        self.listener.handleEvent(createEvent("recipe-a"))
+        firstChanges = self.listener.waitForChanges()
+        self.listener.commit()
+
+        # Act
+        self.listener.handleEvent(createEvent("recipe-a"))
+        secondChanges = self.listener.waitForChanges()
+
+        # Assert
+        self.assertEqual((len(firstChanges), len(secondChanges)), (1, 1), "Expected one change per batch")
+
+    def test_whenChangesNotCommittedThenRetriedWithNewEvents(self):
+        # Arrange
+        self.listener.handleEvent(createEvent("recipe-a"))
+        self.listener.handleEvent(createEvent("recipe-b"))
+        self.listener.waitForChanges()
+
+        # Act
+        self.listener.handleEvent(createEvent("recipe-b", "delete"))
+        self.listener.handleEvent(createEvent("recipe-c"))
+        changes = self.listener.waitForChanges()
+
+        # Assert
+        self.assertEqual(changes, [
+            {"slug": "recipe-a", "isDeleted": False},
+            {"slug": "recipe-b", "isDeleted": True},
+            {"slug": "recipe-c", "isDeleted": False}
+        ], "Expected uncommitted changes merged with the new events")
+
+    def test_whenEventPostedThenChangeQueued(self):
+        # Arrange
+        url = f"http://127.0.0.1:{self.listener.server.server_port}"
+        request = urllib.request.Request(url, data=json.dumps(createEvent("recipe-a")).encode("utf-8"), method="POST")
+
+        # Act
+        with urllib.request.urlopen(request, timeout=5) as response:
+            status = response.status
+
+        # Assert
+        self.assertEqual(status, 204, "Expected event to be accepted")
+        self.assertEqual(self.listener.waitForChanges(), [{"slug": "recipe-a", "isDeleted": False}],
+                         "Expected posted event to be queued")
@@ -0,0 +1,251 @@
+import csv
+import gzip
+import json
+import logging
+import time
+from typing import Callable, Iterator
+
+
+# Appends report records to an NDJSON file (one JSON object per line) as they are produced, so
+# large reports don't have to be held in memory and a crash only loses the last unflushed records.
+# The finalisers turn the NDJSON file into the pretty JSON reports the tools used to write.
+class NdjsonReportWriter():
+    def __init__(self,
+                 filePath: str,
+                 isDryRun: bool = False,
+                 flushEvery: int = 100,
+                 flushInterval: float = 5.0) -> None:
+        self.logger = logging.getLogger("report-writer")
+        self.filePath = filePath
+        self.isDryRun = isDryRun
+        self.flushEvery = flushEvery
+        self.flushInterval = flushInterval
+        self.recordCount = 0
+        self.pendingCount = 0
+        self.lastFlush = time.monotonic()
+        self.file = None
+
+        if isDryRun:
+            self.logger.warning(f"[DRY RUN] Would've written report file '{filePath}'")
+        else:
+            self.file = open(filePath, mode="w", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, record: dict) -> None:
+        self.recordCount += 1
+
+        if self.isDryRun:
+            return
+
+        self.file.write(json.dumps(record, default=lambda o: o.__dict__, ensure_ascii=False))
+        self.file.write("\n")
+        self.pendingCount += 1
+
+        if (self.pendingCount >= self.flushEvery or
+            time.monotonic() - self.lastFlush >= self.flushInterval):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.file:
+            self.file.flush()
+
+        self.pendingCount = 0
+        self.lastFlush = time.monotonic()
+
+    def close(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+
+        self.logger.debug(f"Wrote {self.recordCount} record(s) to '{self.filePath}'")
+
+    @staticmethod
+    def readRecords(filePath: str) -> Iterator[dict]:
+        with open(filePath, encoding="utf-8") as ndjsonFile:
+            for line in ndjsonFile:
+                if not line.endswith("\n"):
+                    # Last line was cut short by a crash; everything before it is still valid
+                    logging.getLogger("report-writer").warning(
+                        f"Ignoring incomplete last record in '{filePath}'"
+                    )
+                    return
+
+                yield json.loads(line)
+
+    # Writes {record[keyField]: record without keyField, ...}
+    def finaliseAsObject(self, jsonPath: str, keyField: str) -> None:
+        def items(records):
+            for record in records:
+                value = {k: v for k, v in record.items() if k != keyField}
+                yield record[keyField], value
+
+        self.finalise(jsonPath, lambda records: writeJsonObject(records, items))
+
+    # Writes {listKey: [transform(record), ...]}
+    def finaliseAsList(self, jsonPath: str, listKey: str, transform: Callable[[dict], object]) -> None:
+        def items(records):
+            yield listKey, JsonListStream(transform(r) for r in records)
+
+        self.finalise(jsonPath, lambda records: writeJsonObject(records, items))
+
+    def finalise(self, jsonPath: str, writer: Callable[[Iterator[dict]], Iterator[str]]) -> None:
+        self.close()
+
+        if self.isDryRun:
+            self.logger.warning(f"[DRY RUN] Would've written report file '{jsonPath}'")
+            return
+
+        self.logger.debug(f"Writing '{jsonPath}' from '{self.filePath}'")
+
+        with open(jsonPath, mode="w", encoding="utf-8") as jsonFile:
+            for chunk in writer(NdjsonReportWriter.readRecords(self.filePath)):
+                jsonFile.write(chunk)
+
+
+# Streams table rows to a TSV file as they are produced, gzip-compressed if the path ends with
+# ".gz". Columns are (name, type) pairs; types are only used by ParquetReportWriter.
+class TsvReportWriter():
+    def __init__(self, filePath: str, columns: list[tuple[str, str]], isDryRun: bool = False) -> None:
+        self.logger = logging.getLogger("report-writer")
+        self.filePath = filePath
+        self.isDryRun = isDryRun
+        self.rowCount = 0
+        self.file = None
+
+        if isDryRun:
+            self.logger.warning(f"[DRY RUN] Would've written report file '{filePath}'")
+            return
+
+        if filePath.endswith(".gz"):
+            self.file = gzip.open(filePath, mode="wt", encoding="utf-8", newline="")
+        else:
+            self.file = open(filePath, mode="w", encoding="utf-8", newline="")
+
+        self.writer = csv.writer(self.file, delimiter="\t")
+        self.writer.writerow([name for name, _ in columns])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, row: list) -> None:
+        self.rowCount += 1
+
+        if not self.isDryRun:
+            self.writer.writerow(row)
+
+    def close(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+
+        self.logger.debug(f"Wrote {self.rowCount} row(s) to '{self.filePath}'")
+
+
+# Streams table rows to a Parquet file, one row group every batchSize rows. Columns are
+# (name, type) pairs, where type is a pyarrow type alias (e.g. "string", "uint8").
+class ParquetReportWriter():
+    def __init__(self,
+                 filePath: str,
+                 columns: list[tuple[str, str]],
+                 isDryRun: bool = False,
+                 batchSize: int = 100_000) -> None:
+        import pyarrow # Only required for Parquet reports
+        import pyarrow.parquet
+
+        self.logger = logging.getLogger("report-writer")
+        self.filePath = filePath
+        self.isDryRun = isDryRun
+        self.batchSize = batchSize
+        self.rowCount = 0
+        self.schema = pyarrow.schema([(name, pyarrow.type_for_alias(t)) for name, t in columns])
+        self.batch = []
+        self.writer = None
+
+        if isDryRun:
+            self.logger.warning(f"[DRY RUN] Would've written report file '{filePath}'")
+        else:
+            self.writer = pyarrow.parquet.ParquetWriter(filePath, self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, row: list) -> None:
+        self.rowCount += 1
+
+        if self.isDryRun:
+            return
+
+        self.batch.append(row)
+
+        if len(self.batch) >= self.batchSize:
+            self.flush()
+
+    def flush(self) -> None:
+        import pyarrow
+
+        if self.writer and self.batch:
+            columns = [list(c) for c in zip(*self.batch)]
+            self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+        self.batch = []
+
+    def close(self) -> None:
+        if self.writer:
+            self.flush()
+            self.writer.close()
+            self.writer = None
+
+        self.logger.debug(f"Wrote {self.rowCount} row(s) to '{self.filePath}'")
+
+
+# Wraps a generator so writeJsonValue() streams it as a JSON list
+class JsonListStream():
+    def __init__(self, items: Iterator) -> None:
+        self.items = items
+
+
+def dumpJson(value) -> str:
+    return json.dumps(value, default=lambda o: o.__dict__, indent=2, ensure_ascii=False)
+
+
+def indentJson(text: str, level: int) -> str:
+    return text.replace("\n", "\n" + "  " * level)
+
+
+# Streams the same output as json.dumps(value, indent=2), one item at a time
+def writeJsonValue(value, level: int) -> Iterator[str]:
+    if not isinstance(value, JsonListStream):
+        yield indentJson(dumpJson(value), level)
+        return
+
+    isEmpty = True
+
+    for item in value.items:
+        yield "[\n" if isEmpty else ",\n"
+        yield "  " * (level + 1) + indentJson(dumpJson(item), level + 1)
+        isEmpty = False
+
+    yield "[]" if isEmpty else "\n" + "  " * level + "]"
+
+
+def writeJsonObject(records: Iterator[dict], items: Callable) -> Iterator[str]:
+    isEmpty = True
+
+    for key, value in items(records):
+        yield "{\n" if isEmpty else ",\n"
+        yield f"  {json.dumps(key, ensure_ascii=False)}: "
+        yield from writeJsonValue(value, 1)
+        isEmpty = False
+
+    yield "{}" if isEmpty else "\n}"
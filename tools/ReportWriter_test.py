@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+import unittest
+
+from ReportWriter import NdjsonReportWriter
+
+
+class TestNdjsonReportWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.ndjsonPath = os.path.join(self.directory.name, "report.ndjson")
+        self.jsonPath = os.path.join(self.directory.name, "report.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_whenFinalisedAsObjectThenSameAsPrettyJson(self):
+        # Arrange
+        records = [
+            {"slug": "recipe-a", "issues": [{"tagName": "Tag é", "code": "MISSING", "reason": None}]},
+            {"slug": "recipe-b", "issues": []},
+        ]
+        expectedResult = json.dumps(
+            {r["slug"]: {"issues": r["issues"]} for r in records},
+            indent=2,
+            ensure_ascii=False
+        )
+
+        # Act
+        writer = NdjsonReportWriter(self.ndjsonPath)
+        for record in records:
+            writer.write(record)
+        writer.finaliseAsObject(self.jsonPath, keyField="slug")
+
+        # Assert
+        with open(self.jsonPath, encoding="utf-8") as jsonFile:
+            self.assertEqual(jsonFile.read(), expectedResult, "Expected legacy pretty JSON")
+
+    def test_whenFinalisedAsEmptyListThenSameAsPrettyJson(self):
+        # Arrange
+        expectedResult = json.dumps({"potentialDuplicates": []}, indent=2)
+
+        # Act
+        writer = NdjsonReportWriter(self.ndjsonPath)
+        writer.finaliseAsList(self.jsonPath, listKey="potentialDuplicates", transform=lambda r: r)
+
+        # Assert
+        with open(self.jsonPath, encoding="utf-8") as jsonFile:
+            self.assertEqual(jsonFile.read(), expectedResult, "Expected legacy pretty JSON")
+
+    def test_whenLastRecordIncompleteThenIgnored(self):
+        # Arrange
+        with NdjsonReportWriter(self.ndjsonPath) as writer:
+            writer.write({"slug": "recipe-a"})
+
+        with open(self.ndjsonPath, mode="a", encoding="utf-8") as ndjsonFile:
+            ndjsonFile.write('{"slug": "reci')
+
+        # Act
+        records = list(NdjsonReportWriter.readRecords(self.ndjsonPath))
+
+        # Assert
+        self.assertEqual(records, [{"slug": "recipe-a"}], "Expected only the complete record")
@@ -0,0 +1,447 @@
+import json
+import logging
+import pathlib
+import time
+from collections import Counter
+from enum import StrEnum
+from models.CategorySummary import CategorySummary
+from models.Recipe import Recipe
+from models.RecipeTag import RecipeTag
+from typing import Callable
+
+
+class TagValidationResultCode(StrEnum):
+    OK = "OK"
+    Unknown = "UNKNOWN"
+    Conflict = "CONFLICT"
+    Missing = "MISSING"
+
+
+class TagValidationResult():
+    tagName: str
+    code: TagValidationResultCode
+    reason: str
+
+    def __init__(self, tagName: str, code: TagValidationResultCode, reason: str = None) -> None:
+        self.tagName = tagName
+        self.code = code
+        self.reason = reason
+
+    @staticmethod
+    def from_json(json_dct):
+        return TagValidationResult(
+            tagName = json_dct["tagName"],
+            code = TagValidationResultCode(json_dct["code"]),
+            reason = json_dct.get("reason")
+            )
+
+    def to_json(self) -> dict:
+        return {
+            "tagName": self.tagName,
+            "code": self.code,
+            "reason": self.reason,
+        }
+
+
+# Facts about a single recipe, evaluated on first use and shared by all rules
+class RecipeFacts():
+    recipe: Recipe
+    tagSlugs: set[str]
+    categorySlugs: set[str]
+
+    def __init__(self, recipe: Recipe, evaluators: dict[str, Callable[["RecipeFacts"], dict]]) -> None:
+        self.recipe = recipe
+        self.tagSlugs = {t.slug for t in recipe.tags}
+        self.categorySlugs = {c.slug for c in recipe.categories}
+        self.evaluators = evaluators
+        self.values = {}
+
+    def get(self, name: str) -> bool:
+        if name not in self.values:
+            # Evaluators may compute several facts in the same pass
+            self.values.update(self.evaluators[name](self))
+
+        return self.values[name]
+
+
+class RuleCheck():
+    conditions: list[tuple[str, bool]]
+    code: TagValidationResultCode
+    reason: str
+
+    def __init__(self, conditions: list[tuple[str, bool]], code: TagValidationResultCode, reason: str) -> None:
+        self.conditions = conditions
+        self.code = code
+        self.reason = reason
+
+    def matches(self, facts: RecipeFacts) -> bool:
+        for name, expected in self.conditions:
+            if facts.get(name) != expected:
+                return False
+
+        return True
+
+
+# Rule bound to its resolved flag tag, with timing and hit counts collected across the run
+class CompiledRule():
+    tag: RecipeTag
+    tagName: str
+    isFixable: bool
+    whenPresent: list[RuleCheck]
+    whenAbsent: list[RuleCheck]
+    elapsed: float
+    hits: Counter
+
+    def __init__(self,
+                 tag: RecipeTag,
+                 whenPresent: list[RuleCheck],
+                 whenAbsent: list[RuleCheck],
+                 reasonContext: Callable[[Recipe], dict] = None,
+                 isFixable: bool = True) -> None:
+        self.tag = tag
+        self.tagName = tag.name
+        self.isFixable = isFixable
+        self.whenPresent = whenPresent
+        self.whenAbsent = whenAbsent
+        self.reasonContext = reasonContext
+        self.elapsed = 0.0
+        self.hits = Counter()
+
+    def validate(self, facts: RecipeFacts) -> TagValidationResult:
+        checks = self.whenPresent if self.tag.slug in facts.tagSlugs else self.whenAbsent
+
+        for check in checks:
+            if check.matches(facts):
+                return TagValidationResult(self.tagName, check.code, self.formatReason(check, facts.recipe))
+
+        return TagValidationResult(self.tagName, TagValidationResultCode.OK)
+
+    def formatReason(self, check: RuleCheck, recipe: Recipe) -> str:
+        context = {"tag": self.tagName}
+
+        if self.reasonContext:
+            context.update(self.reasonContext(recipe))
+
+        return check.reason.format(**context)
+
+    def run(self, facts: RecipeFacts) -> TagValidationResult:
+        start = time.perf_counter()
+        result = self.validate(facts)
+        self.elapsed += time.perf_counter() - start
+
+        self.hits[result.code] += 1
+
+        return result
+
+
+def computeIngredientFacts(recipe: Recipe, titles: set[str]) -> dict[str, bool]:
+    amountsDisabled = bool(recipe.settings and recipe.settings.disableAmount)
+    allHaveFood = True
+    allValid = True
+    foundTitles = set()
+
+    for ingredient in recipe.ingredients:
+        if ingredient.title in titles:
+            foundTitles.add(ingredient.title)
+
+        if not ingredient.food:
+            allHaveFood = False
+
+        if amountsDisabled:
+            if not ingredient.note:
+                allValid = False
+        elif not ingredient.food or (ingredient.quantity or 0) <= 0:
+            allValid = False
+
+    facts = {
+        "hasIngredients": len(recipe.ingredients) > 0,
+        "allIngredientsHaveFood": allHaveFood,
+        "allIngredientsValid": allValid,
+    }
+
+    for title in titles:
+        facts[f"ingredientTitle:{title}"] = title in foundTitles
+
+    return facts
+
+
+def computeInstructionFacts(recipe: Recipe) -> dict[str, bool]:
+    allValid = True
+    allHaveImages = True
+
+    for step in recipe.instructions:
+        if not step.title and not step.text:
+            allValid = False
+
+        if not step.text or "<img" not in step.text:
+            allHaveImages = False
+
+    return {
+        "hasInstructions": len(recipe.instructions) > 0,
+        "allInstructionsValid": allValid,
+        "allInstructionsHaveImages": allHaveImages,
+    }
+
+
+# Duplicate recipes should have link(s) to its other equivalent recipe(s) in the Extras section
+def computeDuplicateExtrasFacts(recipe: Recipe) -> dict[str, bool]:
+    extras = {k: v for k, v in (recipe.extras or {}).items() if k.startswith("duplicate")}
+
+    return {
+        "hasDuplicateExtras": len(extras) > 0,
+        "allDuplicateExtrasHaveUrls": all(extras.values()),
+    }
+
+
+def computeOtherFacts(recipe: Recipe) -> dict[str, bool]:
+    return {
+        "hasTools": len(recipe.tools) > 0,
+        "hasAllNutritionFacts": bool(recipe.nutrition) and all(vars(recipe.nutrition).values()),
+        "amountsDisabled": bool(recipe.settings and recipe.settings.disableAmount),
+    }
+
+
+ingredientFactNames = ["hasIngredients", "allIngredientsHaveFood", "allIngredientsValid"]
+instructionFactNames = ["hasInstructions", "allInstructionsValid", "allInstructionsHaveImages"]
+duplicateExtrasFactNames = ["hasDuplicateExtras", "allDuplicateExtrasHaveUrls"]
+otherFactNames = ["hasTools", "hasAllNutritionFacts", "amountsDisabled"]
+
+
+# Compiles a declarative rule set (see tag-rules.json) into rules evaluated over shared recipe facts.
+#
+# Rule types:
+#   - exclusive: the flag tag and any of "tags" (or "categories") are mutually exclusive
+#   - field: the flag tag and recipe field "field" are mutually exclusive
+#   - checks: ordered "whenPresent"/"whenAbsent" checks; the first check whose facts all hold
+#     gives the result code and reason
+#
+# Facts used in checks (prefix with "!" to negate): hasIngredients, allIngredientsHaveFood,
+# allIngredientsValid, ingredientTitle:<title>, hasInstructions, allInstructionsValid,
+# allInstructionsHaveImages, hasTools, hasAllNutritionFacts, amountsDisabled, hasDuplicateExtras,
+# allDuplicateExtrasHaveUrls, hasTag:<slug>[,<slug>...], hasCategory:<slug>[,<slug>...],
+# field:<name>
+class TagRuleEngine():
+    rules: list[CompiledRule]
+
+    def __init__(self,
+                 logger: logging.Logger,
+                 ruleSet: dict,
+                 allTags: list[RecipeTag],
+                 allCategories: list[CategorySummary]) -> None:
+        self.logger = logger
+        self.rules = []
+        self.evaluators: dict[str, Callable[[RecipeFacts], dict]] = {}
+
+        self.compile(ruleSet, allTags, allCategories)
+
+    @staticmethod
+    def loadRuleSet(rulesPath: str) -> dict:
+        with open(rulesPath, encoding="utf-8") as rulesFile:
+            if pathlib.Path(rulesPath).suffix in [".yaml", ".yml"]:
+                import yaml # Only required for YAML rule sets
+                return yaml.safe_load(rulesFile)
+
+            return json.load(rulesFile)
+
+    def compile(self, ruleSet: dict, allTags: list[RecipeTag], allCategories: list[CategorySummary]):
+        self.logger.info("Compiling tag rules")
+
+        tagsBySlug = {t.slug: t for t in allTags}
+        categoriesBySlug = {c.slug: c for c in allCategories}
+
+        for definition in ruleSet["rules"]:
+            tag = tagsBySlug.get(definition["tag"])
+
+            if not tag:
+                self.logger.warning(f"Mealie doesn't have tag slug '{definition['tag']}'. Skipping validation.")
+                continue
+
+            self.logger.debug(f"Compiling rule for tag '{tag.name}'")
+
+            match definition.get("type"):
+                case "exclusive":
+                    rule = self.compileExclusiveRule(tag, definition, tagsBySlug, categoriesBySlug)
+                case "field":
+                    rule = self.compileFieldRule(tag, definition)
+                case "checks":
+                    rule = CompiledRule(
+                        tag,
+                        whenPresent=[self.compileCheck(c) for c in definition.get("whenPresent", [])],
+                        whenAbsent=[self.compileCheck(c) for c in definition.get("whenAbsent", [])],
+                        isFixable=definition.get("fixable", True)
+                    )
+                case _:
+                    raise ValueError(f"Unknown type '{definition.get('type')}' for rule '{definition['tag']}'")
+
+            self.rules.append(rule)
+
+        self.compileEvaluators()
+
+    def compileExclusiveRule(self,
+                             tag: RecipeTag,
+                             definition: dict,
+                             tagsBySlug: dict[str, RecipeTag],
+                             categoriesBySlug: dict[str, CategorySummary]) -> CompiledRule:
+        # Found names are listed in the rule's order rather than the recipe's, so reasons don't
+        # change when a recipe's tags are reordered
+        if "categories" in definition:
+            slugs = self.resolveSlugs(definition["categories"], categoriesBySlug)
+            names = {s: categoriesBySlug[s].name for s in definition["categories"] if s in slugs}
+            factName = f"hasCategory:{','.join(sorted(slugs))}"
+            defaultConflictReason = "Tag '{tag}' is present but also found category(ies): '{found}'"
+            reasonContext = lambda recipe: {
+                "found": self.joinFoundNames(names, recipe.categories)
+            }
+        else:
+            slugs = self.resolveSlugs(definition["tags"], tagsBySlug)
+            names = {s: tagsBySlug[s].name for s in definition["tags"] if s in slugs}
+            factName = f"hasTag:{','.join(sorted(slugs))}"
+            defaultConflictReason = "Tag '{tag}' is present but also found tag(s): '{found}'"
+            reasonContext = lambda recipe: {
+                "found": self.joinFoundNames(names, recipe.tags)
+            }
+
+        if definition.get("mandatory", False):
+            missingCode = TagValidationResultCode.Missing
+            defaultMissingReason = "Couldn't find corresponding tag(s) on recipe"
+        else:
+            missingCode = TagValidationResultCode.Unknown
+            defaultMissingReason = "Tag '{tag}' might need to be present"
+
+        return CompiledRule(
+            tag,
+            whenPresent=[
+                RuleCheck(
+                    [(factName, True)],
+                    TagValidationResultCode.Conflict,
+                    definition.get("conflictReason", defaultConflictReason)
+                )
+            ],
+            whenAbsent=[
+                RuleCheck(
+                    [(factName, False)],
+                    missingCode,
+                    definition.get("missingReason", defaultMissingReason)
+                )
+            ],
+            reasonContext=reasonContext,
+            isFixable=definition.get("fixable", True)
+        )
+
+    def compileFieldRule(self, tag: RecipeTag, definition: dict) -> CompiledRule:
+        fieldName = definition["field"]
+        factName = f"field:{fieldName}"
+
+        return CompiledRule(
+            tag,
+            whenPresent=[
+                RuleCheck(
+                    [(factName, True)],
+                    TagValidationResultCode.Conflict,
+                    definition.get(
+                        "conflictReason",
+                        "Tag '{tag}' is present but recipe has field '{field}' set to: {value}"
+                    )
+                )
+            ],
+            whenAbsent=[
+                RuleCheck(
+                    [(factName, False)],
+                    TagValidationResultCode.Missing,
+                    definition.get("missingReason", "Tag '{tag}' should be present")
+                )
+            ],
+            reasonContext=lambda recipe: {
+                "field": fieldName,
+                "value": getattr(recipe, fieldName)
+            },
+            isFixable=definition.get("fixable", True)
+        )
+
+    def compileCheck(self, definition: dict) -> RuleCheck:
+        conditions = []
+
+        for condition in definition["if"]:
+            if condition.startswith("!"):
+                conditions.append((condition[1:], False))
+            else:
+                conditions.append((condition, True))
+
+        return RuleCheck(conditions, TagValidationResultCode(definition["code"]), definition["reason"])
+
+    # Names (keyed by slug) of the items found among the recipe's items, in the names' order
+    @staticmethod
+    def joinFoundNames(names: dict[str, str], items: list) -> str:
+        itemSlugs = {i.slug for i in items}
+
+        return ", ".join(name for slug, name in names.items() if slug in itemSlugs)
+
+    def resolveSlugs(self, slugs: list[str], itemsBySlug: dict) -> frozenset[str]:
+        missingSlugs = [s for s in slugs if s not in itemsBySlug]
+
+        if missingSlugs:
+            self.logger.debug(f"Mealie doesn't have slug(s): {missingSlugs}")
+
+        return frozenset(s for s in slugs if s in itemsBySlug)
+
+    # Registers one evaluator per fact used by the rules. Facts computed in the same pass over a
+    # recipe (e.g. all ingredient facts) share an evaluator so the pass only happens once.
+    def compileEvaluators(self):
+        factNames = set()
+
+        for rule in self.rules:
+            for check in rule.whenPresent + rule.whenAbsent:
+                factNames.update(name for name, _ in check.conditions)
+
+        ingredientTitles = {n.partition(":")[2] for n in factNames if n.startswith("ingredientTitle:")}
+        ingredientFacts = lambda facts: computeIngredientFacts(facts.recipe, ingredientTitles)
+
+        for name in factNames:
+            kind, _, argument = name.partition(":")
+
+            if name in ingredientFactNames or kind == "ingredientTitle":
+                evaluator = ingredientFacts
+            elif name in instructionFactNames:
+                evaluator = lambda facts: computeInstructionFacts(facts.recipe)
+            elif name in duplicateExtrasFactNames:
+                evaluator = lambda facts: computeDuplicateExtrasFacts(facts.recipe)
+            elif name in otherFactNames:
+                evaluator = lambda facts: computeOtherFacts(facts.recipe)
+            elif kind == "hasTag":
+                evaluator = self.compileSetFact(name, argument, lambda facts: facts.tagSlugs)
+            elif kind == "hasCategory":
+                evaluator = self.compileSetFact(name, argument, lambda facts: facts.categorySlugs)
+            elif kind == "field":
+                evaluator = self.compileFieldFact(name, argument)
+            else:
+                raise ValueError(f"Unknown fact '{name}'")
+
+            self.evaluators[name] = evaluator
+
+    def compileSetFact(self, name: str, argument: str, recipeSlugs: Callable[[RecipeFacts], set[str]]):
+        slugs = frozenset(s for s in argument.split(",") if s)
+        return lambda facts: {name: not slugs.isdisjoint(recipeSlugs(facts))}
+
+    def compileFieldFact(self, name: str, fieldName: str):
+        return lambda facts: {name: bool(getattr(facts.recipe, fieldName))}
+
+    def validate(self, recipe: Recipe) -> list[TagValidationResult]:
+        facts = RecipeFacts(recipe, self.evaluators)
+        results: list[TagValidationResult] = []
+
+        for rule in self.rules:
+            results.append(rule.run(facts))
+
+        return results
+
+    # Number of rules whose flag tag the recipe doesn't need (i.e. none of the rule's "whenAbsent"
+    # checks match), regardless of its current tags. Higher means a more complete recipe.
+    def computeCompleteness(self, recipe: Recipe) -> int:
+        facts = RecipeFacts(recipe, self.evaluators)
+
+        return sum(1 for rule in self.rules if not any(c.matches(facts) for c in rule.whenAbsent))
+
+    def resetStats(self):
+        for rule in self.rules:
+            rule.elapsed = 0.0
+            rule.hits = Counter()
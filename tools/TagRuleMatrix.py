@@ -0,0 +1,174 @@
+import logging
+import numpy as np
+import time
+
+from models.Recipe import Recipe
+from TagRuleEngine import CompiledRule, RecipeFacts, TagRuleEngine, TagValidationResult, TagValidationResultCode
+from typing import Callable
+
+
+# Evaluates a compiled rule set over a whole batch of recipes at once. Recipes' tags and
+# categories are loaded into recipe×tag and recipe×category boolean matrices, so tag, category and
+# field facts (and the exclusive, mandatory and field rules built on them) become column
+# operations. Other facts (e.g. ingredient facts) are still computed per recipe, but only once per
+# batch, and the rules' checks are then applied to whole columns.
+#
+# Reading the recipes' attributes into arrays, not the rules' column operations, is what most of
+# evaluate()'s time goes to. Flattening ingredients and instruction steps into per-attribute arrays
+# and summing them per recipe isn't any faster than computing their facts in one pass per recipe,
+# as it still reads the same attributes one Python object at a time.
+#
+# Gives the same results as TagRuleEngine.validate() for each recipe.
+class TagRuleMatrix():
+    engine: TagRuleEngine
+
+    def __init__(self, logger: logging.Logger, engine: TagRuleEngine) -> None:
+        self.logger = logger
+        self.engine = engine
+        self.factNames = sorted({
+            name
+            for rule in engine.rules
+            for check in rule.whenPresent + rule.whenAbsent
+            for name, _ in check.conditions
+        })
+
+        tagSlugs = {rule.tag.slug for rule in engine.rules}
+        categorySlugs = set()
+
+        for name in self.factNames:
+            kind, _, argument = name.partition(":")
+
+            if kind == "hasTag":
+                tagSlugs.update(s for s in argument.split(",") if s)
+            elif kind == "hasCategory":
+                categorySlugs.update(s for s in argument.split(",") if s)
+
+        self.tagColumns = {slug: i for i, slug in enumerate(sorted(tagSlugs))}
+        self.categoryColumns = {slug: i for i, slug in enumerate(sorted(categorySlugs))}
+
+    def buildMatrix(self, recipes: list[Recipe],
+                    columns: dict[str, int],
+                    organizers: Callable[[Recipe], list]) -> np.ndarray:
+        rows = []
+        cols = []
+
+        for i, recipe in enumerate(recipes):
+            for organizer in organizers(recipe):
+                column = columns.get(organizer.slug)
+
+                if column is not None:
+                    rows.append(i)
+                    cols.append(column)
+
+        matrix = np.zeros((len(recipes), len(columns)), dtype=bool)
+        matrix[rows, cols] = True
+
+        return matrix
+
+    def anyColumn(self, matrix: np.ndarray, columns: dict[str, int], argument: str) -> np.ndarray:
+        indices = [columns[s] for s in argument.split(",") if s]
+        return matrix[:, indices].any(axis=1)
+
+    def computeFacts(self, recipes: list[Recipe],
+                     tagMatrix: np.ndarray,
+                     categoryMatrix: np.ndarray) -> dict[str, np.ndarray]:
+        facts = {}
+        recipeFactNames = []
+
+        for name in self.factNames:
+            kind, _, argument = name.partition(":")
+
+            match kind:
+                case "hasTag":
+                    facts[name] = self.anyColumn(tagMatrix, self.tagColumns, argument)
+                case "hasCategory":
+                    facts[name] = self.anyColumn(categoryMatrix, self.categoryColumns, argument)
+                case "field":
+                    facts[name] = np.fromiter(
+                        (bool(getattr(r, argument)) for r in recipes),
+                        dtype=bool,
+                        count=len(recipes)
+                    )
+                case _:
+                    recipeFactNames.append(name)
+
+        if recipeFactNames:
+            rows = []
+
+            for recipe in recipes:
+                recipeFacts = RecipeFacts(recipe, self.engine.evaluators)
+                rows.append([recipeFacts.get(name) for name in recipeFactNames])
+
+            columns = np.array(rows, dtype=bool).reshape(len(recipes), len(recipeFactNames))
+            facts.update(zip(recipeFactNames, columns.T))
+
+        return facts
+
+    # Returns, for each recipe and rule, the index of the matching check in
+    # rule.whenPresent + rule.whenAbsent, or -1 if no check matches (i.e. the result is OK)
+    def evaluateRule(self, rule: CompiledRule,
+                     isPresent: np.ndarray,
+                     facts: dict[str, np.ndarray]) -> np.ndarray:
+        matches = np.full(len(isPresent), -1, dtype=np.int16)
+        checkIndex = 0
+
+        for remaining, checks in [(isPresent.copy(), rule.whenPresent), (~isPresent, rule.whenAbsent)]:
+            for check in checks:
+                matched = remaining.copy()
+
+                for name, expected in check.conditions:
+                    matched &= facts[name] if expected else ~facts[name]
+
+                matches[matched] = checkIndex
+                remaining &= ~matched
+                checkIndex += 1
+
+        return matches
+
+    def evaluate(self, recipes: list[Recipe]) -> np.ndarray:
+        start = time.perf_counter()
+
+        tagMatrix = self.buildMatrix(recipes, self.tagColumns, lambda r: r.tags)
+        categoryMatrix = self.buildMatrix(recipes, self.categoryColumns, lambda r: r.categories)
+        facts = self.computeFacts(recipes, tagMatrix, categoryMatrix)
+
+        self.logger.debug(f"Built {len(self.tagColumns)} tag, {len(self.categoryColumns)} category and"
+                          f" {len(facts)} fact column(s) for {len(recipes)} recipe(s)"
+                          f" in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        matches = np.empty((len(recipes), len(self.engine.rules)), dtype=np.int16)
+
+        for j, rule in enumerate(self.engine.rules):
+            ruleStart = time.perf_counter()
+            matches[:, j] = self.evaluateRule(rule, tagMatrix[:, self.tagColumns[rule.tag.slug]], facts)
+            rule.elapsed += time.perf_counter() - ruleStart
+
+        return matches
+
+    # Returns each recipe's issues (i.e. non-OK results), in the same order as the recipes
+    def validate(self, recipes: list[Recipe]) -> list[list[TagValidationResult]]:
+        matches = self.evaluate(recipes)
+        issues = [[] for _ in recipes]
+
+        for j, rule in enumerate(self.engine.rules):
+            checks = rule.whenPresent + rule.whenAbsent
+            column = matches[:, j]
+            matchedRows = np.flatnonzero(column >= 0)
+
+            rule.hits[TagValidationResultCode.OK] += len(recipes) - len(matchedRows)
+
+            for k, check in enumerate(checks):
+                rows = np.flatnonzero(column == k).tolist()
+                rule.hits[check.code] += len(rows)
+
+                # Without a reason context, the reason is the same for all recipes
+                reason = rule.formatReason(check, None) if not rule.reasonContext else None
+
+                for i in rows:
+                    issues[i].append(TagValidationResult(
+                        rule.tagName,
+                        check.code,
+                        reason if reason is not None else rule.formatReason(check, recipes[i])
+                    ))
+
+        return issues
@@ -0,0 +1,114 @@
+import numpy as np
+import tesserocr
+
+from io import BytesIO
+from MealieOcr import MealieOcr
+from PIL import Image
+from tesserocr import PyTessBaseAPI, RIL
+
+
+# Runs Tesseract in-process through tesserocr. Unlike pytesseract, which starts a tesseract process
+# per image, writes the image and output to temporary files and reloads the language model each
+# time, this keeps one Tesseract API handle loaded per language and passes images in memory.
+# Results are built from Tesseract's result iterator the same way Tesseract builds its TSV output
+# (i.e. pytesseract.image_to_data()), so results are the same as MealieOcr's TSV parsing.
+class TesseractEngine():
+    def __init__(self) -> None:
+        self.apis: dict[str, PyTessBaseAPI] = {}
+
+    def __del__(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for api in self.apis.values():
+            api.End()
+
+        self.apis.clear()
+
+    @staticmethod
+    def getVersion() -> str:
+        return tesserocr.tesseract_version()
+
+    def getApi(self, lang: str = None) -> PyTessBaseAPI:
+        # Same default language as the tesseract command
+        lang = lang or "eng"
+
+        if lang not in self.apis:
+            self.apis[lang] = PyTessBaseAPI(lang=lang)
+
+        return self.apis[lang]
+
+    # imageData is an encoded image or a PIL image. timeout is in seconds; a RuntimeError is raised
+    # when recognition runs longer.
+    def runOcr(self, imageData, lang: str = None, timeout: float = 0) -> MealieOcr.OcrResult:
+        api = self.getApi(lang)
+        image = imageData if isinstance(imageData, Image.Image) else Image.open(BytesIO(imageData))
+        api.SetImage(image)
+
+        try:
+            if not api.Recognize(timeout=int(timeout * 1000)):
+                # Same message as pytesseract, so callers handle both engines the same way
+                raise RuntimeError("Tesseract process timeout")
+
+            return self.readResults(api, image.size)
+        finally:
+            api.Clear()
+
+    # Rows are added to the result's column lists directly, without building an OcrChunk per row
+    def readResults(self, api: PyTessBaseAPI, imageSize: tuple[int, int]) -> MealieOcr.OcrResult:
+        columns = {name: [] for name in MealieOcr.OcrResult.intColumns}
+        confs = []
+        texts = []
+
+        def addRow(level, pageNum, blockNum, parNum, lineNum, wordNum, box, conf=-1.0, text=""):
+            left, top, right, bottom = box
+            values = (level, pageNum, blockNum, parNum, lineNum, wordNum, left, top, right - left, bottom - top)
+
+            for name, value in zip(MealieOcr.OcrResult.intColumns, values, strict=True):
+                columns[name].append(value)
+
+            confs.append(float(conf))
+            texts.append(text)
+
+        addRow(1, 1, 0, 0, 0, 0, (0, 0, *imageSize))
+        iterator = api.GetIterator()
+        blockNum = parNum = lineNum = wordNum = 0
+
+        while iterator is not None:
+            if not iterator.Empty(RIL.WORD):
+                if iterator.IsAtBeginningOf(RIL.BLOCK):
+                    blockNum += 1
+                    parNum = lineNum = 0
+                    addRow(2, 1, blockNum, 0, 0, 0, iterator.BoundingBox(RIL.BLOCK))
+
+                if iterator.IsAtBeginningOf(RIL.PARA):
+                    parNum += 1
+                    lineNum = 0
+                    addRow(3, 1, blockNum, parNum, 0, 0, iterator.BoundingBox(RIL.PARA))
+
+                if iterator.IsAtBeginningOf(RIL.TEXTLINE):
+                    lineNum += 1
+                    wordNum = 0
+                    addRow(4, 1, blockNum, parNum, lineNum, 0, iterator.BoundingBox(RIL.TEXTLINE))
+
+                wordNum += 1
+                addRow(
+                    5,
+                    1,
+                    blockNum,
+                    parNum,
+                    lineNum,
+                    wordNum,
+                    iterator.BoundingBox(RIL.WORD),
+                    iterator.Confidence(RIL.WORD),
+                    iterator.GetUTF8Text(RIL.WORD).strip()
+                )
+
+            if not iterator.Next(RIL.WORD):
+                break
+
+        return MealieOcr.OcrResult.fromTexts(
+            {name: np.array(values, dtype=np.int32) for name, values in columns.items()},
+            np.array(confs, dtype=np.float64),
+            texts
+        )
@@ -0,0 +1,187 @@
+import itertools
+import json
+import logging
+import math
+import os
+
+from collections import Counter
+from rapidfuzz import fuzz, process
+from TitleSimilarity import ngrams
+
+
+# Persistent n-gram inverted index of recipe slugs, used to find the titles similar to a few new
+# ones without comparing the whole library again. Each slug gets the next slot number when it's
+# added and each n-gram lists the slots of the slugs containing it. Renamed recipes are removed
+# under their previous slug and added under the new one.
+#
+# Slot numbers are never reused, so the index's revision (i.e. the next slot number) tells which
+# slugs were added after a given point, even by another script.
+class TitleIndex():
+    ngramSize: int
+    metadata: dict
+
+    def __init__(self, logger: logging.Logger, ngramSize: int = 3) -> None:
+        self.logger = logger
+        self.ngramSize = ngramSize
+        self.metadata = {}
+        self.slots: dict[str, int] = {}
+        self.slugs: dict[int, str] = {}
+        self.postings: dict[str, set[int]] = {}
+        self.sizes: dict[int, int] = {} # Number of n-grams of each slot's slug
+        self.nextSlot = 0
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, slug: str) -> bool:
+        return slug in self.slots
+
+    @property
+    def revision(self) -> int:
+        return self.nextSlot
+
+    def addedSince(self, revision: int) -> list[str]:
+        return sorted(slug for slug, slot in self.slots.items() if slot >= revision)
+
+    def add(self, slug: str) -> None:
+        if slug in self.slots:
+            return
+
+        slot = self.nextSlot
+        self.nextSlot += 1
+        self.slots[slug] = slot
+        self.slugs[slot] = slug
+        slugNgrams = ngrams(slug, self.ngramSize)
+        self.sizes[slot] = len(slugNgrams)
+
+        for ngram in slugNgrams:
+            self.postings.setdefault(ngram, set()).add(slot)
+
+    def remove(self, slug: str) -> None:
+        slot = self.slots.pop(slug, None)
+
+        if slot is None:
+            return
+
+        del self.slugs[slot]
+        del self.sizes[slot]
+
+        for ngram in ngrams(slug, self.ngramSize):
+            postings = self.postings[ngram]
+            postings.discard(slot)
+
+            if not postings:
+                del self.postings[ngram]
+
+    # Brings the index in line with the library's current slugs; returns the (added, removed) slugs
+    def sync(self, slugs: list[str]) -> tuple[list[str], list[str]]:
+        current = set(slugs)
+        added = sorted(current - self.slots.keys())
+        removed = sorted(self.slots.keys() - current)
+
+        for slug in removed:
+            self.remove(slug)
+
+        for slug in added:
+            self.add(slug)
+
+        self.logger.debug(f"Title index synced: {len(added)} slug(s) added, {len(removed)} removed")
+
+        return added, removed
+
+    # Returns up to limit (slug, ratio) pairs of indexed slugs similar to text, best first. Only
+    # slugs with an n-gram similarity of at least minNgramSimilarity are scored (with fuzz.ratio,
+    # rounded like thefuzz's), and only ones scoring at least minRatio are returned.
+    def findSimilar(self, text: str,
+                    limit: int = 5,
+                    minRatio: int = 0,
+                    minNgramSimilarity: float = 0.4) -> list[tuple[str, int]]:
+        textNgrams = ngrams(text, self.ngramSize)
+
+        # Dice >= t requires sharing at least t / (2 - t) of the text's n-grams, so any similar
+        # enough slug contains one of the text's rarest len - minOverlap + 1 n-grams
+        minOverlap = math.ceil(minNgramSimilarity / (2 - minNgramSimilarity) * len(textNgrams))
+        ordered = sorted(textNgrams, key=lambda n: (len(self.postings.get(n, ())), n))
+        candidates = set()
+
+        for ngram in ordered[:len(ordered) - minOverlap + 1]:
+            candidates.update(self.postings.get(ngram, ()))
+
+        # Shared n-grams are counted from the postings instead of comparing n-gram sets
+        overlaps = Counter()
+
+        for ngram in textNgrams:
+            overlaps.update(self.postings.get(ngram, set()) & candidates)
+
+        choices = {
+            slot: self.slugs[slot]
+            for slot, overlap in overlaps.items()
+            if 2 * overlap / (len(textNgrams) + self.sizes[slot]) >= minNgramSimilarity
+            and self.slugs[slot] != text
+        }
+        scores = process.extract(
+            text,
+            choices,
+            scorer=fuzz.ratio,
+            score_cutoff=max(0, minRatio - 0.5), # Scores are rounded afterwards
+            limit=None
+        )
+        matches = [(slug, round(score)) for slug, score, _ in scores if round(score) >= minRatio]
+        matches.sort(key=lambda m: (-m[1], m[0]))
+
+        return matches[:limit] if limit else matches
+
+    def save(self, filePath: str, isDryRun: bool = False) -> None:
+        if isDryRun:
+            self.logger.warning(f"[DRY RUN] Would've written title index '{filePath}'")
+            return
+
+        self.logger.debug(f"Saving title index '{filePath}'")
+
+        index = {
+            "ngramSize": self.ngramSize,
+            "revision": self.nextSlot,
+            "metadata": self.metadata,
+            "slugs": dict(sorted(self.slots.items())),
+            "postings": {ngram: sorted(postings) for ngram, postings in sorted(self.postings.items())}
+        }
+
+        with open(filePath, mode="w", encoding="utf-8") as jsonFile:
+            jsonFile.write(json.dumps(index, ensure_ascii=False, separators=(",", ":")))
+
+    # Returns None if there's no index at filePath or if it was built with another n-gram size
+    @staticmethod
+    def load(logger: logging.Logger, filePath: str, ngramSize: int = 3) -> "TitleIndex":
+        if not os.path.exists(filePath):
+            logger.info(f"No title index found at '{filePath}'")
+            return None
+
+        logger.debug(f"Loading title index '{filePath}'")
+
+        with open(filePath, encoding="utf-8") as jsonFile:
+            data = json.load(jsonFile)
+
+        if data["ngramSize"] != ngramSize:
+            logger.info(f"Title index was built with {data['ngramSize']}-grams instead of {ngramSize}-grams")
+            return None
+
+        index = TitleIndex(logger, ngramSize)
+        index.metadata = data["metadata"]
+        index.slots = data["slugs"]
+        index.slugs = {slot: slug for slug, slot in index.slots.items()}
+        index.postings = {ngram: set(slots) for ngram, slots in data["postings"].items()}
+        index.sizes = dict(Counter(itertools.chain.from_iterable(index.postings.values())))
+        index.nextSlot = data["revision"]
+
+        logger.info(f"Loaded title index of {len(index)} slug(s)")
+
+        return index
+
+    @staticmethod
+    def build(logger: logging.Logger, slugs: list[str], ngramSize: int = 3) -> "TitleIndex":
+        index = TitleIndex(logger, ngramSize)
+
+        for slug in slugs:
+            index.add(slug)
+
+        return index
@@ -0,0 +1,82 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from thefuzz import fuzz
+from TitleIndex import TitleIndex
+from TitleSimilarity import ngrams, ngramSimilarity
+
+
+logger = logging.getLogger("test")
+
+slugs = [
+    "poulet-au-beurre",
+    "poulet-au-beurre-epice",
+    "boeuf-au-beurre",
+    "tacos-de-poulet",
+    "tacos-au-poulet",
+    "salade-cesar",
+    "salade-de-chou",
+    "soupe-a-l-oignon",
+]
+
+
+class TestTitleIndex(unittest.TestCase):
+    def test_whenFindingSimilarThenSameAsComparingAllSlugs(self):
+        # Arrange
+        index = TitleIndex.build(logger, slugs)
+        text = "poulet-au-beurre-doux"
+        expectedResult = sorted(
+            (
+                (slug, fuzz.ratio(text, slug))
+                for slug in slugs
+                if ngramSimilarity(ngrams(text), ngrams(slug)) >= 0.4
+            ),
+            key=lambda m: (-m[1], m[0])
+        )
+
+        # Act
+        result = index.findSimilar(text, limit=None)
+
+        # Assert
+        self.assertEqual(result, expectedResult, "Expected same matches as comparing all slugs")
+
+    def test_whenSyncedThenRenamedSlugsReplaced(self):
+        # Arrange
+        index = TitleIndex.build(logger, slugs)
+        revision = index.revision
+        currentSlugs = [s for s in slugs if s != "salade-cesar"] + ["salade-cesar-maison"]
+
+        # Act
+        added, removed = index.sync(currentSlugs)
+
+        # Assert
+        self.assertEqual(added, ["salade-cesar-maison"], "Expected new slug to be added")
+        self.assertEqual(removed, ["salade-cesar"], "Expected previous slug to be removed")
+        self.assertEqual(index.addedSince(revision), ["salade-cesar-maison"], "Expected new slug since revision")
+        self.assertEqual(
+            [s for s, _ in index.findSimilar("salade-cesar", limit=1)],
+            ["salade-cesar-maison"],
+            "Expected renamed slug to be found"
+        )
+
+    def test_whenSavedThenLoadedIndexFindsSameSlugs(self):
+        # Arrange
+        index = TitleIndex.build(logger, slugs)
+        index.remove("tacos-au-poulet")
+
+        with tempfile.TemporaryDirectory() as directory:
+            indexPath = os.path.join(directory, "title-index.json")
+            index.save(indexPath)
+
+            # Act
+            result = TitleIndex.load(logger, indexPath)
+
+        # Assert
+        self.assertEqual(
+            result.findSimilar("tacos-poulet", limit=None),
+            index.findSimilar("tacos-poulet", limit=None),
+            "Expected same matches after loading"
+        )
+        self.assertEqual(result.revision, index.revision, "Expected same revision after loading")
@@ -0,0 +1,80 @@
+import math
+import numpy as np
+
+from collections import Counter
+from rapidfuzz import fuzz, process
+from typing import Iterator
+
+
+def ngrams(text: str, size: int = 3) -> set[str]:
+    # Slugs separate words with "-"; padding with it marks the start and end of the text as well
+    padded = f"-{text}-"
+    return {padded[i:i + size] for i in range(max(1, len(padded) - size + 1))}
+
+
+# Dice coefficient of two n-gram sets
+def ngramSimilarity(a: set[str], b: set[str]) -> float:
+    if not a and not b:
+        return 1.0
+
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+# Finds the pairs (i, j), i < j, of texts whose n-gram sets have a Dice similarity of at least
+# minSimilarity, without comparing every pair (i.e. "prefix filtering"). N-grams are ranked from
+# rarest to most common; two sets that similar must share one of the first few n-grams of each
+# set, so only those are indexed and looked up. Pairs are returned sorted.
+def findCandidatePairs(texts: list[str], ngramSize: int = 3, minSimilarity: float = 0.4) -> list[tuple[int, int]]:
+    textNgrams = [ngrams(t, ngramSize) for t in texts]
+    frequencies = Counter(n for textNgram in textNgrams for n in textNgram)
+    rarity = {n: rank for rank, (n, _) in enumerate(sorted(frequencies.items(), key=lambda f: (f[1], f[0])))}
+
+    # Dice >= t implies Jaccard >= t / (2 - t), which bounds the shared n-grams for each set size
+    minJaccard = minSimilarity / (2 - minSimilarity)
+    index: dict[str, list[int]] = {}
+    pairs = []
+
+    for i, current in enumerate(textNgrams):
+        ordered = sorted(current, key=rarity.__getitem__)
+        prefixLength = len(ordered) - math.ceil(minJaccard * len(ordered)) + 1
+        candidates = set()
+
+        for ngram in ordered[:prefixLength]:
+            postings = index.setdefault(ngram, [])
+            candidates.update(postings)
+            postings.append(i)
+
+        for j in candidates:
+            if ngramSimilarity(current, textNgrams[j]) >= minSimilarity:
+                pairs.append((j, i))
+
+    pairs.sort()
+
+    return pairs
+
+
+# Scores every pair (i, j), i < j, with fuzz.ratio (rounded like thefuzz's) and yields the ones
+# scoring at least minRatio, sorted. Rows are scored in chunks by rapidfuzz's cdist across
+# workers threads (-1 uses all CPU cores); scoring stops early for pairs that can't reach
+# minRatio.
+def findSimilarPairs(texts: list[str],
+                     minRatio: int,
+                     workers: int = -1,
+                     maxChunkCells: int = 2**23) -> Iterator[tuple[int, int, int]]:
+    chunkSize = max(1, maxChunkCells // max(1, len(texts)))
+
+    for start in range(0, len(texts), chunkSize):
+        # Only columns from the chunk's first row onwards are needed for the upper triangle
+        scores = process.cdist(
+            texts[start:start + chunkSize],
+            texts[start:],
+            scorer=fuzz.ratio,
+            score_cutoff=max(0, minRatio - 0.5), # Scores are rounded afterwards
+            dtype=np.float64, # Same precision as thefuzz, so ratios round the same way
+            workers=workers
+        )
+        ratios = np.round(scores)
+        rows, columns = np.nonzero(np.triu(ratios >= minRatio, k=1))
+
+        for row, column, ratio in zip(rows.tolist(), columns.tolist(), ratios[rows, columns].tolist()):
+            yield start + row, start + column, int(ratio)
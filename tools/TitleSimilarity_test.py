@@ -0,0 +1,67 @@
+import itertools
+import unittest
+
+from thefuzz import fuzz
+from TitleSimilarity import findCandidatePairs, findSimilarPairs, ngrams, ngramSimilarity
+
+
+class TestFindCandidatePairs(unittest.TestCase):
+    def test_whenCandidatePairsThenSameAsComparingAllPairs(self):
+        # Arrange
+        slugs = [
+            "poulet-au-beurre",
+            "poulet-au-beurre-epice",
+            "boeuf-au-beurre",
+            "tacos-de-poulet",
+            "tacos-au-poulet",
+            "salade-cesar",
+            "salade-de-chou",
+            "soupe-a-l-oignon",
+        ]
+        minSimilarity = 0.4
+        expectedResult = [
+            (i, j)
+            for i, j in itertools.combinations(range(len(slugs)), 2)
+            if ngramSimilarity(ngrams(slugs[i]), ngrams(slugs[j])) >= minSimilarity
+        ]
+
+        # Act
+        result = findCandidatePairs(slugs, minSimilarity=minSimilarity)
+
+        # Assert
+        self.assertEqual(result, expectedResult, "Expected same pairs as comparing all pairs")
+
+    def test_whenNoTextsThenNoPairs(self):
+        # Act
+        result = findCandidatePairs([])
+
+        # Assert
+        self.assertEqual(result, [], "Expected no pairs")
+
+
+class TestFindSimilarPairs(unittest.TestCase):
+    def test_whenSimilarPairsThenSameAsThefuzz(self):
+        # Arrange
+        slugs = [
+            "poulet-au-beurre",
+            "poulet-au-beurre-epice",
+            "boeuf-au-beurre",
+            "tacos-de-poulet",
+            "tacos-au-poulet",
+            "salade-cesar",
+            "salade-de-chou",
+            "soupe-a-l-oignon",
+            "soupe-a-l-oignon-gratinee",
+        ]
+        minRatio = 50
+        expectedResult = [
+            (i, j, fuzz.ratio(slugs[i], slugs[j]))
+            for i, j in itertools.combinations(range(len(slugs)), 2)
+            if fuzz.ratio(slugs[i], slugs[j]) >= minRatio
+        ]
+
+        # Act
+        result = list(findSimilarPairs(slugs, minRatio, workers=1, maxChunkCells=20))
+
+        # Assert
+        self.assertEqual(result, expectedResult, "Expected same pairs and ratios as thefuzz")
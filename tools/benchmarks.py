@@ -0,0 +1,581 @@
+import gc
+import importlib
+import json
+import logging
+import numpy as np
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from ArgsUtils import ArgsUtils
+from ContentSimilarity import findSimilarRecipes
+from datetime import datetime, timezone
+from ImagePreprocessor import ImagePreprocessor
+from LogUtils import LogUtils
+from MealieOcr import MealieOcr
+from OcrCache import OcrCache
+from OcrLayout import OcrLayout
+from models.Recipe import Recipe
+from RecipeCorpus import RecipeCorpus
+from recipe_tag_analyser import analyseRecipeTags
+from ReportWriter import NdjsonReportWriter, TsvReportWriter
+from TagRuleEngine import TagRuleEngine
+from TagRuleMatrix import TagRuleMatrix
+from typing import Callable
+
+# Scripts with hyphens in their names can't be imported with an import statement
+titleAnalyser = importlib.import_module("recipe-title-analyser")
+scansOrganiser = importlib.import_module("goodfood-scans-organiser")
+
+rulesPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag-rules.json")
+
+
+def parseArgs():
+    parser = ArgsUtils.initialiseParser()
+
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        help="Comma-separated corpus sizes to run each benchmark with",
+        default="100,1000,10000"
+    )
+
+    parser.add_argument(
+        "-b",
+        "--benchmarks",
+        help="Comma-separated names of the benchmarks to run (default: all)",
+        default=None
+    )
+
+    parser.add_argument(
+        "--repeat",
+        help="Number of timed runs per benchmark and size; the fastest one is kept",
+        type=int,
+        default=3
+    )
+
+    parser.add_argument(
+        "--seed",
+        help="Random seed used to generate the corpus",
+        type=int,
+        default=0
+    )
+
+    parser.add_argument(
+        "--tagsPerRecipe",
+        help="Number of tags on each generated recipe",
+        type=int,
+        default=5
+    )
+
+    parser.add_argument(
+        "--ingredientsPerRecipe",
+        help="Number of ingredients in each generated recipe",
+        type=int,
+        default=10
+    )
+
+    parser.add_argument(
+        "--stepsPerRecipe",
+        help="Number of instruction steps in each generated recipe",
+        type=int,
+        default=6
+    )
+
+    parser.add_argument(
+        "--ocrSamplesPath",
+        help="Folder of scans the OCR benchmarks run on; they're skipped when not set",
+        default=None
+    )
+
+    parser.add_argument(
+        "-o",
+        "--outputPath",
+        help="Path to the JSON results file",
+        default="benchmark-results.json"
+    )
+
+    parser.add_argument(
+        "--baselinePath",
+        help="Path to a previous JSON results file to compare against",
+        default=None
+    )
+
+    parser.add_argument(
+        "--threshold",
+        help="Relative slowdown (or memory increase) over the baseline considered a regression",
+        type=float,
+        default=0.2
+    )
+
+    return parser.parse_args()
+
+
+class Benchmark():
+    name: str
+    unit: str
+    maxSize: int
+
+    # setup() builds the benchmark's input outside of the measurement, run() is what's measured.
+    # evaluate() returns extra metrics (e.g. OCR quality) from run()'s output, where higher is better.
+    # Benchmarks are skipped when their required option isn't set.
+    def __init__(self,
+                 name: str,
+                 unit: str,
+                 setup: Callable[[RecipeCorpus, int, dict], object],
+                 run: Callable[[object], None],
+                 maxSize: int = None,
+                 evaluate: Callable[[object], dict] = None,
+                 requires: str = None) -> None:
+        self.name = name
+        self.unit = unit
+        self.setup = setup
+        self.run = run
+        self.maxSize = maxSize
+        self.evaluate = evaluate
+        self.requires = requires
+
+
+# The benchmarked code logs at INFO level for each item; keep that out of the measurements
+benchmarkedLogger = logging.getLogger("benchmarked")
+benchmarkedLogger.setLevel(logging.CRITICAL)
+
+
+def generateRecipes(corpus: RecipeCorpus, size: int, options: dict) -> list[Recipe]:
+    return [Recipe.from_json(r) for r in corpus.generateRecipes(size, **options)]
+
+
+def setupTagAnalyser(corpus: RecipeCorpus, size: int, options: dict):
+    ruleSet = TagRuleEngine.loadRuleSet(rulesPath)
+    engine = TagRuleEngine(benchmarkedLogger, ruleSet, corpus.getAllTags(), corpus.getAllCategories())
+
+    return generateRecipes(corpus, size, options), engine
+
+
+def runTagAnalyser(data):
+    recipes, engine = data
+
+    for recipe in recipes:
+        analyseRecipeTags(benchmarkedLogger, recipe, engine)
+
+
+def setupTagRuleMatrix(corpus: RecipeCorpus, size: int, options: dict):
+    recipes, engine = setupTagAnalyser(corpus, size, options)
+
+    return recipes, TagRuleMatrix(benchmarkedLogger, engine)
+
+
+def setupTitleAnalyser(corpus: RecipeCorpus, size: int, options: dict):
+    recipes = generateRecipes(corpus, size, options)
+    recipes.sort(key=lambda r: r.slug)
+
+    return recipes
+
+
+# Removed when the benchmarks exit
+ocrCacheDirectory = tempfile.TemporaryDirectory()
+
+
+def setupOcrCache(corpus: RecipeCorpus, size: int, options: dict, ocrFormat: str) -> str:
+    ocrData = MealieOcr().format_tsv_output(corpus.generateOcrTsv(size))
+    filePath = OcrCache.getPath(os.path.join(ocrCacheDirectory.name, f"ocr-{size}"), ocrFormat)
+
+    if ocrFormat == "binary":
+        OcrCache.save(filePath, ocrData)
+    else:
+        OcrCache.exportJson(filePath, ocrData)
+
+    return filePath
+
+
+# Images of the samples folder, repeated if it has fewer than size images
+def setupOcrSamples(corpus: RecipeCorpus, size: int, options: dict) -> list[bytes]:
+    samplesPath = options["ocrSamplesPath"]
+    fileNames = sorted(f for f in os.listdir(samplesPath) if f.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff")))
+
+    if not fileNames:
+        raise ValueError(f"No images found in '{samplesPath}'")
+
+    images = []
+
+    for i in range(size):
+        with open(os.path.join(samplesPath, fileNames[i % len(fileNames)]), "rb") as image:
+            images.append(image.read())
+
+    return images
+
+
+# Mean confidence of all words, so images with more words weigh more
+def evaluateOcrResults(results: list[MealieOcr.OcrResult]) -> dict:
+    confidences = np.concatenate([r.getWordConfidences() for r in results])
+
+    return {"meanConfidence": float(confidences.mean()) if len(confidences) else 0.0}
+
+
+def setupOcrLayout(corpus: RecipeCorpus, size: int, options: dict) -> OcrLayout:
+    layout = OcrLayout(MealieOcr().format_tsv_output(corpus.generateOcrTsv(size)))
+
+    # Indices are built on first use, which isn't what's measured
+    for level in [2, 4, 5]:
+        layout.getIndex(level)
+
+    return layout
+
+
+# 100 queries of each kind: blocks in a band of the page, words right of a word and lines below a line
+def runOcrLayoutQueries(layout: OcrLayout):
+    words = layout.query(0, 0, layout.width, layout.height, level=5)
+    step = max(1, len(words) // 100)
+
+    for i in range(100):
+        layout.queryRegion(0, i / 100, 1, i / 100 + 0.2)
+
+    for word in words[::step][:100]:
+        layout.findRightOf(word)
+
+    for line in layout.lines[::max(1, len(layout.lines) // 100)][:100]:
+        layout.findBelow(line, maxDistance=200)
+
+
+def runTitleAnalyser(recipes: list[Recipe], isExhaustive: bool = False):
+    ratiosColumns = [("recipe", "string"), ("other", "string"), ("ratio", "uint8")]
+
+    with NdjsonReportWriter(os.devnull) as reportWriter, TsvReportWriter(os.devnull, ratiosColumns) as ratiosWriter:
+        titleAnalyser.compareRecipeTitles(
+            benchmarkedLogger,
+            recipes,
+            reportWriter,
+            duplicateThreshold=75,
+            ratiosWriter=ratiosWriter,
+            isExhaustive=isExhaustive
+        )
+
+
+benchmarks = [
+    Benchmark(
+        "Recipe.from_json",
+        "recipes",
+        setup=lambda corpus, size, options: corpus.generateRecipes(size, **options),
+        run=lambda recipes: [Recipe.from_json(r) for r in recipes]
+    ),
+    Benchmark(
+        "analyseRecipeTags",
+        "recipes",
+        setup=setupTagAnalyser,
+        run=runTagAnalyser
+    ),
+    Benchmark(
+        "TagRuleMatrix.evaluate",
+        "recipes",
+        setup=setupTagRuleMatrix,
+        run=lambda data: data[1].evaluate(data[0])
+    ),
+    Benchmark(
+        "TagRuleMatrix.validate",
+        "recipes",
+        setup=setupTagRuleMatrix,
+        run=lambda data: data[1].validate(data[0])
+    ),
+    Benchmark(
+        "compareRecipeTitles",
+        "recipes",
+        setup=setupTitleAnalyser,
+        run=runTitleAnalyser,
+        maxSize=5000 # Candidate pairs grow quickly with the synthetic corpus' small vocabulary
+    ),
+    Benchmark(
+        "compareRecipeTitles (exhaustive)",
+        "recipes",
+        setup=setupTitleAnalyser,
+        run=lambda recipes: runTitleAnalyser(recipes, isExhaustive=True)
+    ),
+    Benchmark(
+        "findSimilarRecipes (content)",
+        "recipes",
+        setup=generateRecipes,
+        run=lambda recipes: sum(1 for _ in findSimilarRecipes(recipes, minSimilarity=0.8))
+    ),
+    Benchmark(
+        "MealieOcr.format_tsv_output",
+        "words",
+        setup=lambda corpus, size, options: corpus.generateOcrTsv(size),
+        run=lambda tsv: MealieOcr().format_tsv_output(tsv)
+    ),
+    Benchmark(
+        "MealieOcr.format_tsv_output (OcrChunk view)",
+        "words",
+        setup=lambda corpus, size, options: corpus.generateOcrTsv(size),
+        run=lambda tsv: list(MealieOcr().format_tsv_output(tsv))
+    ),
+    Benchmark(
+        "OcrCache.load",
+        "words",
+        setup=lambda corpus, size, options: setupOcrCache(corpus, size, options, "binary"),
+        run=OcrCache.load
+    ),
+    Benchmark(
+        "OcrCache.load (JSON)",
+        "words",
+        setup=lambda corpus, size, options: setupOcrCache(corpus, size, options, "json"),
+        run=OcrCache.load
+    ),
+    Benchmark(
+        "OcrLayout",
+        "words",
+        setup=lambda corpus, size, options: MealieOcr().format_tsv_output(corpus.generateOcrTsv(size)),
+        run=OcrLayout
+    ),
+    Benchmark(
+        "OcrLayout queries (x300)",
+        "words",
+        setup=setupOcrLayout,
+        run=runOcrLayoutQueries
+    ),
+    Benchmark(
+        "MealieOcr.runOcrOnFile",
+        "images",
+        setup=setupOcrSamples,
+        run=lambda images: [MealieOcr().runOcrOnFile(i) for i in images],
+        maxSize=100,
+        evaluate=evaluateOcrResults,
+        requires="ocrSamplesPath"
+    ),
+    Benchmark(
+        "MealieOcr.runOcrOnFile (preprocessed)",
+        "images",
+        setup=setupOcrSamples,
+        run=lambda images: [
+            MealieOcr(preprocessor=ImagePreprocessor(targetDpi=300, binarise=True, deskew=True)).runOcrOnFile(i)
+            for i in images
+        ],
+        maxSize=100,
+        evaluate=evaluateOcrResults,
+        requires="ocrSamplesPath"
+    ),
+    Benchmark(
+        "MealieOcr.runOcrOnFile (title region)",
+        "images",
+        setup=setupOcrSamples,
+        run=lambda images: [
+            MealieOcr(preprocessor=ImagePreprocessor(grayscale=True, region=ImagePreprocessor.titleRegion)).runOcrOnFile(i)
+            for i in images
+        ],
+        maxSize=100,
+        evaluate=evaluateOcrResults,
+        requires="ocrSamplesPath"
+    ),
+    Benchmark(
+        "cleanTitles",
+        "titles",
+        setup=lambda corpus, size, options: [corpus.generateOcrTitle() for _ in range(size)],
+        run=lambda titles: scansOrganiser.cleanTitles(benchmarkedLogger, titles)
+    ),
+]
+
+
+# Also returns the last run's output, so it can be evaluated without running again
+def measureTime(benchmark: Benchmark, data, repeat: int) -> tuple[float, object]:
+    timings = []
+    output = None
+
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        output = benchmark.run(data)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), output
+
+
+# Measured in a separate run since tracing allocations slows everything down
+def measurePeakMemory(benchmark: Benchmark, data) -> int:
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        benchmark.run(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def runBenchmarks(logger: logging.Logger,
+                  selected: list[Benchmark],
+                  sizes: list[int],
+                  repeat: int,
+                  seed: int,
+                  options: dict) -> list[dict]:
+    results = []
+
+    for benchmark in selected:
+        if benchmark.requires and not options.get(benchmark.requires):
+            logger.info(f"Skipping {benchmark.name} (requires --{benchmark.requires})")
+            continue
+
+        for size in sizes:
+            if benchmark.maxSize and size > benchmark.maxSize:
+                logger.info(f"Skipping {benchmark.name} with {size} {benchmark.unit}"
+                            f" (max: {benchmark.maxSize})")
+                continue
+
+            logger.info(f"Running {benchmark.name} with {size} {benchmark.unit}")
+
+            # Same seed for each run so the baseline and the current run use the same corpus
+            corpus = RecipeCorpus(seed, tagSlugs=ruleSetTagSlugs())
+            data = benchmark.setup(corpus, size, options)
+
+            seconds, output = measureTime(benchmark, data, repeat)
+            peakMemory = measurePeakMemory(benchmark, data)
+            metrics = benchmark.evaluate(output) if benchmark.evaluate else {}
+
+            logger.info(f"  {seconds * 1000:.2f} ms, peak memory {peakMemory / 1024 / 1024:.2f} MiB"
+                        + "".join(f", {name} {value:.2f}" for name, value in metrics.items()))
+
+            results.append({
+                "benchmark": benchmark.name,
+                "unit": benchmark.unit,
+                "size": size,
+                "seconds": seconds,
+                "peakMemory": peakMemory,
+                **metrics
+            })
+
+    return results
+
+
+# Flag tags and the tags they're validated against, so generated recipes trigger the tag rules
+def ruleSetTagSlugs() -> list[str]:
+    ruleSet = TagRuleEngine.loadRuleSet(rulesPath)
+    slugs = []
+
+    for rule in ruleSet["rules"]:
+        slugs.append(rule["tag"])
+        slugs.extend(rule.get("tags", []))
+
+    return list(dict.fromkeys(slugs))
+
+
+def compareResults(logger: logging.Logger, baseline: dict, results: list[dict], threshold: float) -> list[dict]:
+    baselineResults = {(r["benchmark"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+
+    for result in results:
+        previous = baselineResults.get((result["benchmark"], result["size"]))
+
+        if not previous:
+            logger.debug(f"No baseline for {result['benchmark']} with {result['size']} {result['unit']}")
+            continue
+
+        # Lower is better, except for evaluated metrics (e.g. OCR confidence)
+        metrics = [(m, 1) for m in ["seconds", "peakMemory"]]
+        metrics.extend((m, -1) for m in result if m not in ["benchmark", "unit", "size", "seconds", "peakMemory"])
+
+        for metric, direction in metrics:
+            if previous.get(metric, 0) <= 0:
+                continue
+
+            change = result[metric] / previous[metric] - 1
+            message = f"{result['benchmark']} ({result['size']} {result['unit']}) {metric}: {change:+.1%}"
+
+            if change * direction > threshold:
+                logger.error(f"Regression: {message}")
+                regressions.append({
+                    "benchmark": result["benchmark"],
+                    "size": result["size"],
+                    "metric": metric,
+                    "baseline": previous[metric],
+                    "current": result[metric],
+                    "change": change
+                })
+            else:
+                logger.info(message)
+
+    return regressions
+
+
+def execute():
+    args = parseArgs()
+    logger = LogUtils.initialiseLogger(args.verbosity, filename="benchmarks.log")
+
+    if args.dryRun:
+        logger.warning("[DRY RUN] Running script in dry run mode; file system will not be modified")
+
+    logging.getLogger("report-writer").setLevel(logging.ERROR)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    names = args.benchmarks.split(",") if args.benchmarks else [b.name for b in benchmarks]
+    unknownNames = set(names) - {b.name for b in benchmarks}
+
+    if unknownNames:
+        logger.error(f"Unknown benchmark(s): {sorted(unknownNames)}")
+        sys.exit(2)
+
+    options = {
+        "tagsPerRecipe": args.tagsPerRecipe,
+        "ingredientsPerRecipe": args.ingredientsPerRecipe,
+        "stepsPerRecipe": args.stepsPerRecipe
+    }
+
+    # Only set when used, so baselines without OCR benchmarks have the same options
+    if args.ocrSamplesPath:
+        options["ocrSamplesPath"] = args.ocrSamplesPath
+
+    results = runBenchmarks(
+        logger,
+        [b for b in benchmarks if b.name in names],
+        sizes,
+        args.repeat,
+        args.seed,
+        options
+    )
+
+    report = {
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpuCount": os.cpu_count()
+        },
+        "options": {
+            "seed": args.seed,
+            "repeat": args.repeat,
+            **options
+        },
+        "results": results
+    }
+
+    regressions = []
+
+    if args.baselinePath:
+        logger.info(f"Comparing against baseline '{args.baselinePath}' (threshold: {args.threshold:.0%})")
+
+        with open(args.baselinePath, encoding="utf-8") as baselineFile:
+            baseline = json.load(baselineFile)
+
+        if baseline.get("options") != report["options"]:
+            logger.warning("Baseline was generated with different options; comparison may not be meaningful")
+
+        regressions = compareResults(logger, baseline, results, args.threshold)
+        report["regressions"] = regressions
+
+    if args.dryRun:
+        logger.warning("[DRY RUN] Would've written benchmark results file")
+    else:
+        with open(args.outputPath, mode="w", encoding="utf-8") as jsonFile:
+            jsonFile.write(json.dumps(report, indent=2))
+
+    if regressions:
+        logger.error(f"{len(regressions)} regression(s) found")
+        sys.exit(1)
+
+    logger.info("Benchmarks completed!")
+
+
+if __name__ == "__main__":
+    execute()
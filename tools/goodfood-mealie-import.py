@@ -5,6 +5,8 @@ import shutil
 from ArgsUtils import ArgsUtils
 from LogUtils import LogUtils
 from MealieApi import MealieApi
+from slugify import slugify
+from TitleIndex import TitleIndex
 
 
 def parseArgs():
@@ -22,10 +24,27 @@ def parseArgs():
         help="Path where processed recipes will be moved to",
         required=True)
 
+    parser.add_argument(
+        "--indexPath",
+        help="Path to the title index used to find existing recipes with similar titles",
+        default="title-index.json")
+
+    parser.add_argument(
+        "--threshold",
+        help="Minimum ratio (0-100) for an existing recipe's title to be reported as similar",
+        type=int,
+        default=75)
+
+    parser.add_argument(
+        "--similarTitles",
+        help="Maximum number of similar titles reported for each recipe",
+        type=int,
+        default=5)
+
     return parser.parse_args()
 
 
-def importRecipes(logger, mealieApi, inputPath, outputPath, isDryRun):
+def importRecipes(logger, mealieApi, titleIndex, inputPath, outputPath, threshold, similarTitles, isDryRun):
     logger.info(f"Importing recipes from '{inputPath}'")
 
     recipeNames = os.listdir(inputPath)
@@ -40,6 +59,7 @@ def importRecipes(logger, mealieApi, inputPath, outputPath, isDryRun):
     logger.debug(f"Recipes: {recipeNames}")
 
     duplicates = []
+    similarRecipes = {}
     importedRecipes = []
     processedRecipeCount = 1
 
@@ -57,6 +77,11 @@ def importRecipes(logger, mealieApi, inputPath, outputPath, isDryRun):
             processedRecipeCount += 1
             continue
 
+        similarSlugs = findSimilarRecipes(logger, titleIndex, recipeTitle, threshold, similarTitles)
+
+        if similarSlugs:
+            similarRecipes[recipeTitle] = similarSlugs
+
         categories = processCategories(logger, mealieApi, metadata["categories"], isDryRun)
         tags = processTags(logger, mealieApi, metadata["tags"], isDryRun)
 
@@ -70,15 +95,45 @@ def importRecipes(logger, mealieApi, inputPath, outputPath, isDryRun):
 
         moveFolder(logger, recipePath, f"{outputPath}", isDryRun)
 
+        # Recipes imported later in the batch are compared with this one too
+        titleIndex.add(newSlug or slugify(recipeTitle))
+
         importedRecipes.append(recipeTitle)
         processedRecipeCount += 1
 
     results["duplicates"] = duplicates
+    results["similarRecipes"] = similarRecipes
     results["importedRecipes"] = importedRecipes
 
     return results
 
 
+def loadTitleIndex(logger, mealieApi, indexPath):
+    logger.info("Loading title index")
+
+    titleIndex = TitleIndex.load(logger, indexPath)
+    slugs = [s["slug"] for s in mealieApi.getAllRecipeSummaries()]
+
+    if titleIndex is None:
+        return TitleIndex.build(logger, slugs)
+
+    # Catch up with recipes added, renamed or deleted since the index was saved
+    titleIndex.sync(slugs)
+
+    return titleIndex
+
+
+def findSimilarRecipes(logger, titleIndex, recipeTitle, threshold, similarTitles):
+    logger.info("Looking for recipes with similar titles")
+
+    matches = titleIndex.findSimilar(slugify(recipeTitle), similarTitles, threshold)
+
+    for slug, ratio in matches:
+        logger.warning(f"[SIMILAR] Recipe '{slug}' has a similar title (ratio: {ratio})")
+
+    return [slug for slug, _ in matches]
+
+
 def processCategories(logger, mealieApi, categorieNames, isDryRun):
     logger.info("Processing recipe categories")
 
@@ -233,6 +288,11 @@ def logExecutionReport(logger, results):
     if results["duplicates"]:
         logger.info(f"  Duplicates: {results['duplicates']}")
 
+    logger.info(f"  Recipes with similar titles count: {len(results['similarRecipes'])}")
+
+    if results["similarRecipes"]:
+        logger.info(f"  Recipes with similar titles: {results['similarRecipes']}")
+
     logger.info(f"  Imports count: {len(results['importedRecipes'])}")
 
     if results["importedRecipes"]:
@@ -253,15 +313,21 @@ def execute():
     logger.debug(f"Output path: {args.outputPath}")
 
     mealieApi = MealieApi(args.url, args.token, args.caPath, args.cacheDuration)
+    titleIndex = loadTitleIndex(logger, mealieApi, args.indexPath)
 
     results = importRecipes(
         logger,
         mealieApi,
+        titleIndex,
         args.inputPath,
         args.outputPath,
+        args.threshold,
+        args.similarTitles,
         args.dryRun
     )
 
+    titleIndex.save(args.indexPath, args.dryRun)
+
     logExecutionReport(logger, results)
 
 
@@ -1,51 +1,98 @@
-import json
 import os
+import sys
 
 from ArgsUtils import ArgsUtils
+from ImagePreprocessor import ImagePreprocessor
 from LogUtils import LogUtils
 from MealieOcr import MealieOcr
+from OcrCache import OcrCache
+from OcrResultCache import OcrResultCache
+from OcrWorkers import OcrWorkerPool
 
 
 def parseArgs():
-    parser = ArgsUtils.initialiseParser()
+    parser = ArgsUtils.initialiseParser(scriptPreprocessesImages=True)
 
     parser.add_argument(
         "-i",
         "--inputPath",
         help="Path where recipes to be processed are located")
 
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of processes running OCR on images. Set to 0 to use all CPU cores.",
+        type=int,
+        default=1)
+
+    parser.add_argument(
+        "--timeout",
+        help="Number of seconds after which OCR on an image is stopped. Set to 0 to disable.",
+        type=float,
+        default=300)
+
+    parser.add_argument(
+        "--ocrEngine",
+        help="How Tesseract is run locally: 'tesserocr' keeps it loaded in-process, 'pytesseract' starts a "
+             "tesseract process per image and 'auto' uses tesserocr when it's installed",
+        choices=["auto", "tesserocr", "pytesseract"],
+        default="auto")
+
+    parser.add_argument(
+        "--ocrFormat",
+        help="Format of OCR data files: 'binary' (.ocr files, compact and fast to load) or 'json'",
+        choices=["binary", "json"],
+        default="binary")
+
+    parser.add_argument(
+        "--ocrCachePath",
+        help="Path where OCR results are cached by image content, so renamed or rescanned images "
+             "aren't analysed again",
+        default="ocr-cache")
+
+    parser.add_argument(
+        "--ocrCacheSize",
+        help="Maximum size of the OCR cache in MiB; least recently used results are removed first. "
+             "Set to 0 to disable the cache.",
+        type=int,
+        default=1024)
+
     return parser.parse_args()
 
 
-def analyseImage(logger, mealieOcr: MealieOcr, imagePath, outputFilePath, isDryRun) -> list[MealieOcr.OcrChunk]:
-    logger.debug(f"Analysing image: {imagePath}")
-    logger.debug(f"Output file path: {outputFilePath}")
+def loadOcrData(logger, imagePath, ocrDataFilePath) -> MealieOcr.OcrResult:
+    logger.warning(f"OCR data for '{imagePath}' already exists. Reading data from file.")
 
-    ocrData: list[MealieOcr.OcrChunk] = None
+    return OcrCache.load(ocrDataFilePath)
 
-    if os.path.exists(outputFilePath) and os.stat(outputFilePath).st_size > 0:
-        logger.warning(f"OCR data for '{imagePath}' already exists. Reading data from file.")
-        with open(outputFilePath, encoding="utf-8") as ocrDataFile:
-            ocrData = json.load(ocrDataFile, object_hook=MealieOcr.OcrChunk.Encoder.decode)
-    else:
-        logger.info(f"OCR data for '{imagePath}' doesn't exist. Analysing image.")
 
+def analyseImage(logger, mealieOcr: MealieOcr, imagePath, timeout) -> list[MealieOcr.OcrChunk]:
+    logger.info(f"OCR data for '{imagePath}' doesn't exist. Analysing image.")
+
+    try:
         with open(imagePath, "rb") as image:
-            ocrData = mealieOcr.runOcrOnFile(image.read())
+            return mealieOcr.runOcrOnFile(image.read(), timeout=timeout)
+    except Exception as e:
+        logger.error(f"OCR failed on '{imagePath}': {e}")
+        return None
 
-        if isDryRun:
-            logger.warning(
-                f"[DRY RUN] Would've created OCR data file '{outputFilePath}'"
-            )
-            return ocrData
 
-        with open(outputFilePath, mode="w", encoding="utf-8") as jsonFile:
-            jsonFile.write(json.dumps(ocrData, cls=MealieOcr.OcrChunk.Encoder, indent=2))
+def saveOcrData(logger, ocrData: MealieOcr.OcrResult, ocrDataFilePath, isDryRun):
+    logger.debug(f"Output file path: {ocrDataFilePath}")
 
-    return ocrData
+    if isDryRun:
+        logger.warning(
+            f"[DRY RUN] Would've created OCR data file '{ocrDataFilePath}'"
+        )
+        return
+
+    if ocrDataFilePath.endswith(OcrCache.extension):
+        OcrCache.save(ocrDataFilePath, ocrData)
+    else:
+        OcrCache.exportJson(ocrDataFilePath, ocrData)
 
 
-def extractOcrBlocks(logger, mealieOcr:MealieOcr, ocrData: list[MealieOcr.OcrChunk], ocrBlocksFilePath: str, isDryRun: bool):
+def extractOcrBlocks(logger, mealieOcr:MealieOcr, ocrData: MealieOcr.OcrResult, ocrBlocksFilePath: str, isDryRun: bool):
     logger.info("Extracting OCR blocks")
 
     blocks = mealieOcr.extractBlocks(ocrData)
@@ -56,11 +103,22 @@ def extractOcrBlocks(logger, mealieOcr:MealieOcr, ocrData: list[MealieOcr.OcrChu
         )
         return
 
-    with open(ocrBlocksFilePath, mode="w", encoding="utf-8") as jsonFile:
-        jsonFile.write(json.dumps(blocks, cls=MealieOcr.OcrChunk.Encoder, indent=2))
-
-
-def analyseRecipes(logger, mealieOcr: MealieOcr, inputPath, isDryRun):
+    if ocrBlocksFilePath.endswith(OcrCache.extension):
+        OcrCache.saveBlocks(ocrBlocksFilePath, blocks)
+    else:
+        OcrCache.exportJson(ocrBlocksFilePath, blocks)
+
+
+def analyseRecipes(logger,
+                   mealieOcr: MealieOcr,
+                   inputPath,
+                   workers,
+                   timeout,
+                   verbosity,
+                   ocrEngine,
+                   ocrFormat,
+                   ocrResultCache: OcrResultCache,
+                   isDryRun):
     logger.info(f"Analysing recipes in '{inputPath}'")
 
     recipeSlugs = os.listdir(inputPath)
@@ -70,7 +128,14 @@ def analyseRecipes(logger, mealieOcr: MealieOcr, inputPath, isDryRun):
 
     toAnalyse = ["front", "back"]
     processedRecipeCount = 1
+    jobs = []
+    engineVersion = None
+    preprocessing = mealieOcr.preprocessor.getParameters() if mealieOcr.preprocessor else None
+
+    # Output paths of images identical to one already waiting for OCR, by cache key
+    duplicates: dict[str, list[tuple[str, str]]] = {}
 
+    # Images with existing or cached OCR data are handled right away; the others are analysed afterwards
     for recipeSlug in recipeSlugs:
         logger.info(
             f"Processing recipe {processedRecipeCount} of {recipeCount}"
@@ -78,21 +143,75 @@ def analyseRecipes(logger, mealieOcr: MealieOcr, inputPath, isDryRun):
 
         for item in toAnalyse:
             imagePath = f"{inputPath}/{recipeSlug}/{item.capitalize()}.png"
-            ocrDataFilePath = f"{inputPath}/{recipeSlug}/ocr-{item}.json"
-            ocrBlocksFilePath = f"{inputPath}/{recipeSlug}/ocr-blocks-{item}.json"
+            ocrDataFilePath = OcrCache.getPath(f"{inputPath}/{recipeSlug}/ocr-{item}", ocrFormat)
+            ocrBlocksFilePath = OcrCache.getPath(f"{inputPath}/{recipeSlug}/ocr-blocks-{item}", ocrFormat)
+
+            # Existing OCR data is reused whatever its format
+            existingOcrDataFilePath = OcrCache.findPath(f"{inputPath}/{recipeSlug}/ocr-{item}")
 
-            ocrData = analyseImage(logger, mealieOcr, imagePath, ocrDataFilePath, isDryRun)
+            logger.debug(f"Image: {imagePath}")
 
-            if not ocrData:
-                logger.error(
-                    "Something went wrong when analysing image. Skipping block extraction."
-                    )
+            if existingOcrDataFilePath:
+                ocrData = loadOcrData(logger, imagePath, existingOcrDataFilePath)
+                extractOcrBlocks(logger, mealieOcr, ocrData, ocrBlocksFilePath, isDryRun)
                 continue
 
-            extractOcrBlocks(logger, mealieOcr, ocrData, ocrBlocksFilePath, isDryRun)
+            cacheKey = None
+
+            if ocrResultCache is not None:
+                # Only needed once there's an image to analyse, since it requires Tesseract
+                engineVersion = engineVersion or mealieOcr.getEngineVersion()
+                cacheKey = OcrResultCache.getKey(OcrResultCache.hashImage(imagePath), *engineVersion, preprocessing=preprocessing)
+                ocrData = ocrResultCache.get(cacheKey)
+
+                if ocrData is not None:
+                    logger.info(f"OCR data for '{imagePath}' found in cache")
+                    saveOcrData(logger, ocrData, ocrDataFilePath, isDryRun)
+                    extractOcrBlocks(logger, mealieOcr, ocrData, ocrBlocksFilePath, isDryRun)
+                    continue
+
+                if cacheKey in duplicates:
+                    logger.info(f"'{imagePath}' is identical to an image waiting for OCR")
+                    duplicates[cacheKey].append((ocrDataFilePath, ocrBlocksFilePath))
+                    continue
+
+                duplicates[cacheKey] = []
+
+            jobs.append(((ocrDataFilePath, ocrBlocksFilePath, cacheKey), imagePath))
 
         processedRecipeCount += 1
 
+    logger.info(f"Analysing {len(jobs)} image(s) with {workers} worker(s)")
+
+    if workers > 1:
+        ocrPool = OcrWorkerPool(
+            logger,
+            workers,
+            timeout,
+            verbosity=verbosity,
+            engine=ocrEngine,
+            preprocessor=mealieOcr.preprocessor
+        )
+        results = ocrPool.run(jobs)
+    else:
+        results = ((paths, analyseImage(logger, mealieOcr, imagePath, timeout)) for paths, imagePath in jobs)
+
+    for analysedImageCount, ((ocrDataFilePath, ocrBlocksFilePath, cacheKey), ocrData) in enumerate(results, start=1):
+        logger.info(f"Analysed image {analysedImageCount} of {len(jobs)}")
+
+        if not ocrData:
+            logger.error(
+                "Something went wrong when analysing image. Skipping block extraction."
+                )
+            continue
+
+        if cacheKey:
+            ocrResultCache.put(cacheKey, ocrData)
+
+        for paths in [(ocrDataFilePath, ocrBlocksFilePath), *duplicates.get(cacheKey, [])]:
+            saveOcrData(logger, ocrData, paths[0], isDryRun)
+            extractOcrBlocks(logger, mealieOcr, ocrData, paths[1], isDryRun)
+
 
 def execute():
     args = parseArgs()
@@ -103,15 +222,39 @@ def execute():
 
     logger.debug(f"Input path: {args.inputPath}")
 
-    mealieOcr = MealieOcr()
+    try:
+        preprocessor = ImagePreprocessor.fromArgs(args)
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(2)
+
+    if preprocessor is not None:
+        logger.debug(f"Image preprocessing: {preprocessor.getParameters()}")
+
+    mealieOcr = MealieOcr(args.ocrEngine, preprocessor)
+    ocrResultCache = None
+
+    if args.ocrCacheSize > 0:
+        ocrResultCache = OcrResultCache(logger, args.ocrCachePath, args.ocrCacheSize * 1024 * 1024, args.dryRun)
+
+    workers = args.workers if args.workers > 0 else os.cpu_count()
 
     analyseRecipes(
         logger,
         mealieOcr,
         args.inputPath,
+        workers,
+        args.timeout,
+        args.verbosity,
+        args.ocrEngine,
+        args.ocrFormat,
+        ocrResultCache,
         args.dryRun
     )
 
+    if ocrResultCache is not None:
+        logger.info(f"OCR cache hits: {ocrResultCache.hits}, misses: {ocrResultCache.misses}")
+
     logger.info("Done!")
 
 
@@ -1,14 +1,20 @@
 from itertools import zip_longest
-import json
 import os
+import sys
 
 from ArgsUtils import ArgsUtils
+from ImagePreprocessor import ImagePreprocessor
 from LogUtils import LogUtils
 from MealieApi import MealieApi
+from MealieOcr import MealieOcr
+from OcrCache import OcrCache
+from OcrResultCache import OcrResultCache
+from OcrWorkers import HybridOcrScheduler, OcrWorkerPool, ServerOcrPool
+from ReportWriter import NdjsonReportWriter
 
 
 def parseArgs():
-    parser = ArgsUtils.initialiseParser(scriptUsesMealieApi=True)
+    parser = ArgsUtils.initialiseParser(scriptUsesMealieApi=True, scriptPreprocessesImages=True)
 
     parser.add_argument(
         "-i",
@@ -22,10 +28,89 @@ def parseArgs():
         help="Path where OCR data files will be saved to",
         required=True)
 
+    parser.add_argument(
+        "--ocrBackend",
+        help="Where OCR is run: 'server' uploads scans to Mealie, 'local' runs Tesseract on this machine, "
+             "'hybrid' does both at once and 'auto' runs locally when Tesseract is installed",
+        choices=["server", "local", "hybrid", "auto"],
+        default="server")
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of scans analysed at the same time (local processes or concurrent uploads). "
+             "Set to 0 to use the number of CPU cores.",
+        type=int,
+        default=1)
+
+    parser.add_argument(
+        "--serverWorkers",
+        help="Number of concurrent uploads to Mealie when using the hybrid OCR backend",
+        type=int,
+        default=2)
+
+    parser.add_argument(
+        "--timeout",
+        help="Number of seconds after which OCR on a scan is stopped. Set to 0 to disable.",
+        type=float,
+        default=300)
+
+    parser.add_argument(
+        "--ocrEngine",
+        help="How Tesseract is run locally: 'tesserocr' keeps it loaded in-process, 'pytesseract' starts a "
+             "tesseract process per image and 'auto' uses tesserocr when it's installed",
+        choices=["auto", "tesserocr", "pytesseract"],
+        default="auto")
+
+    parser.add_argument(
+        "--ocrFormat",
+        help="Format of OCR data files: 'binary' (.ocr files, compact and fast to load) or 'json'",
+        choices=["binary", "json"],
+        default="binary")
+
+    parser.add_argument(
+        "--ocrCachePath",
+        help="Path where OCR results are cached by image content, so renamed or rescanned scans "
+             "aren't analysed again",
+        default="ocr-cache")
+
+    parser.add_argument(
+        "--ocrCacheSize",
+        help="Maximum size of the OCR cache in MiB; least recently used results are removed first. "
+             "Set to 0 to disable the cache.",
+        type=int,
+        default=1024)
+
     return parser.parse_args()
 
 
-def analyseScans(logger, mealieApi, inputPath, outputPath, isDryRun):
+def selectOcrBackend(logger, ocrBackend):
+    if ocrBackend != "auto":
+        return ocrBackend
+
+    if MealieOcr.isAvailable():
+        logger.info("Tesseract found; running OCR locally")
+        return "local"
+
+    logger.info("Tesseract not found; running OCR on Mealie server")
+    return "server"
+
+
+def saveOcrData(logger, ocrData, outputFilePath, ocrFormat, isDryRun):
+    if isDryRun:
+        logger.warning(
+            f"[DRY RUN] Would've created OCR data file '{outputFilePath}'"
+        )
+        return
+
+    # JSON files have the same format as Mealie's OCR endpoint responses, whichever backend ran OCR
+    if ocrFormat == "binary":
+        OcrCache.save(outputFilePath, ocrData)
+    else:
+        OcrCache.exportJson(outputFilePath, ocrData)
+
+
+def analyseScans(logger, ocrPool, inputPath, outputPath, ocrFormat, ocrResultCache, preprocessor, reportWriter, isDryRun):
     logger.info(f"Analysing scans in '{inputPath}'")
 
     if not os.path.exists(outputPath):
@@ -47,43 +132,79 @@ def analyseScans(logger, mealieApi, inputPath, outputPath, isDryRun):
 
     pairs = grouper(scans, 2) # Group front and back scans together
     skips = []
-    processedScanCount = 1
+    failures = []
+    jobs = []
+    engineVersion = None
+    preprocessing = preprocessor.getParameters() if preprocessor else None
 
-    for pair in pairs:
-        logger.info(
-            f"Processing scans {processedScanCount} & {processedScanCount + 1} of {scanCount}"
-        )
+    # Scans identical to one already waiting for OCR, with their output paths, by cache key
+    duplicates: dict[str, list[tuple[str, str]]] = {}
 
+    for pair in pairs:
         inputFile = pair[0]
         outputFilename = os.path.basename(os.path.splitext(inputFile)[0])
-        outputFilePath = f"{outputPath}/{outputFilename}.json"
+        outputFilePath = OcrCache.getPath(f"{outputPath}/{outputFilename}", ocrFormat)
+        existingFilePath = OcrCache.findPath(f"{outputPath}/{outputFilename}")
 
         logger.debug(f"Input file: {inputFile}")
         logger.debug(f"Output file path: {outputFilePath}")
 
-        if os.path.exists(outputFilePath):
+        if existingFilePath:
             logger.warning(
                 f"[DUPLICATE] OCR data for '{inputFile}' already exists. Skipping."
             )
             skips.append(inputFile)
             skips.append(pair[1])
-            processedScanCount += 2
+            reportWriter.write({"scan": inputFile, "status": "skipped", "ocrFile": existingFilePath})
             continue
 
-        ocrData = mealieApi.runOcrOnFile(f"{inputPath}/{inputFile}")
+        # Only front scans are analysed
+        imagePath = f"{inputPath}/{inputFile}"
+        cacheKey = None
+
+        if ocrResultCache is not None:
+            # Only needed once there's a scan to analyse, since it may require Tesseract or Mealie
+            engineVersion = engineVersion or ocrPool.getEngineVersion()
+            cacheKey = OcrResultCache.getKey(OcrResultCache.hashImage(imagePath), *engineVersion, preprocessing=preprocessing)
+            ocrData = ocrResultCache.get(cacheKey)
+
+            if ocrData is not None:
+                logger.info(f"OCR data for '{inputFile}' found in cache")
+                reportWriter.write({"scan": inputFile, "status": "cached", "ocrFile": outputFilePath})
+                saveOcrData(logger, ocrData, outputFilePath, ocrFormat, isDryRun)
+                continue
+
+            if cacheKey in duplicates:
+                logger.info(f"'{inputFile}' is identical to a scan waiting for OCR")
+                duplicates[cacheKey].append((inputFile, outputFilePath))
+                continue
+
+            duplicates[cacheKey] = []
+
+        jobs.append(((inputFile, outputFilePath, cacheKey), imagePath))
+
+    # Scans are analysed concurrently, so they complete out of order
+    for analysedScanCount, ((inputFile, outputFilePath, cacheKey), ocrData) in enumerate(ocrPool.run(jobs), start=1):
+        logger.info(f"Analysed scan {analysedScanCount} of {len(jobs)}")
+
+        identicalScans = [(inputFile, outputFilePath), *duplicates.get(cacheKey, [])]
+
+        if ocrData is None:
+            for inputFile, _ in identicalScans:
+                failures.append(inputFile)
+                reportWriter.write({"scan": inputFile, "status": "failed"})
 
-        if isDryRun:
-            logger.warning(
-                f"[DRY RUN] Would've created OCR data file '{outputFilePath}'"
-            )
             continue
 
-        with open(outputFilePath, mode="w", encoding="utf-8") as jsonFile:
-            jsonFile.write(json.dumps(ocrData, indent=2))
+        if cacheKey:
+            ocrResultCache.put(cacheKey, ocrData)
 
-        processedScanCount += 2
+        for inputFile, outputFilePath in identicalScans:
+            reportWriter.write({"scan": inputFile, "status": "analysed", "ocrFile": outputFilePath})
+            saveOcrData(logger, ocrData, outputFilePath, ocrFormat, isDryRun)
 
     results["skips"] = skips
+    results["failures"] = failures
 
     return results
 
@@ -101,6 +222,14 @@ def logExecutionReport(logger, results):
     if results["skips"]:
         logger.info(f"  Skipped scans: {results['skips']}")
 
+    logger.info(f"  Failed scans count: {len(results['failures'])}")
+
+    if "cacheHits" in results:
+        logger.info(f"  Scans found in OCR cache: {results['cacheHits']}")
+
+    if results["failures"]:
+        logger.info(f"  Failed scans: {results['failures']}")
+
     logger.info("----------------------------")
 
 
@@ -115,15 +244,65 @@ def execute():
     logger.debug(f"Input path: {args.inputPath}")
     logger.debug(f"Output path: {args.outputPath}")
 
-    mealieApi = MealieApi(args.url, args.token, args.caPath, args.cacheDuration)
+    ocrBackend = selectOcrBackend(logger, args.ocrBackend)
+    workers = args.workers if args.workers > 0 else os.cpu_count()
+
+    logger.debug(f"OCR backend: {ocrBackend}")
+    logger.debug(f"Workers: {workers}")
+
+    try:
+        preprocessor = ImagePreprocessor.fromArgs(args)
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(2)
+
+    if preprocessor is not None:
+        logger.debug(f"Image preprocessing: {preprocessor.getParameters()}")
+
+    # Scans are preprocessed the same way whichever pool analyses them
+    def createLocalPool(workers):
+        return OcrWorkerPool(
+            logger,
+            workers,
+            args.timeout,
+            verbosity=args.verbosity,
+            engine=args.ocrEngine,
+            preprocessor=preprocessor
+        )
+
+    if ocrBackend == "local":
+        ocrPool = createLocalPool(workers)
+    elif ocrBackend == "hybrid":
+        mealieApi = MealieApi(args.url, args.token, args.caPath, args.cacheDuration)
+        ocrPool = HybridOcrScheduler(logger, [
+            createLocalPool(workers),
+            ServerOcrPool(logger, mealieApi, args.serverWorkers, args.timeout, preprocessor=preprocessor)
+        ])
+    else:
+        mealieApi = MealieApi(args.url, args.token, args.caPath, args.cacheDuration)
+        ocrPool = ServerOcrPool(logger, mealieApi, workers, args.timeout, preprocessor=preprocessor)
+
+    ocrResultCache = None
+
+    if args.ocrCacheSize > 0:
+        ocrResultCache = OcrResultCache(logger, args.ocrCachePath, args.ocrCacheSize * 1024 * 1024, args.dryRun)
+
+    # Progress is streamed so an interrupted run still shows which scans were processed
+    with NdjsonReportWriter("goodfood-scans-analyser-report.ndjson", args.dryRun) as reportWriter:
+        results = analyseScans(
+            logger,
+            ocrPool,
+            args.inputPath,
+            args.outputPath,
+            args.ocrFormat,
+            ocrResultCache,
+            preprocessor,
+            reportWriter,
+            args.dryRun
+        )
 
-    results = analyseScans(
-        logger,
-        mealieApi,
-        args.inputPath,
-        args.outputPath,
-        args.dryRun
-    )
+    if ocrResultCache is not None:
+        results["cacheHits"] = ocrResultCache.hits
 
     logExecutionReport(logger, results)
 
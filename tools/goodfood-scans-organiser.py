@@ -9,7 +9,14 @@ from slugify import slugify
 import time
 
 from ArgsUtils import ArgsUtils
+from concurrent.futures import Executor, Future
+from ImagePreprocessor import ImagePreprocessor
 from LogUtils import LogUtils
+from MealieOcr import MealieOcr
+from OcrCache import OcrCache
+from OcrLayout import OcrLayout
+from OcrResultCache import OcrResultCache
+from OcrWorkers import OcrWorkerPool
 
 lastCategoryFileName = "last-category.json"
 
@@ -31,8 +38,48 @@ def parseArgs():
 
     parser.add_argument(
         "--ocrDataPath",
-        help="path where OCR data files are located",
-        required=True)
+        help="path where OCR data files are located. Titles of scans without OCR data are found by "
+             "running OCR on their title region.",
+        default=None)
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of processes running title region OCR ahead of the scan being organised. "
+             "Set to 0 to use all CPU cores.",
+        type=int,
+        default=1)
+
+    parser.add_argument(
+        "--timeout",
+        help="Number of seconds after which OCR on a scan is stopped. Set to 0 to disable.",
+        type=float,
+        default=300)
+
+    parser.add_argument(
+        "--ocrEngine",
+        help="How Tesseract is run locally: 'tesserocr' keeps it loaded in-process, 'pytesseract' starts a "
+             "tesseract process per image and 'auto' uses tesserocr when it's installed",
+        choices=["auto", "tesserocr", "pytesseract"],
+        default="auto")
+
+    parser.add_argument(
+        "--ocrFormat",
+        help="Format of OCR data files saved when a whole page had to be analysed: 'binary' (.ocr files) or 'json'",
+        choices=["binary", "json"],
+        default="binary")
+
+    parser.add_argument(
+        "--ocrCachePath",
+        help="Path where OCR results are cached by image content, shared with the scans and recipes analysers",
+        default="ocr-cache")
+
+    parser.add_argument(
+        "--ocrCacheSize",
+        help="Maximum size of the OCR cache in MiB; least recently used results are removed first. "
+             "Set to 0 to disable the cache.",
+        type=int,
+        default=1024)
 
     return parser.parse_args()
 
@@ -91,45 +138,30 @@ def createFolder(logger, path, isDryRun):
     os.makedirs(path)
 
 
-def findTitleCandidates(logger, ocrDataFilePath):
+def findTitleCandidates(logger, tsv):
     logger.info("Attempting to automatically find recipe title")
 
-    tsv = loadOcrData(logger, ocrDataFilePath)
-
     # Algorithm based on Mealie's: [1]
     # [1]: https://github.com/mealie-recipes/mealie/blob/4af9eec89dd0b309ebea752d715add3fe0980b3d/frontend/components/Domain/Recipe/RecipeOcrEditorPage/RecipeOcrEditorPage.vue#L223C6-L223C6 # noqa
-    filtered = [a for a in tsv if a["level"] == 2 or a["level"] == 5]
-    blocks = [[]]
-    blockNum = 1
-
-    for i, element in enumerate(filtered):
-        if i != 0 and filtered[i - 1]["blockNum"] != element["blockNum"]:
-            blocks.append([])
-            blockNum = element["blockNum"]
-
-        blocks[blockNum - 1].append(element)
-
+    layout = OcrLayout(tsv)
     candidates = []
 
     # The bigger and higher in the page the block is, the higher the score
-    for block in blocks:
-        blockDefinition = block[0]
-        blockSizeScore = blockDefinition["height"] * blockDefinition["width"]
+    for block in layout.blocks:
+        blockSizeScore = block.height * block.width
 
-        if blockDefinition["top"] != 0:
-            topModifier = 1 / blockDefinition["top"]
+        if block.top != 0:
+            topModifier = 1 / block.top
         else:
             topModifier = 1
 
-        blockScore = blockSizeScore * topModifier / len(block)
-        blockText = "".join(map(lambda e: e["text"], block))
+        # Mealie counts the block's definition with its words
+        blockScore = blockSizeScore * topModifier / (len(block.wordRows) + 1)
 
-        if blockText != "":
-            filter = [e for e in block if e["level"] == 5 and e["conf"] >= 40]
-            text = " ".join(map(lambda e: e["text"].strip(), filter))
+        if block.getText() != "":
             candidates.append({
                 "score": blockScore,
-                "text": text
+                "text": block.getText(minConf=40)
             })
 
     candidates.sort(key=lambda e: e["score"], reverse=True)
@@ -142,10 +174,122 @@ def findTitleCandidates(logger, ocrDataFilePath):
 def loadOcrData(logger, ocrDataFilePath):
     logger.info("Loading OCR data")
 
-    with open(ocrDataFilePath, encoding="utf-8") as ocrDataFile:
-        ocrData = json.load(ocrDataFile)
+    return OcrCache.load(ocrDataFilePath)
+
+
+# Binary OCR data first, then JSON written by previous versions of the scans analyser
+def findOcrFilePath(ocrDataPath, frontFilename):
+    if ocrDataPath is None:
+        return None
+
+    ocrFilename = os.path.basename(os.path.splitext(frontFilename)[0])
+
+    return OcrCache.findPath(f"{ocrDataPath}/{ocrFilename}")
+
+
+# Title region and whole page OCR results are preprocessed differently, so they're cached under
+# different keys
+def getOcrCacheKey(imageHash, engineVersion, preprocessor: ImagePreprocessor):
+    preprocessing = preprocessor.getParameters() if preprocessor else None
+
+    return OcrResultCache.getKey(imageHash, *engineVersion, preprocessing=preprocessing)
+
+
+# Title region OCR of all front scans without OCR data (nor cached title region OCR results) is
+# started right away, so it runs ahead while titles are being confirmed. Worker processes are only
+# started when there's a scan to analyse. Returns the executor, if any, and each scan's job: its
+# image hash (when the cache is enabled), the key its result still has to be cached under and its
+# result.
+def startTitleOcr(logger,
+                  ocrPool: OcrWorkerPool,
+                  ocrResultCache: OcrResultCache,
+                  inputPath,
+                  ocrDataPath,
+                  scans) -> tuple[Executor, dict[str, dict]]:
+    titleOcrJobs = {}
+    engineVersion = None
+    executor = None
+    cachedCount = 0
+
+    for frontFilename, _ in grouper(scans, 2):
+        if findOcrFilePath(ocrDataPath, frontFilename) is not None:
+            continue
+
+        imagePath = f"{inputPath}/{frontFilename}"
+        job = {
+            "imageHash": None,
+            "cacheKey": None
+        }
+
+        if ocrResultCache is not None:
+            engineVersion = engineVersion or ocrPool.getEngineVersion()
+            job["imageHash"] = OcrResultCache.hashImage(imagePath)
+            cacheKey = getOcrCacheKey(job["imageHash"], engineVersion, ocrPool.preprocessor)
+            ocrData = ocrResultCache.get(cacheKey)
+
+            if ocrData is not None:
+                logger.debug(f"Title region OCR data for '{frontFilename}' found in cache")
+                cachedCount += 1
+                job["future"] = Future()
+                job["future"].set_result(ocrData)
+                titleOcrJobs[frontFilename] = job
+                continue
+
+            job["cacheKey"] = cacheKey
+
+        executor = executor or ocrPool.createExecutor()
+        job["future"] = executor.submit(ocrPool.runJob, imagePath)
+        titleOcrJobs[frontFilename] = job
+
+    logger.info(f"Running title region OCR on {len(titleOcrJobs) - cachedCount} scan(s) without OCR data"
+                f" ({cachedCount} found in cache)")
+
+    return executor, titleOcrJobs
+
+
+# Finds title candidates from the scan's title region OCR, falling back to OCR of the whole page
+# when no title is found there. Returns the candidates and whole page OCR data, if any.
+def analyseTitle(logger,
+                 titleOcrJob: dict,
+                 ocrPool: OcrWorkerPool,
+                 mealieOcr: MealieOcr,
+                 ocrResultCache: OcrResultCache,
+                 imagePath):
+    logger.info("Waiting for title region OCR")
 
-    return ocrData
+    try:
+        ocrData = titleOcrJob["future"].result()
+
+        if titleOcrJob["cacheKey"]:
+            ocrResultCache.put(titleOcrJob["cacheKey"], ocrData)
+
+        titleCandidates = findTitleCandidates(logger, ocrData)
+    except Exception as e:
+        logger.warning(f"Title region OCR failed on '{imagePath}': {e}")
+        titleCandidates = []
+
+    if cleanTitles(logger, titleCandidates):
+        return titleCandidates, None
+
+    logger.info("No title found in title region. Running OCR on the whole page.")
+
+    cacheKey = None
+    ocrData = None
+
+    if ocrResultCache is not None:
+        cacheKey = getOcrCacheKey(titleOcrJob["imageHash"], mealieOcr.getEngineVersion(), mealieOcr.preprocessor)
+        ocrData = ocrResultCache.get(cacheKey)
+
+    if ocrData is None:
+        with open(imagePath, "rb") as image:
+            ocrData = mealieOcr.runOcrOnFile(image.read(), timeout=ocrPool.timeout)
+
+        if cacheKey:
+            ocrResultCache.put(cacheKey, ocrData)
+    else:
+        logger.info("Whole page OCR data found in cache")
+
+    return findTitleCandidates(logger, ocrData), ocrData
 
 
 def cleanTitles(logger, titles):
@@ -217,7 +361,16 @@ def cleanTitles(logger, titles):
     return cleanedTitles
 
 
-def organiseScans(logger, inputPath, outputPath, ocrDataPath, category, isDryRun):
+def organiseScans(logger,
+                  inputPath,
+                  outputPath,
+                  ocrDataPath,
+                  category,
+                  ocrPool,
+                  mealieOcr,
+                  ocrResultCache,
+                  ocrFormat,
+                  isDryRun):
     logger.info(f"Organising scans in '{inputPath}'")
 
     scans = os.listdir(inputPath)
@@ -234,6 +387,49 @@ def organiseScans(logger, inputPath, outputPath, ocrDataPath, category, isDryRun
     }
 
     pairs = grouper(scans, 2)
+    executor = None
+    titleOcrJobs = {}
+
+    if ocrPool:
+        executor, titleOcrJobs = startTitleOcr(logger, ocrPool, ocrResultCache, inputPath, ocrDataPath, scans)
+
+    try:
+        results["duplicates"] = organisePairs(
+            logger,
+            pairs,
+            scanCount,
+            inputPath,
+            outputPath,
+            ocrDataPath,
+            category,
+            titleOcrJobs,
+            ocrPool,
+            mealieOcr,
+            ocrResultCache,
+            ocrFormat,
+            isDryRun
+        )
+    finally:
+        if executor:
+            # Title OCR of scans left when stopped early isn't needed anymore
+            executor.shutdown(cancel_futures=True)
+
+    return results
+
+
+def organisePairs(logger,
+                  pairs,
+                  scanCount,
+                  inputPath,
+                  outputPath,
+                  ocrDataPath,
+                  category,
+                  titleOcrJobs: dict[str, dict],
+                  ocrPool: OcrWorkerPool,
+                  mealieOcr: MealieOcr,
+                  ocrResultCache: OcrResultCache,
+                  ocrFormat,
+                  isDryRun):
     duplicates = []
     processedScanCount = 1
 
@@ -243,14 +439,29 @@ def organiseScans(logger, inputPath, outputPath, ocrDataPath, category, isDryRun
         )
 
         frontFilename = pair[0]
-        ocrFilename = f"{os.path.basename(os.path.splitext(frontFilename)[0])}.json"
-        ocrFilePath = f"{ocrDataPath}/{ocrFilename}"
+        ocrFilePath = findOcrFilePath(ocrDataPath, frontFilename)
+
+        # Whole page OCR data, when it had to be run to find the title
+        ocrData = None
 
         logger.debug(f"Front filename: {frontFilename}")
         logger.debug(f"Back filename: {pair[1]}")
 
         try:
-            titleCandidates = findTitleCandidates(logger, ocrFilePath)
+            if ocrFilePath:
+                titleCandidates = findTitleCandidates(logger, loadOcrData(logger, ocrFilePath))
+            elif frontFilename in titleOcrJobs:
+                titleCandidates, ocrData = analyseTitle(
+                    logger,
+                    titleOcrJobs.pop(frontFilename),
+                    ocrPool,
+                    mealieOcr,
+                    ocrResultCache,
+                    f"{inputPath}/{frontFilename}"
+                )
+            else:
+                logger.warning(f"No OCR data for '{frontFilename}'")
+                titleCandidates = []
         except Exception as e:
             logger.warning(f"Error occurred during title analysis: {e}")
             titleCandidates = []
@@ -276,15 +487,13 @@ def organiseScans(logger, inputPath, outputPath, ocrDataPath, category, isDryRun
             recipe=recipe,
             isDryRun=isDryRun
         )
-        createOcrData(logger, ocrFilePath, recipePath, isDryRun)
+        createOcrData(logger, ocrFilePath, ocrData, ocrFormat, recipePath, isDryRun)
         convertScan(logger, frontFilename, "Front", inputPath, recipePath, isDryRun)
         convertScan(logger, pair[1], "Back", inputPath, recipePath, isDryRun)
 
         processedScanCount += 2
 
-    results["duplicates"] = duplicates
-
-    return results
+    return duplicates
 
 
 def grouper(iterable, n, fillvalue=None):
@@ -432,14 +641,32 @@ def createMetadata(logger, filePath, category, recipe, isDryRun):
         jsonFile.write(json.dumps(metadata, indent=2))
 
 
-def createOcrData(logger, ocrFilePath, recipePath, isDryRun):
+# Title region OCR data isn't kept, since it doesn't cover the whole page
+def createOcrData(logger, ocrFilePath, ocrData, ocrFormat, recipePath, isDryRun):
+    if ocrFilePath is None and ocrData is None:
+        logger.debug("No whole page OCR data to copy")
+        return
+
+    if ocrFilePath is None:
+        filePath = OcrCache.getPath(f"{recipePath}/ocr-front", ocrFormat)
+        logger.info("Saving OCR data")
+
+        if isDryRun:
+            logger.warning(f"[DRY RUN] Would've created OCR data file '{filePath}'")
+        elif ocrFormat == "binary":
+            OcrCache.save(filePath, ocrData)
+        else:
+            OcrCache.exportJson(filePath, ocrData)
+
+        return
+
     logger.info("Copying OCR data")
 
     if isDryRun:
         logger.warning(f"[DRY RUN] Would've copied OCR data file '{ocrFilePath}'")
         return
 
-    shutil.copy2(ocrFilePath, f"{recipePath}/ocr-front.json")
+    shutil.copy2(ocrFilePath, f"{recipePath}/ocr-front{os.path.splitext(ocrFilePath)[1]}")
 
 
 def convertScan(logger, fileName, newName, inputFolder, outputFolder, isDryRun):
@@ -495,12 +722,40 @@ def execute():
 
     saveCategory(logger, category, args.dryRun)
 
+    ocrPool = None
+    mealieOcr = None
+    ocrResultCache = None
+
+    if MealieOcr.isAvailable():
+        workers = args.workers if args.workers > 0 else os.cpu_count()
+
+        # Only the title band of pages is analysed, so titles are found in a fraction of the time
+        titlePreprocessor = ImagePreprocessor(grayscale=True, region=ImagePreprocessor.titleRegion)
+        ocrPool = OcrWorkerPool(
+            logger,
+            workers,
+            args.timeout,
+            verbosity=args.verbosity,
+            engine=args.ocrEngine,
+            preprocessor=titlePreprocessor
+        )
+        mealieOcr = MealieOcr(args.ocrEngine)
+
+        if args.ocrCacheSize > 0:
+            ocrResultCache = OcrResultCache(logger, args.ocrCachePath, args.ocrCacheSize * 1024 * 1024, args.dryRun)
+    else:
+        logger.warning("Tesseract not found; titles of scans without OCR data will have to be typed in")
+
     results = organiseScans(
         logger,
         args.inputPath,
         args.outputPath,
         args.ocrDataPath,
         category,
+        ocrPool,
+        mealieOcr,
+        ocrResultCache,
+        args.ocrFormat,
         args.dryRun
     )
 
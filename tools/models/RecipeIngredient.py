@@ -90,6 +90,7 @@ class IngredientFood:
     createdAt: datetime.datetime
     updateAt: datetime.datetime
 
+    name: str = ""
     labelId: UUID4 = None
 
     def __init__(self,
@@ -98,11 +99,13 @@ class IngredientFood:
                  updateAt: datetime.datetime,
                  label: IngredientLabel = None,
 
+                 name: str = "",
                  labelId: UUID4 = None):
         self.id = id
         self.createdAt = createdAt
         self.updateAt = updateAt
         self.label = label
+        self.name = name
         self.labelId = labelId
 
     @staticmethod
@@ -115,6 +118,7 @@ class IngredientFood:
             createdAt = json_dct.get("createdAt"),
             updateAt = json_dct.get("updateAt"),
             label = IngredientLabel.from_json(json_dct.get("label")),
+            name = json_dct.get("name"),
             labelId = json_dct.get("labelId"),
             )
 
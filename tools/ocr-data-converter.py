@@ -0,0 +1,173 @@
+import json
+import os
+
+from ArgsUtils import ArgsUtils
+from LogUtils import LogUtils
+from MealieOcr import MealieOcr
+from OcrCache import OcrCache
+
+
+def parseArgs():
+    parser = ArgsUtils.initialiseParser()
+
+    parser.add_argument(
+        "-i",
+        "--inputPath",
+        help="OCR data file, or folder searched recursively for OCR data files",
+        required=True)
+
+    parser.add_argument(
+        "--toFormat",
+        help="Format OCR data files are converted to: 'binary' (.ocr files) or 'json'",
+        choices=["binary", "json"],
+        default="binary")
+
+    parser.add_argument(
+        "--removeSource",
+        help="Remove files once converted",
+        action="store_true")
+
+    return parser.parse_args()
+
+
+def findFiles(inputPath, extension):
+    if os.path.isfile(inputPath):
+        return [inputPath] if inputPath.endswith(extension) else []
+
+    filePaths = []
+
+    for directory, _, fileNames in os.walk(inputPath):
+        filePaths.extend(os.path.join(directory, f) for f in sorted(fileNames) if f.endswith(extension))
+
+    return sorted(filePaths)
+
+
+# Returns the chunks of an OCR data file or the blocks of an OCR blocks file, or None if the JSON
+# file holds something else (e.g. recipe metadata)
+def loadJsonOcrData(filePath):
+    with open(filePath, encoding="utf-8") as jsonFile:
+        data = json.load(jsonFile)
+
+    if not isinstance(data, list):
+        return None, False
+
+    if data:
+        isBlocks = any(isinstance(d, list) for d in data)
+    else:
+        # An empty list could be either; OCR blocks files are named after their "ocr-blocks-" prefix
+        isBlocks = os.path.basename(filePath).startswith("ocr-blocks-")
+
+    rows = [c for b in data for c in b] if isBlocks else data
+
+    if not all(isinstance(r, dict) and "blockNum" in r for r in rows):
+        return None, False
+
+    if isBlocks:
+        return [[MealieOcr.OcrChunk.Encoder.decode(c) for c in b] for b in data], True
+
+    return [MealieOcr.OcrChunk.Encoder.decode(c) for c in data], False
+
+
+def convertToBinary(logger, filePath, outputFilePath):
+    ocrData, isBlocks = loadJsonOcrData(filePath)
+
+    if ocrData is None:
+        logger.debug(f"'{filePath}' doesn't contain OCR data. Skipping.")
+        return False
+
+    if isBlocks:
+        OcrCache.saveBlocks(outputFilePath, ocrData)
+    else:
+        OcrCache.save(outputFilePath, ocrData)
+
+    return True
+
+
+def convertToJson(logger, filePath, outputFilePath):
+    result, groupOffsets = OcrCache.read(filePath)
+
+    if groupOffsets is not None:
+        bounds = groupOffsets.tolist()
+        OcrCache.exportJson(outputFilePath, [list(result.slice(a, b)) for a, b in zip(bounds, bounds[1:])])
+    else:
+        OcrCache.exportJson(outputFilePath, result)
+
+    return True
+
+
+def convertFiles(logger, inputPath, toFormat, removeSource, isDryRun):
+    sourceExtension = ".json" if toFormat == "binary" else OcrCache.extension
+    filePaths = findFiles(inputPath, sourceExtension)
+
+    logger.info(f"Found {len(filePaths)} '{sourceExtension}' file(s) in '{inputPath}'")
+
+    results = {
+        "converted": [],
+        "skipped": [],
+        "failed": []
+    }
+
+    for filePath in filePaths:
+        outputFilePath = OcrCache.getPath(os.path.splitext(filePath)[0], toFormat)
+
+        if os.path.exists(outputFilePath):
+            logger.warning(f"[DUPLICATE] '{outputFilePath}' already exists. Skipping.")
+            results["skipped"].append(filePath)
+            continue
+
+        if isDryRun:
+            logger.warning(f"[DRY RUN] Would've converted '{filePath}' to '{outputFilePath}'")
+            continue
+
+        try:
+            if toFormat == "binary":
+                isConverted = convertToBinary(logger, filePath, outputFilePath)
+            else:
+                isConverted = convertToJson(logger, filePath, outputFilePath)
+        except Exception as e:
+            logger.error(f"Error occurred when converting '{filePath}': {e}")
+            results["failed"].append(filePath)
+            continue
+
+        if not isConverted:
+            results["skipped"].append(filePath)
+            continue
+
+        logger.info(f"Converted '{filePath}' to '{outputFilePath}'")
+        results["converted"].append(filePath)
+
+        if removeSource:
+            os.remove(filePath)
+
+    return results
+
+
+def logExecutionReport(logger, results):
+    logger.info("----- Execution report -----")
+    logger.info(f"  Converted files count: {len(results['converted'])}")
+    logger.info(f"  Skipped files count: {len(results['skipped'])}")
+    logger.info(f"  Failed files count: {len(results['failed'])}")
+
+    if results["failed"]:
+        logger.info(f"  Failed files: {results['failed']}")
+
+    logger.info("----------------------------")
+
+
+def execute():
+    args = parseArgs()
+    logger = LogUtils.initialiseLogger(args.verbosity, filename="ocr-data-converter.log")
+
+    if args.dryRun:
+        logger.warning("[DRY RUN] Running script in dry run mode; file system will not be modified")
+
+    logger.debug(f"Input path: {args.inputPath}")
+    logger.debug(f"Format: {args.toFormat}")
+
+    results = convertFiles(logger, args.inputPath, args.toFormat, args.removeSource, args.dryRun)
+
+    logExecutionReport(logger, results)
+
+
+if __name__ == "__main__":
+    execute()
@@ -1,18 +1,412 @@
 import csv
-from datetime import timedelta
 import json
+import logging
+import os
+from datetime import timedelta
 
 from ArgsUtils import ArgsUtils
+from DuplicateClusters import DuplicateClusters
 from LogUtils import LogUtils
 from MealieApi import MealieApi
+from models.Recipe import Recipe
+from ReportWriter import NdjsonReportWriter, ParquetReportWriter, TsvReportWriter
+from TagRuleEngine import TagRuleEngine
 from thefuzz import fuzz
+from TitleIndex import TitleIndex
+from TitleSimilarity import findCandidatePairs, findSimilarPairs
+from typing import Iterable
 
 
 def parseArgs():
     parser = ArgsUtils.initialiseParser(scriptUsesMealieApi=True)
+
+    parser.add_argument(
+        "--threshold",
+        help="Minimum ratio (0-100) for two titles to be reported as potential duplicates",
+        type=int,
+        default=75
+    )
+
+    parser.add_argument(
+        "--exhaustive",
+        help="Compare every pair of titles instead of only the ones sharing enough n-grams",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--exhaustiveMaxTitles",
+        help="Compare every pair of titles when the library has at most this many recipes. Finding"
+        " candidate pairs costs more than comparing every pair in small libraries, but the ratios"
+        " file grows with the number of pairs.",
+        type=int,
+        default=5000
+    )
+
+    parser.add_argument(
+        "--ratioFloor",
+        help="Minimum ratio (0-100) for a pair of titles to be written to the ratios file",
+        type=int,
+        default=50
+    )
+
+    parser.add_argument(
+        "--ratiosFormat",
+        help="Format of the ratios file listing compared pairs of titles",
+        choices=["tsv.gz", "parquet"],
+        default="tsv.gz"
+    )
+
+    parser.add_argument(
+        "--denseRatios",
+        help="Also write title-ratios.tsv, a matrix of all titles' ratios. Only suitable for small"
+        " libraries, since it has a cell for every pair of titles.",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of threads used to compare titles in exhaustive mode. Set to 0 to use all CPU cores.",
+        type=int,
+        default=0
+    )
+
+    parser.add_argument(
+        "--ngramSize",
+        help="Length of the character n-grams used to find titles worth comparing",
+        type=int,
+        default=3
+    )
+
+    parser.add_argument(
+        "--minNgramSimilarity",
+        help="Minimum n-gram similarity (0-1) for two titles to be compared. Lower values find"
+        " more duplicates but compare more pairs.",
+        type=float,
+        default=0.4
+    )
+
+    parser.add_argument(
+        "--measureRecall",
+        help="Also compare every pair of titles and log the share of duplicates found by the"
+        " n-gram comparison",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--indexPath",
+        help="Path to the title index, which is updated after each run",
+        default="title-index.json"
+    )
+
+    parser.add_argument(
+        "--incremental",
+        help="Only compare the titles of recipes added or renamed since the last run with the"
+        " rest of the library, using the title index, and update the previous report. The ratios"
+        " files aren't written in this mode.",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--content",
+        help="Also compare recipes' ingredients and instructions (TF-IDF cosine similarity) to find"
+        " duplicates imported under different titles; written to content-report.json (requires scipy)",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--contentThreshold",
+        help="Minimum content similarity (0-1) for two recipes to be reported as potential duplicates",
+        type=float,
+        default=0.8
+    )
+
+    parser.add_argument(
+        "-r",
+        "--rulesPath",
+        help="Path to the JSON (or YAML) tag rules file, used to pick the most complete recipe of"
+        " each duplicate cluster",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag-rules.json")
+    )
+
+    parser.add_argument(
+        "--linkDuplicates",
+        help="Add a 'duplicate' API Extras link to the canonical recipe on the other recipes of each"
+        " duplicate cluster",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--groupSlug",
+        help="Slug of the Mealie group, used to build recipe links",
+        default="home"
+    )
+
     return parser.parse_args()
 
 
+# Yields (i, j, ratio) for each compared pair of slugs. All pairs scoring at least minRatio are
+# returned in exhaustive mode, and all candidate pairs otherwise.
+def compareSlugs(logger: logging.Logger,
+                 slugs: list[str],
+                 minRatio: int,
+                 isExhaustive: bool,
+                 ngramSize: int,
+                 minNgramSimilarity: float,
+                 workers: int) -> Iterable[tuple[int, int, int]]:
+    pairCount = len(slugs) * (len(slugs) - 1) // 2
+
+    if isExhaustive:
+        logger.info(f"Comparing all {pairCount} pairs of titles with {workers} workers")
+        return findSimilarPairs(slugs, minRatio, workers)
+
+    pairs = findCandidatePairs(slugs, ngramSize, minNgramSimilarity)
+
+    logger.info(f"Comparing {len(pairs)} candidate pairs of titles (out of {pairCount})")
+
+    return ((i, j, fuzz.ratio(slugs[i], slugs[j])) for i, j in pairs)
+
+
+def compareRecipeTitles(logger: logging.Logger,
+                        recipes: list[Recipe],
+                        reportWriter: NdjsonReportWriter,
+                        duplicateThreshold: int,
+                        ratiosWriter: TsvReportWriter | ParquetReportWriter = None,
+                        ratioFloor: int = 50,
+                        isExhaustive: bool = False,
+                        ngramSize: int = 3,
+                        minNgramSimilarity: float = 0.4,
+                        workers: int = 1,
+                        buildDenseRatios: bool = False,
+                        clusters: DuplicateClusters = None) -> list[dict]:
+    slugs = [r.slug for r in recipes]
+    slugKey = "_slug"
+    minRatio = min(duplicateThreshold, ratioFloor if ratiosWriter else 100)
+
+    if buildDenseRatios:
+        # Pairs that weren't compared (including each recipe with itself and recipes before it) are empty
+        denseRatios = [{slugKey: slug, **dict.fromkeys(slugs)} for slug in slugs]
+        minRatio = 0
+    else:
+        denseRatios = None
+
+    comparedPairs = compareSlugs(
+        logger,
+        slugs,
+        minRatio,
+        isExhaustive,
+        ngramSize,
+        minNgramSimilarity,
+        workers
+    )
+
+    for i, j, ratio in comparedPairs:
+        if denseRatios is not None:
+            denseRatios[i][slugs[j]] = ratio
+
+        if ratiosWriter and ratio >= ratioFloor:
+            ratiosWriter.write([slugs[i], slugs[j], ratio])
+
+        if ratio >= duplicateThreshold:
+            reportWriter.write({
+                "recipe": slugs[i],
+                "duplicate": slugs[j],
+                "ratio": ratio
+            })
+
+            if clusters is not None:
+                clusters.union(slugs[i], slugs[j])
+
+    if denseRatios is None:
+        return []
+
+    logger.debug("Sorting results")
+
+    return [{key: results[key] for key in sorted(results.keys())} for results in denseRatios]
+
+
+# Compares the titles of recipes added or renamed since the previous report with the rest of the
+# library through the title index, and writes them with the previous report's pairs that are still
+# valid. Gives the same report as comparing all candidate pairs again.
+def compareNewRecipeTitles(logger: logging.Logger,
+                           index: TitleIndex,
+                           slugs: list[str],
+                           previousPairs: list[dict],
+                           reportWriter: NdjsonReportWriter,
+                           duplicateThreshold: int,
+                           minNgramSimilarity: float,
+                           clusters: DuplicateClusters = None):
+    _, removed = index.sync(slugs)
+    added = index.addedSince(index.metadata["reportRevision"])
+
+    logger.info(f"Comparing {len(added)} new title(s) with the library ({len(removed)} title(s) removed)")
+
+    addedSlugs = set(added)
+    pairs = {
+        (p["recipe"], p["duplicate"]): p["ratio"]
+        for p in previousPairs
+        if p["recipe"] in index and p["duplicate"] in index
+        and p["recipe"] not in addedSlugs and p["duplicate"] not in addedSlugs
+    }
+
+    for slug in added:
+        for other, ratio in index.findSimilar(slug, None, duplicateThreshold, minNgramSimilarity):
+            pairs[min(slug, other), max(slug, other)] = ratio
+
+    for (recipe, duplicate), ratio in sorted(pairs.items()):
+        reportWriter.write({
+            "recipe": recipe,
+            "duplicate": duplicate,
+            "ratio": ratio
+        })
+
+        if clusters is not None:
+            clusters.union(recipe, duplicate)
+
+
+def compareRecipeContents(logger: logging.Logger,
+                          recipes: list[Recipe],
+                          reportWriter: NdjsonReportWriter,
+                          minSimilarity: float,
+                          clusters: DuplicateClusters = None):
+    from ContentSimilarity import findSimilarRecipes # Only requires scipy when contents are compared
+
+    logger.info(f"Comparing ingredients and instructions of {len(recipes)} recipes")
+
+    for i, j, similarity in findSimilarRecipes(recipes, minSimilarity):
+        reportWriter.write({
+            "recipe": recipes[i].slug,
+            "duplicate": recipes[j].slug,
+            "similarity": round(similarity, 4)
+        })
+
+        if clusters is not None:
+            clusters.union(recipes[i].slug, recipes[j].slug)
+
+
+# Picks the most complete recipe of each cluster as the one to keep, i.e. the one needing the
+# fewest flag tags according to the tag rules (ties go to the first slug)
+def selectCanonicalRecipes(logger: logging.Logger,
+                           clusters: list[list[str]],
+                           recipesBySlug: dict[str, Recipe],
+                           engine: TagRuleEngine) -> list[dict]:
+    logger.info(f"Selecting canonical recipes of {len(clusters)} duplicate cluster(s)")
+
+    results = []
+
+    for cluster in clusters:
+        completeness = {slug: engine.computeCompleteness(recipesBySlug[slug]) for slug in cluster}
+        canonical = min(cluster, key=lambda slug: (-completeness[slug], slug))
+
+        logger.debug(f"Canonical recipe of {cluster}: {canonical}")
+
+        results.append({
+            "canonical": canonical,
+            "recipes": cluster,
+            "completeness": completeness
+        })
+
+    return results
+
+
+# Returns the patches adding a link to the canonical recipe in the API Extras of the other recipes
+# of each cluster, skipping recipes already linking to it
+def planDuplicateLinks(duplicateClusters: list[dict],
+                       recipesBySlug: dict[str, Recipe],
+                       recipeUrl: str) -> list[dict]:
+    patches = []
+
+    for cluster in duplicateClusters:
+        canonicalUrl = f"{recipeUrl}/{cluster['canonical']}"
+
+        for slug in cluster["recipes"]:
+            recipe = recipesBySlug[slug]
+            extras = dict(recipe.extras or {})
+
+            if slug == cluster["canonical"] or canonicalUrl in extras.values():
+                continue
+
+            key = "duplicate"
+            suffix = 1
+
+            while key in extras:
+                suffix += 1
+                key = f"duplicate-{suffix}"
+
+            extras[key] = canonicalUrl
+            patches.append({
+                "id": str(recipe.id),
+                "slug": slug,
+                "extras": extras
+            })
+
+    return patches
+
+
+def linkDuplicates(logger: logging.Logger, mealieApi: MealieApi, patches: list[dict], isDryRun: bool):
+    if not patches:
+        logger.info("All duplicate recipes already link to their canonical recipe")
+        return
+
+    if isDryRun:
+        logger.warning(f"[DRY RUN] Would've added duplicate links to {[p['slug'] for p in patches]}")
+        return
+
+    logger.info(f"Adding duplicate links to {len(patches)} recipe(s)")
+    mealieApi.patchRecipes(patches)
+
+
+# Returns the saved title index if the previous report can be updated from it, None otherwise
+def loadTitleIndex(logger: logging.Logger, indexPath: str, ngramSize: int, reportOptions: dict) -> TitleIndex:
+    index = TitleIndex.load(logger, indexPath, ngramSize)
+
+    if index is None:
+        return None
+
+    if {key: index.metadata.get(key) for key in reportOptions} != reportOptions:
+        logger.info("Report options changed since last run; comparing all titles")
+        return None
+
+    if not os.path.exists("title-report.ndjson"):
+        logger.info("No previous report found; comparing all titles")
+        return None
+
+    return index
+
+
+def measureRecall(logger: logging.Logger,
+                  slugs: list[str],
+                  duplicateThreshold: int,
+                  ngramSize: int,
+                  minNgramSimilarity: float,
+                  workers: int):
+    logger.info("Measuring n-gram comparison recall against an exhaustive comparison")
+
+    expected = {(i, j) for i, j, _ in findSimilarPairs(slugs, duplicateThreshold, workers)}
+    found = {
+        (i, j)
+        for i, j in findCandidatePairs(slugs, ngramSize, minNgramSimilarity)
+        if fuzz.ratio(slugs[i], slugs[j]) >= duplicateThreshold
+    }
+    recall = len(found) / len(expected) if expected else 1.0
+
+    logger.info(f"Recall: {recall:.2%} ({len(found)} of {len(expected)} potential duplicates found)")
+
+    for i, j in sorted(expected - found):
+        logger.debug(f"Missed: {slugs[i]} / {slugs[j]}")
+
+
+def writeDenseRatios(logger: logging.Logger, denseRatios: list[dict], isDryRun: bool):
+    if isDryRun:
+        logger.warning("[DRY RUN] Would've written ratios file")
+        return
+
+    with open("title-ratios.tsv", mode="w", encoding="utf-8", newline="") as tsvFile:
+        dw = csv.DictWriter(tsvFile, sorted(denseRatios[0].keys()), delimiter='\t')
+        dw.writeheader()
+        dw.writerows(denseRatios)
+
+
 def execute():
     args = parseArgs()
     logger = LogUtils.initialiseLogger(args.verbosity, filename="recipe-title-analyser.log")
@@ -25,59 +419,130 @@ def execute():
 
     mealieApi = MealieApi(args.url, args.token, args.caPath, args.cacheDuration)
 
-    recipes = mealieApi.getAllRecipes()
-    recipes.sort(key=lambda r: r.slug)
+    reportOptions = {
+        "threshold": args.threshold,
+        "minNgramSimilarity": args.minNgramSimilarity,
+        "isExhaustive": args.exhaustive
+    }
+    index = None
 
-    ratios = []
-    potentialDuplicates = []
-    duplicateThreshold = 75 # Change this to tweak duplicate title detection sensitivity
+    if args.incremental:
+        if args.exhaustive or args.denseRatios or args.content:
+            logger.warning("Incremental mode only supports n-gram comparisons without dense ratios"
+                           " or contents; comparing all titles")
+        else:
+            index = loadTitleIndex(logger, args.indexPath, args.ngramSize, reportOptions)
 
-    for recipe in recipes:
-        logger.info(f"Processing recipe {recipe.slug}")
+    workers = args.workers if args.workers > 0 else os.cpu_count()
+    clusters = DuplicateClusters()
 
-        slugKey = "_slug"
-        results = {
-            slugKey: recipe.slug
-        }
+    if index is not None:
+        # Summaries are enough to get slugs, without fetching every recipe
+        slugs = sorted(s["slug"] for s in mealieApi.getAllRecipeSummaries())
+        previousPairs = list(NdjsonReportWriter.readRecords("title-report.ndjson"))
+        reportWriter = NdjsonReportWriter("title-report.ndjson", args.dryRun)
 
-        for other in recipes:
-            if recipe.id == other.id:
-                results[other.slug] = None
-                continue
+        compareNewRecipeTitles(
+            logger,
+            index,
+            slugs,
+            previousPairs,
+            reportWriter,
+            args.threshold,
+            args.minNgramSimilarity,
+            clusters
+        )
 
-            # Check if recipe has already been compared to other
-            if True in (e[slugKey] == other.slug and recipe.slug in e.keys() for e in ratios):
-                results[other.slug] = None
-                continue
+        recipesBySlug = {}
+    else:
+        recipes = mealieApi.getAllRecipes()
+        recipes.sort(key=lambda r: r.slug)
+        slugs = [r.slug for r in recipes]
 
-            ratio = fuzz.ratio(recipe.slug, other.slug)
-            results[other.slug] = ratio
+        reportWriter = NdjsonReportWriter("title-report.ndjson", args.dryRun)
+        ratiosColumns = [("recipe", "string"), ("other", "string"), ("ratio", "uint8")]
 
-            if ratio >= duplicateThreshold:
-                potentialDuplicates.append((recipe.slug, other.slug))
+        if args.ratiosFormat == "parquet":
+            ratiosWriter = ParquetReportWriter("title-ratios.parquet", ratiosColumns, args.dryRun)
+        else:
+            ratiosWriter = TsvReportWriter("title-ratios.tsv.gz", ratiosColumns, args.dryRun)
 
-        logger.debug("Sorting results")
-        keys = list(results.keys())
-        keys.sort()
-        sortedResults = {i: results[i] for i in keys}
-        ratios.append(sortedResults)
+        isExhaustive = args.exhaustive or len(recipes) <= args.exhaustiveMaxTitles
 
-    logger.info("Writing output files")
+        with ratiosWriter:
+            denseRatios = compareRecipeTitles(
+                logger,
+                recipes,
+                reportWriter,
+                args.threshold,
+                ratiosWriter,
+                args.ratioFloor,
+                isExhaustive,
+                args.ngramSize,
+                args.minNgramSimilarity,
+                workers,
+                args.denseRatios,
+                clusters
+            )
 
-    report = {
-        "potentialDuplicates": potentialDuplicates
-    }
+        if args.content:
+            contentWriter = NdjsonReportWriter("content-report.ndjson", args.dryRun)
+            compareRecipeContents(logger, recipes, contentWriter, args.contentThreshold, clusters)
+
+        recipesBySlug = {r.slug: r for r in recipes}
+        index = TitleIndex.build(logger, slugs, args.ngramSize)
+
+    index.metadata = {**reportOptions, "reportRevision": index.revision}
+
+    if args.measureRecall:
+        measureRecall(
+            logger,
+            slugs,
+            args.threshold,
+            args.ngramSize,
+            args.minNgramSimilarity,
+            workers
+        )
+
+    duplicateClusters = clusters.getClusters()
+
+    for slug in (s for cluster in duplicateClusters for s in cluster if s not in recipesBySlug):
+        recipesBySlug[slug] = mealieApi.getRecipe(slug)
+
+    ruleSet = TagRuleEngine.loadRuleSet(args.rulesPath)
+    engine = TagRuleEngine(logger, ruleSet, mealieApi.getAllTags(), mealieApi.getAllCategories())
+    canonicalRecipes = selectCanonicalRecipes(logger, duplicateClusters, recipesBySlug, engine)
+
+    if args.linkDuplicates:
+        recipeUrl = f"{args.url}/g/{args.groupSlug}/r"
+        patches = planDuplicateLinks(canonicalRecipes, recipesBySlug, recipeUrl)
+        linkDuplicates(logger, mealieApi, patches, args.dryRun)
+
+    logger.info("Writing output files")
 
     if args.dryRun:
-        logger.warning("[DRY RUN] Would've written report and ratios files")
+        logger.warning("[DRY RUN] Would've written clusters file")
     else:
-        with open("title-report.json", mode="w", encoding="utf-8") as jsonFile:
-            jsonFile.write(json.dumps(report, indent=2))
+        with open("title-clusters.json", mode="w", encoding="utf-8") as jsonFile:
+            jsonFile.write(json.dumps({"clusters": canonicalRecipes}, indent=2, ensure_ascii=False))
+
+    reportWriter.finaliseAsList(
+        "title-report.json",
+        listKey="potentialDuplicates",
+        transform=lambda r: [r["recipe"], r["duplicate"]]
+    )
+
+    if args.content:
+        contentWriter.finaliseAsList(
+            "content-report.json",
+            listKey="potentialDuplicates",
+            transform=lambda r: [r["recipe"], r["duplicate"]]
+        )
+
+    if args.denseRatios:
+        writeDenseRatios(logger, denseRatios, args.dryRun)
 
-        with open("title-ratios.tsv", mode="w", encoding="utf-8", newline="") as tsvFile:
-            dw = csv.DictWriter(tsvFile, sorted(ratios[0].keys()), delimiter='\t')
-            dw.writeheader()
-            dw.writerows(ratios)
+    index.save(args.indexPath, args.dryRun)
 
     logger.info("Processing completed!")
 
@@ -1,631 +1,544 @@
+import hashlib
+import inspect
 import json
 import logging
+import os
 
 from ArgsUtils import ArgsUtils
-from datetime import timedelta
-from enum import StrEnum
+from concurrent.futures import ProcessPoolExecutor
 from LogUtils import LogUtils
 from MealieApi import MealieApi
 from models.CategorySummary import CategorySummary
 from models.Recipe import Recipe, RecipeTag
-
-
-class FlagTagSlugs(StrEnum):
-    MissingBbqTag = "missing-bbq-tag"
-    MissingSpiceRatios = "missing-spice-ratios"
-    MissingServingSize = "missing-serving-size"
-    MissingFreezableTag = "missing-freezable-tag"
-    MissingParseIngredients = "missing-parsed-ingredients"
-    MissingSauceTag = "missing-sauce-tag"
-    MissingSaladTag = "missing-salad-tag"
-    MissingProteinTags = "missing-protein-tags"
-    MissingInstructions = "missing-instructions"
-    MissingInstructionImages = "missing-instruction-images"
-    MissingNutritionFacts = "missing-nutrition-facts"
-    MissingTools = "missing-tools"
-    MissingMealTypeCategory = "missing-meal-type-category"
-    MissingCountryTag = "missing-country-tag"
-    MissingIngredients = "missing-ingredients"
-    MissingDescription = "missing-description"
-    MissingCookTime = "missing-cook-time"
-    MissingPrepTime = "missing-prep-time"
-    MissingTotalTime = "missing-total-time"
-    MissingImage = "missing-image"
-    MissingRating = "missing-rating"
-    Duplicate = "duplicate"
-
-
-class TagValidationResultCode(StrEnum):
-    OK = "OK"
-    Unknown = "UNKNOWN"
-    Conflict = "CONFLICT"
-    Missing = "MISSING"
-
-
-class TagValidationResult():
-    tagName: str
-    code: TagValidationResultCode
-    reason: str
-
-    def __init__(self, tagName: str, code: TagValidationResultCode, reason: str = None) -> None:
-        self.tagName = tagName
-        self.code = code
-        self.reason = reason
+from RecipeWatcher import RecipePoller, WebhookListener
+from ReportWriter import NdjsonReportWriter
+from requests import RequestException
+from TagRuleEngine import TagRuleEngine, TagValidationResult, TagValidationResultCode
+from typing import Iterable, Iterator
 
 
 def parseArgs():
     parser = ArgsUtils.initialiseParser(scriptUsesMealieApi=True)
-    return parser.parse_args()
 
+    parser.add_argument(
+        "-r",
+        "--rulesPath",
+        help="Path to the JSON (or YAML) tag rules file",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag-rules.json")
+    )
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of processes used to validate recipes. Set to 0 to use all CPU cores.",
+        type=int,
+        default=1
+    )
+
+    parser.add_argument(
+        "-b",
+        "--backend",
+        help="Rule evaluation backend: 'rules' validates recipes one at a time, 'matrix' validates"
+        " all recipes at once using boolean tag/category matrices (requires numpy)",
+        choices=["rules", "matrix"],
+        default="rules"
+    )
+
+    parser.add_argument(
+        "--cachePath",
+        help="Path to the validation results cache. Only recipes changed since the last run"
+        " (or all recipes if the rules or organizers changed) are validated again.",
+        default="tags-cache.json"
+    )
+
+    parser.add_argument(
+        "--noCache",
+        help="Validate all recipes, ignoring cached results",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--fix",
+        help="Fix CONFLICT and MISSING issues by removing or adding the corresponding flag tags",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--watch",
+        help="Keep running after the initial validation and re-validate recipes as they change",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--pollInterval",
+        help="Number of seconds between checks for updated recipes in watch mode",
+        type=float,
+        default=10
+    )
+
+    parser.add_argument(
+        "--webhookPort",
+        help="In watch mode, listen for Mealie event notifications on this port instead of polling",
+        type=int,
+        default=None
+    )
+
+    parser.add_argument(
+        "--webhookHost",
+        help="Address the webhook listener binds to",
+        default="127.0.0.1"
+    )
 
-# Returns tag if slug exists, otherwise returns None
-def getTagFromSlug(slug: str | FlagTagSlugs, tags: list[RecipeTag]) -> RecipeTag:
-    return next(filter(lambda t: t.slug == slug, tags), None)
+    return parser.parse_args()
 
 
-# validatedTag and realTag are mutually exclusive: if one exists, the other shouldn't
-def checkMutuallyExclusiveTags(recipe: Recipe,
-                               validatedTag: RecipeTag,
-                               realTags: list[RecipeTag],
-                               isMandatory: bool = False) -> TagValidationResult:
-    foundTags: list[RecipeTag] = []
+def analyseRecipeTags(logger: logging.Logger,
+                      recipe: Recipe,
+                      engine: TagRuleEngine) -> list[TagValidationResult]:
+    logger.info("Analysing tags")
 
-    for tag in realTags:
-        if tag in recipe.tags:
-            foundTags.append(tag)
+    return engine.validate(recipe)
 
-    if (validatedTag in recipe.tags and
-        len(foundTags) > 0):
-        tagsText = ", ".join(t.name for t in foundTags)
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but also found tag(s): '{tagsText}'"
-        )
 
-    if (validatedTag not in recipe.tags and
-        len(foundTags) == 0):
-        if isMandatory:
-            return TagValidationResult(
-                tagName=validatedTag.name,
-                code=TagValidationResultCode.Missing,
-                reason="Couldn't find corresponding tag(s) on recipe"
-            )
-        else:
-            return TagValidationResult(
-                tagName=validatedTag.name,
-                code=TagValidationResultCode.Unknown,
-                reason=f"Tag '{validatedTag.name}' might need to be present"
-            )
+# Rules compiled once per worker process by initialiseWorker()
+workerEngine: TagRuleEngine = None
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
 
+def initialiseWorker(verbosity: str,
+                     ruleSet: dict,
+                     allTags: list[RecipeTag],
+                     allCategories: list[CategorySummary]):
+    global workerEngine
 
-# Checks if a recipe field is defined
-def checkField(recipe: Recipe,
-               validatedTag: RecipeTag,
-               fieldName: str):
-    if (validatedTag in recipe.tags and
-        recipe.__getattribute__(fieldName)):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe has field '{fieldName}' set"
-            f" to: {recipe.__getattribute__(fieldName)}"
-        )
+    logger = logging.getLogger()
+    logger.setLevel(getattr(logging, verbosity))
 
-    if (validatedTag not in recipe.tags and
-        not recipe.__getattribute__(fieldName)):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Missing,
-            reason=f"Tag '{validatedTag.name}' should be present"
-        )
+    workerEngine = TagRuleEngine(logger, ruleSet, allTags, allCategories)
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
 
+# Yields each recipe's issues as soon as it's validated, in the recipes' order
+def validateRecipes(logger: logging.Logger,
+                    recipes: Iterable[Recipe],
+                    engine: TagRuleEngine) -> Iterator[tuple[str, list[TagValidationResult]]]:
+    for recipe in recipes:
+        logger.info(f"Processing recipe {recipe.slug}")
 
-def validateBbqTag(recipe: Recipe, tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingBbqTag, tags)
-    realTag = getTagFromSlug("bbq", tags)
+        results = analyseRecipeTags(logger, recipe, engine)
+        issues = list(filter(lambda r: r.code != TagValidationResultCode.OK, results))
 
-    return checkMutuallyExclusiveTags(recipe, validatedTag, [realTag])
+        yield recipe.slug, issues
 
 
-def validateSpiceRatiosTag(logger: logging.Logger,
-                           recipe: Recipe,
-                           tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingSpiceRatios, tags)
+# Runs in a worker process; rule statistics are reset per chunk so the parent can sum them up
+def validateRecipeChunk(recipes: list[Recipe]):
+    workerEngine.resetStats()
 
-    hasSpiceSection = False
+    validated = list(validateRecipes(logging.getLogger(), recipes, workerEngine))
+    stats = [(rule.elapsed, rule.hits) for rule in workerEngine.rules]
 
-    for ingredient in recipe.ingredients:
-        if ingredient.title and ingredient.title == "Spice Mix":
-            logger.debug(f"Detected ingredient title: {ingredient.title}")
-            hasSpiceSection = True
+    return validated, stats
 
-    if (validatedTag in recipe.tags and
-        hasSpiceSection):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe has Spice Ratios"
-        )
 
-    if (validatedTag not in recipe.tags and
-        not hasSpiceSection):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Unknown,
-            reason=f"Tag '{validatedTag.name}' might need to be present"
-        )
+def validateRecipesInParallel(logger: logging.Logger,
+                              verbosity: str,
+                              recipes: list[Recipe],
+                              workers: int,
+                              engine: TagRuleEngine,
+                              ruleSet: dict,
+                              allTags: list[RecipeTag],
+                              allCategories: list[CategorySummary]) -> Iterator[tuple[str, list[TagValidationResult]]]:
+    # A few chunks per worker keeps them busy without paying the pickling cost per recipe
+    chunkSize = max(1, len(recipes) // (workers * 4))
+    chunks = [recipes[i:i + chunkSize] for i in range(0, len(recipes), chunkSize)]
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
+    logger.info(f"Validating {len(recipes)} recipes with {workers} workers in {len(chunks)} chunks")
 
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=initialiseWorker,
+            initargs=(verbosity, ruleSet, allTags, allCategories)) as executor:
+        # map() yields results in submission order, so the report keeps the recipes' order
+        for chunkResults, stats in executor.map(validateRecipeChunk, chunks):
+            for rule, (elapsed, hits) in zip(engine.rules, stats, strict=True):
+                rule.elapsed += elapsed
+                rule.hits.update(hits)
 
-def validateServingSizeTag(recipe: Recipe,
-                           tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingServingSize, tags)
-    return checkField(recipe, validatedTag, "recipeYield")
+            yield from chunkResults
 
 
-def validateFreezableTag(recipe: Recipe, tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingFreezableTag, tags)
-    realTag = getTagFromSlug("freezable", tags)
+def validateRecipesAsMatrix(logger: logging.Logger,
+                            recipes: list[Recipe],
+                            engine: TagRuleEngine) -> list[tuple[str, list[TagValidationResult]]]:
+    from TagRuleMatrix import TagRuleMatrix # Only requires numpy when the matrix backend is used
 
-    return checkMutuallyExclusiveTags(recipe, validatedTag, [realTag])
+    logger.info(f"Validating {len(recipes)} recipes with the matrix backend")
 
+    issues = TagRuleMatrix(logger, engine).validate(recipes)
 
-def validateParseIngredientsTag(logger: logging.Logger,
-                                recipe: Recipe,
-                                tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingParseIngredients, tags)
+    return [(recipe.slug, recipeIssues) for recipe, recipeIssues in zip(recipes, issues, strict=True)]
 
-    if (validatedTag in recipe.tags and
-        not recipe.settings.disableAmount):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe's 'Disable Ingredient Amounts'"
-            "setting is false"
-        )
 
-    hasAllFoods = True
+# Any change to the rule set, the rule engine or Mealie's tags and categories invalidates cached results
+def computeRuleSetHash(ruleSet: dict,
+                       allTags: list[RecipeTag],
+                       allCategories: list[CategorySummary]) -> str:
+    digest = hashlib.sha256()
 
-    for ingredient in recipe.ingredients:
-        if not ingredient.food:
-            logger.debug(f"Detected ingredient without Food: {ingredient.title}")
-            hasAllFoods = False
-            break
+    with open(inspect.getfile(TagRuleEngine), "rb") as sourceFile:
+        digest.update(sourceFile.read())
 
-    if (validatedTag in recipe.tags and
-        hasAllFoods):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe has parsed ingredients"
-        )
+    organizers = {
+        "ruleSet": ruleSet,
+        "tags": sorted((t.to_json() for t in allTags), key=lambda t: t["slug"]),
+        "categories": sorted((c.to_json() for c in allCategories), key=lambda c: c["slug"]),
+    }
+    digest.update(json.dumps(organizers, default=str, sort_keys=True).encode("utf-8"))
 
-    if (validatedTag not in recipe.tags and
-        not hasAllFoods):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Unknown,
-            reason=f"Tag '{validatedTag.name}' might need to be present"
-        )
+    return digest.hexdigest()
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
 
+def loadResultCache(logger: logging.Logger, cachePath: str) -> dict:
+    logger.debug(f"Loading validation results cache '{cachePath}'")
 
-def validateSauceTag(recipe: Recipe,
-                     tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingSauceTag, tags)
-    realTag = getTagFromSlug("sauce", tags)
+    if not os.path.exists(cachePath):
+        logger.info("No validation results cache found; validating all recipes")
+        return {
+            "ruleSetHash": None,
+            "recipes": {}
+        }
 
-    return checkMutuallyExclusiveTags(recipe, validatedTag, [realTag])
+    with open(cachePath, encoding="utf-8") as jsonFile:
+        return json.load(jsonFile)
 
 
-def validateSaladTag(recipe: Recipe,
-                     tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingSaladTag, tags)
-    realTag = getTagFromSlug("salad", tags)
+def saveResultCache(logger: logging.Logger, cachePath: str, cache: dict, isDryRun: bool):
+    if isDryRun:
+        logger.warning(f"[DRY RUN] Would've written validation results cache '{cachePath}'")
+        return
 
-    return checkMutuallyExclusiveTags(recipe, validatedTag, [realTag])
+    logger.debug(f"Saving validation results cache '{cachePath}'")
 
+    with open(cachePath, mode="w", encoding="utf-8") as jsonFile:
+        jsonFile.write(json.dumps(cache, ensure_ascii=False))
 
-def validateProteinTags(recipe: Recipe,
-                        tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingProteinTags, tags)
 
-    # Add more protein types as necessary
-    proteinTagSlugs = [
-        "beef",
-        "chicken",
-        "cod",
-        "haddock",
-        "halloumi",
-        "lobster",
-        "pork",
-        "salmon",
-        "sausage",
-        "shrimp",
-        "tilapia",
-        "tofu",
-        "turkey",
-        "veal",
-        "vegetarian"
-    ]
+# Cached results are only reused if they were computed with the same rules, engine and organizers
+def getReusableCachedRecipes(logger: logging.Logger, cache: dict, ruleSetHash: str, isCacheDisabled: bool) -> dict:
+    if isCacheDisabled:
+        logger.info("Cache disabled; validating all recipes")
+        return {}
 
-    proteinTags = []
+    if cache["ruleSetHash"] != ruleSetHash:
+        logger.info("Rules or organizers changed since last run; validating all recipes")
+        return {}
 
-    for tag in tags:
-        if tag.slug in proteinTagSlugs:
-            proteinTags.append(tag)
+    return cache["recipes"]
 
-    return checkMutuallyExclusiveTags(recipe, validatedTag, proteinTags, isMandatory=True)
 
+def isCachedResultValid(cachedRecipe: dict, summary: dict) -> bool:
+    return (cachedRecipe is not None and
+            summary.get("updateAt") is not None and
+            cachedRecipe["updateAt"] == summary["updateAt"])
 
-def validateInstructionsTag(logger: logging.Logger,
-                            recipe: Recipe,
-                            tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingInstructions, tags)
 
-    hasSteps = len(recipe.instructions) > 0
-    allStepsOk = True
+# Compares issues per recipe ID and tag name between the previous and the current run
+def buildDeltaReport(previousRecipes: dict, currentRecipes: dict) -> dict:
+    delta = {
+        "new": {},
+        "resolved": {},
+        "changed": {}
+    }
 
-    for step in recipe.instructions:
-        if not step.title and not step.text:
-            logger.debug(f"Detected instruction step without title/text: {step}")
-            allStepsOk = False
-            break
+    for recipeId in sorted(previousRecipes.keys() | currentRecipes.keys(),
+                           key=lambda i: (currentRecipes.get(i) or previousRecipes.get(i))["slug"]):
+        previous = previousRecipes.get(recipeId)
+        current = currentRecipes.get(recipeId)
+        slug = (current or previous)["slug"]
 
-    if (validatedTag in recipe.tags and
-        hasSteps and
-        allStepsOk):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe has valid instructions"
-        )
+        previousIssues = {i["tagName"]: i for i in previous["issues"]} if previous else {}
+        currentIssues = {i["tagName"]: i for i in current["issues"]} if current else {}
 
-    if (validatedTag not in recipe.tags and
-        not hasSteps):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Missing,
-            reason=f"Tag '{validatedTag.name}' should be present; recipe has no instructions"
-        )
+        newIssues = [i for t, i in currentIssues.items() if t not in previousIssues]
+        resolvedIssues = [i for t, i in previousIssues.items() if t not in currentIssues]
+        changedIssues = [
+            {"before": previousIssues[t], "after": i}
+            for t, i in currentIssues.items()
+            if t in previousIssues and previousIssues[t] != i
+        ]
 
-    if (validatedTag not in recipe.tags and
-        not allStepsOk):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Missing,
-            reason=f"Tag '{validatedTag.name}' should be present; recipe has invalid instructions"
-        )
+        if newIssues:
+            delta["new"][slug] = newIssues
+        if resolvedIssues:
+            delta["resolved"][slug] = resolvedIssues
+        if changedIssues:
+            delta["changed"][slug] = changedIssues
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
+    return delta
 
 
-def validateInstructionImagesTag(logger: logging.Logger,
-                                 recipe: Recipe,
-                                 tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingInstructionImages, tags)
+# CONFLICT means the flag tag is present but shouldn't be, MISSING means the opposite
+def planTagFixes(logger: logging.Logger,
+                 recipeIssues: Iterable[dict],
+                 engine: TagRuleEngine) -> dict[str, dict]:
+    logger.info("Planning tag fixes")
 
-    hasAllStepImages = True
+    tagsByName = {r.tag.name: r.tag for r in engine.rules if r.isFixable}
+    fixes = {}
 
-    for step in recipe.instructions:
-        if not step.text or "<img" not in step.text:
-            logger.debug(f"Detected instruction step without image: {step}")
-            hasAllStepImages = False
-            break
+    for entry in recipeIssues:
+        slug = entry["slug"]
+        tagsToAdd = []
+        tagsToRemove = []
 
-    if (validatedTag in recipe.tags and
-        hasAllStepImages):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe has instruction images"
-        )
+        for issue in entry["issues"]:
+            tag = tagsByName.get(issue["tagName"])
 
-    if (validatedTag not in recipe.tags and
-        not hasAllStepImages):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Unknown,
-            reason=f"Tag '{validatedTag.name}' might need to be present"
-        )
+            if not tag:
+                continue
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
+            if issue["code"] == TagValidationResultCode.Conflict:
+                tagsToRemove.append(tag)
+            elif issue["code"] == TagValidationResultCode.Missing:
+                tagsToAdd.append(tag)
 
+        if tagsToAdd or tagsToRemove:
+            fixes[slug] = {
+                "add": tagsToAdd,
+                "remove": tagsToRemove
+            }
 
-def validateNutritionFactsTag(recipe: Recipe,
-                              tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingNutritionFacts, tags)
+    return fixes
 
-    hasAllFields = True
 
-    for key in recipe.nutrition.__dict__:
-        if not recipe.nutrition.__getattribute__(key):
-            hasAllFields = False
-            break
+# Groups recipes needing the exact same tag changes together
+def groupTagFixes(fixes: dict[str, dict]) -> list[dict]:
+    groups = {}
 
-    if (validatedTag in recipe.tags and
-        hasAllFields):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe has Nutrition Facts"
+    for slug, fix in fixes.items():
+        key = (
+            tuple(sorted(t.slug for t in fix["add"])),
+            tuple(sorted(t.slug for t in fix["remove"]))
         )
 
-    if (validatedTag not in recipe.tags and
-        not hasAllFields):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Missing,
-            reason=f"Tag '{validatedTag.name}' should be present"
-        )
+        if key not in groups:
+            groups[key] = {
+                "add": fix["add"],
+                "remove": fix["remove"],
+                "recipes": []
+            }
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
+        groups[key]["recipes"].append(slug)
 
+    return list(groups.values())
 
-def validateToolsTag(recipe: Recipe,
-                     tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingTools, tags)
 
-    hasTools = len(recipe.tools) > 0
+# Tags are added to whole groups with a single bulk call. Removing tags requires updating each
+# recipe's tag list, so those recipes are patched together with a single bulk PATCH per group.
+def applyTagFixes(logger: logging.Logger,
+                  mealieApi: MealieApi,
+                  fixes: dict[str, dict],
+                  recipesBySlug: dict[str, Recipe],
+                  isDryRun: bool):
+    groups = groupTagFixes(fixes)
+    apiCallCount = 0
 
-    if (validatedTag in recipe.tags and
-        hasTools):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe has tools"
-        )
+    logger.info(f"Fixing {len(fixes)} recipe(s) in {len(groups)} group(s)")
 
-    if (validatedTag not in recipe.tags and
-        not hasTools):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Missing,
-            reason=f"Tag '{validatedTag.name}' should be present; recipe has no tools"
-        )
+    for group in groups:
+        addSlugs = [t.slug for t in group["add"]]
+        removeSlugs = [t.slug for t in group["remove"]]
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
+        logger.info(f"Fixing {len(group['recipes'])} recipe(s); adding tags {addSlugs},"
+                    f" removing tags {removeSlugs}")
+        logger.debug(f"Recipes: {group['recipes']}")
 
+        if not removeSlugs:
+            if isDryRun:
+                logger.warning("[DRY RUN] Would've bulk tagged recipes")
+                continue
 
-def validateMealTypeCategoryTag(recipe: Recipe,
-                                tags: list[RecipeTag],
-                                categories: list[CategorySummary]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingMealTypeCategory, tags)
+            mealieApi.bulkTagRecipes(group["recipes"], group["add"])
+            apiCallCount += 1
+            continue
 
-    # Add more meal types as necessary
-    mealTypeCategorySlugs = [
-        "breakfast",
-        "dessert",
-        "dinner",
-        "sauce",
-        "vinaigrette"
-    ]
+        patches = []
 
-    foundCategories: list[CategorySummary] = []
+        for slug in group["recipes"]:
+            # The whole tag list is replaced, so it must be built from the recipe's current tags
+            recipe = recipesBySlug.get(slug) or mealieApi.getRecipe(slug, useCache=False)
 
-    for category in categories:
-        if category.slug in mealTypeCategorySlugs and category in recipe.categories:
-            foundCategories.append(category)
+            if not recipe:
+                logger.warning(f"Recipe '{slug}' not found; skipping its tag fixes")
+                continue
 
-    if (validatedTag in recipe.tags and
-        len(foundCategories) > 0):
-        text = ", ".join(t.name for t in foundCategories)
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but also found category(ies): '{text}'"
-        )
+            recipeTagSlugs = [t.slug for t in recipe.tags]
 
-    if (validatedTag not in recipe.tags and
-        len(foundCategories) == 0):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Missing,
-            reason=f"Tag '{validatedTag.name}' needs to be present"
-        )
+            newTags = [t for t in recipe.tags if t.slug not in removeSlugs]
+            newTags += [t for t in group["add"] if t.slug not in recipeTagSlugs]
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
+            patches.append({
+                "id": str(recipe.id),
+                "slug": slug,
+                "tags": [t.to_json() for t in newTags]
+            })
 
+        if not patches:
+            continue
 
-def validateCountryTag(recipe: Recipe,
-                       tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingCountryTag, tags)
+        if isDryRun:
+            logger.warning(f"[DRY RUN] Would've updated tags of recipes {[p['slug'] for p in patches]}")
+            continue
 
-    # Add more countries as necessary
-    countryTagSlugs = [
-        "canada",
-        "belgium"
-    ]
+        mealieApi.patchRecipes(patches)
+        apiCallCount += 1
 
-    countryTags = []
+    logger.info(f"Tag fixes applied with {apiCallCount} API call(s)")
 
-    for tag in tags:
-        if tag.slug in countryTagSlugs:
-            countryTags.append(tag)
 
-    return checkMutuallyExclusiveTags(recipe, validatedTag, countryTags, isMandatory=True)
+def writeTagsReportEntry(reportWriter: NdjsonReportWriter, entry: dict):
+    if len(entry["issues"]) > 0:
+        reportWriter.write({
+            "slug": entry["slug"],
+            "issues": entry["issues"]
+        })
 
 
-def validateIngredientsTag(recipe: Recipe,
-                           tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingIngredients, tags)
-    hasIngredients = len(recipe.ingredients) > 0
-    allIngredientsOk = True
+def writeTagsReport(logger: logging.Logger, currentRecipes: dict, isDryRun: bool):
+    logger.info("Writing output files")
 
-    for ingredient in recipe.ingredients:
-        if recipe.settings.disableAmount:
-            if not ingredient.note:
-                allIngredientsOk = False
-                break
-        else:
-            if not ingredient.food or ingredient.quantity <= 0:
-                allIngredientsOk = False
-                break
+    with NdjsonReportWriter("tags-report.ndjson", isDryRun) as reportWriter:
+        for entry in sorted(currentRecipes.values(), key=lambda r: r["slug"]):
+            writeTagsReportEntry(reportWriter, entry)
 
-    if (validatedTag in recipe.tags and
-        hasIngredients and
-        allIngredientsOk):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Conflict,
-            reason=f"Tag '{validatedTag.name}' is present but recipe has valid ingredient(s)"
-        )
+    reportWriter.finaliseAsObject("tags-report.json", keyField="slug")
 
-    if (validatedTag not in recipe.tags and
-        not hasIngredients):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Missing,
-            reason=f"Tag '{validatedTag.name}' should be present; recipe has no ingredient"
-        )
 
-    if (validatedTag not in recipe.tags and
-        not allIngredientsOk):
-        return TagValidationResult(
-            tagName=validatedTag.name,
-            code=TagValidationResultCode.Missing,
-            reason=f"Tag '{validatedTag.name}' should be present; recipe has invalid ingredient(s)"
-        )
+# Re-validates changed recipes and updates currentRecipes in place. Returns the entries of the
+# touched recipes before and after the update, keyed by recipe ID, and the fetched recipes.
+def refreshRecipes(logger: logging.Logger,
+                   mealieApi: MealieApi,
+                   engine: TagRuleEngine,
+                   changes: list[dict],
+                   currentRecipes: dict) -> tuple[dict, dict, list[Recipe]]:
+    idsBySlug = {entry["slug"]: recipeId for recipeId, entry in currentRecipes.items()}
+    previousEntries = {}
+    updatedEntries = {}
+    deletedIds = []
+    recipes = []
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
+    for change in changes:
+        recipeId = change.get("id")
 
+        if recipeId and isCachedResultValid(currentRecipes.get(recipeId), change):
+            continue
 
-def validateDescriptionTag(recipe: Recipe,
-                           tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingDescription, tags)
-    return checkField(recipe, validatedTag, "description")
-
+        # Webhook events only have the slug, and a recipe that no longer exists has been deleted
+        recipe = None if change.get("isDeleted") else mealieApi.getRecipe(change["slug"], useCache=False)
 
-def validateCookTimeTag(recipe: Recipe,
-                        tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingCookTime, tags)
-    return checkField(recipe, validatedTag, "performTime")
+        if not recipe:
+            recipeId = recipeId or idsBySlug.get(change["slug"])
 
+            if recipeId in currentRecipes:
+                logger.info(f"Recipe '{change['slug']}' was deleted")
+                previousEntries[recipeId] = currentRecipes[recipeId]
+                deletedIds.append(recipeId)
 
-def validatePrepTimeTag(recipe: Recipe,
-                        tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingPrepTime, tags)
-    return checkField(recipe, validatedTag, "prepTime")
+            continue
 
+        logger.info(f"Recipe '{recipe.slug}' changed; validating")
 
-def validateTotalTimeTag(recipe: Recipe,
-                         tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingTotalTime, tags)
-    return checkField(recipe, validatedTag, "totalTime")
+        _, issues = next(validateRecipes(logger, [recipe], engine))
 
+        if recipe.id in currentRecipes:
+            previousEntries[recipe.id] = currentRecipes[recipe.id]
 
-def validateImageTag(recipe: Recipe,
-                     tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingImage, tags)
-    return checkField(recipe, validatedTag, "image")
+        updatedEntries[recipe.id] = {
+            "slug": recipe.slug,
+            "updateAt": recipe.updateAt,
+            "issues": [i.to_json() for i in issues]
+        }
+        recipes.append(recipe)
 
+    # Only applied once every change has been fetched, so a failed request leaves the recipes untouched
+    for recipeId in deletedIds:
+        del currentRecipes[recipeId]
 
-# Duplicate recipes should have link(s) to its other equivalent recipe(s) in the Extras section
-def validateDuplicateTag(recipe: Recipe,
-                         tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.Duplicate, tags)
+    currentRecipes.update(updatedEntries)
 
-    if validatedTag in recipe.tags:
-        extras = {k: v for k, v in recipe.extras.items() if k.startswith('duplicate')}
+    return previousEntries, updatedEntries, recipes
 
-        allUrls = True
-        for key in extras:
-            if not extras[key]:
-                allUrls = False
-                break
 
-        if len(extras) == 0:
-            return TagValidationResult(
-                tagName=validatedTag.name,
-                code=TagValidationResultCode.Missing,
-                reason="Missing 'duplicate' entry in API Extras"
-            )
-        elif not allUrls:
-            return TagValidationResult(
-                tagName=validatedTag.name,
-                code=TagValidationResultCode.Missing,
-                reason="Not all API Extras have URLs"
+def watchRecipes(logger: logging.Logger,
+                 args,
+                 mealieApi: MealieApi,
+                 engine: TagRuleEngine,
+                 ruleSetHash: str,
+                 currentRecipes: dict):
+    if args.webhookPort is not None:
+        watcher = WebhookListener(logger, args.webhookHost, args.webhookPort)
+    else:
+        cursor = max((r["updateAt"] for r in currentRecipes.values() if r["updateAt"]), default=None)
+        watcher = RecipePoller(logger, mealieApi, args.pollInterval, cursor)
+
+        logger.info(f"Polling for updated recipes every {args.pollInterval} seconds")
+
+    logger.info("Watching recipes for changes; press Ctrl+C to stop")
+
+    try:
+        while True:
+            try:
+                changes = watcher.waitForChanges()
+                previousEntries, updatedEntries, recipes = refreshRecipes(
+                    logger,
+                    mealieApi,
+                    engine,
+                    changes,
+                    currentRecipes
+                )
+                watcher.commit()
+            except RequestException as e:
+                logger.error(f"Couldn't get recipe changes from Mealie; retrying later: {e}")
+                continue
+
+            if not previousEntries and not updatedEntries:
+                continue
+
+            delta = buildDeltaReport(previousEntries, updatedEntries)
+
+            for kind in ["new", "resolved", "changed"]:
+                for slug, issues in delta[kind].items():
+                    logger.info(f"Recipe '{slug}' has {len(issues)} {kind} issue(s)")
+
+            writeTagsReport(logger, currentRecipes, args.dryRun)
+            saveResultCache(
+                logger,
+                args.cachePath,
+                {
+                    "ruleSetHash": ruleSetHash,
+                    "recipes": currentRecipes
+                },
+                args.dryRun
             )
 
-    return TagValidationResult(validatedTag.name, TagValidationResultCode.OK)
+            if args.fix:
+                fixes = planTagFixes(logger, (e for e in updatedEntries.values() if e["issues"]), engine)
+                applyTagFixes(logger, mealieApi, fixes, {r.slug: r for r in recipes}, args.dryRun)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching recipes")
+    finally:
+        watcher.close()
 
 
-def validateRatingTag(recipe: Recipe,
-                     tags: list[RecipeTag]) -> TagValidationResult:
-    validatedTag = getTagFromSlug(FlagTagSlugs.MissingRating, tags)
-    return checkField(recipe, validatedTag, "rating")
+def logRuleStats(logger: logging.Logger, engine: TagRuleEngine):
+    logger.info("----- Rule statistics -----")
 
+    for rule in sorted(engine.rules, key=lambda r: r.elapsed, reverse=True):
+        hitsText = ", ".join(f"{code}: {count}" for code, count in sorted(rule.hits.items()))
+        logger.info(f"  {rule.tagName}: {rule.elapsed * 1000:.2f} ms ({hitsText})")
 
-def analyseRecipeTags(logger: logging.Logger,
-                      recipe: Recipe,
-                      tagsToValidate: list[RecipeTag],
-                      allTags: list[RecipeTag],
-                      allCategories: list[CategorySummary]) -> list[TagValidationResult]:
-    logger.info("Analysing tags")
-
-    results: list[TagValidationResult] = []
-
-    for tag in tagsToValidate:
-        logger.debug(f"Validating tag '{tag.name}'")
-
-        result = None
-        match tag.slug:
-            case FlagTagSlugs.MissingBbqTag:
-                result = validateBbqTag(recipe, allTags)
-            case FlagTagSlugs.MissingSpiceRatios:
-                result = validateSpiceRatiosTag(logger, recipe, allTags)
-            case FlagTagSlugs.MissingServingSize:
-                result = validateServingSizeTag(recipe, allTags)
-            case FlagTagSlugs.MissingFreezableTag:
-                result = validateFreezableTag(recipe, allTags)
-            case FlagTagSlugs.MissingParseIngredients:
-                result = validateParseIngredientsTag(logger, recipe, allTags)
-            case FlagTagSlugs.MissingSauceTag:
-                result = validateSauceTag(recipe, allTags)
-            case FlagTagSlugs.MissingSaladTag:
-                result = validateSaladTag(recipe, allTags)
-            case FlagTagSlugs.MissingProteinTags:
-                result = validateProteinTags(recipe, allTags)
-            case FlagTagSlugs.MissingInstructions:
-                result = validateInstructionsTag(logger, recipe, allTags)
-            case FlagTagSlugs.MissingInstructionImages:
-                result = validateInstructionImagesTag(logger, recipe, allTags)
-            case FlagTagSlugs.MissingNutritionFacts:
-                result = validateNutritionFactsTag(recipe, allTags)
-            case FlagTagSlugs.MissingTools:
-                result = validateToolsTag(recipe, allTags)
-            case FlagTagSlugs.MissingMealTypeCategory:
-                result = validateMealTypeCategoryTag(recipe, allTags, allCategories)
-            case FlagTagSlugs.MissingCountryTag:
-                result = validateCountryTag(recipe, allTags)
-            case FlagTagSlugs.MissingIngredients:
-                result = validateIngredientsTag(recipe, allTags)
-            case FlagTagSlugs.MissingDescription:
-                result = validateDescriptionTag(recipe, allTags)
-            case FlagTagSlugs.MissingCookTime:
-                result = validateCookTimeTag(recipe, allTags)
-            case FlagTagSlugs.MissingPrepTime:
-                result = validatePrepTimeTag(recipe, allTags)
-            case FlagTagSlugs.MissingTotalTime:
-                result = validateTotalTimeTag(recipe, allTags)
-            case FlagTagSlugs.MissingImage:
-                result = validateImageTag(recipe, allTags)
-            case FlagTagSlugs.Duplicate:
-                result = validateDuplicateTag(recipe, allTags)
-            case FlagTagSlugs.MissingRating:
-                result = validateRatingTag(recipe, allTags)
-
-        if result:
-            results.append(result)
-
-    return results
+    totalElapsed = sum(r.elapsed for r in engine.rules)
+    logger.info(f"  Total: {totalElapsed * 1000:.2f} ms")
+    logger.info("---------------------------")
 
 
 def execute():
@@ -640,44 +553,110 @@ def execute():
 
     mealieApi = MealieApi(args.url, args.token, args.caPath, args.cacheDuration)
 
-    recipes = mealieApi.getAllRecipes()
-    recipes.sort(key=lambda r: r.slug)
+    summaries = mealieApi.getAllRecipeSummaries()
+    summaries.sort(key=lambda r: r["slug"])
 
     allTags = mealieApi.getAllTags()
     allCategories = mealieApi.getAllCategories()
 
-    tagsToValidate = []
+    ruleSet = TagRuleEngine.loadRuleSet(args.rulesPath)
+    engine = TagRuleEngine(logger, ruleSet, allTags, allCategories)
 
-    for slug in FlagTagSlugs:
-        tag = getTagFromSlug(slug.value, allTags)
-        if not tag:
-            logger.warning(f"Mealie doesn't have tag slug '{slug}'. Skipping validation.")
-            continue
-        tagsToValidate.append(tag)
+    ruleSetHash = computeRuleSetHash(ruleSet, allTags, allCategories)
+    cache = loadResultCache(logger, args.cachePath)
+    previousRecipes = cache["recipes"]
 
-    report = {}
+    cachedRecipes = getReusableCachedRecipes(logger, cache, ruleSetHash, args.noCache)
 
-    for recipe in recipes:
-        logger.info(f"Processing recipe {recipe.slug}")
+    staleSummaries = [s for s in summaries if not isCachedResultValid(cachedRecipes.get(s["id"]), s)]
 
-        results = analyseRecipeTags(logger, recipe, tagsToValidate, allTags, allCategories)
+    logger.info(f"{len(summaries) - len(staleSummaries)} cached recipe(s), "
+                f"{len(staleSummaries)} recipe(s) to validate")
 
-        issues = list(filter(lambda r: r.code != TagValidationResultCode.OK, results))
+    # Recipes edited within the HTTP cache's lifetime would otherwise be validated from their old body
+    recipes = [mealieApi.getRecipe(s["slug"], useCache=False) for s in staleSummaries]
+
+    workers = args.workers if args.workers > 0 else os.cpu_count()
 
-        if len(issues) > 0:
-            report[recipe.slug] = {
+    if args.backend == "matrix":
+        if workers > 1:
+            logger.warning("Matrix backend validates all recipes in a single process; ignoring workers")
+
+        validated = iter(validateRecipesAsMatrix(logger, recipes, engine))
+    elif workers > 1 and len(recipes) > 1:
+        validated = validateRecipesInParallel(
+            logger,
+            args.verbosity,
+            recipes,
+            workers,
+            engine,
+            ruleSet,
+            allTags,
+            allCategories
+        )
+    else:
+        validated = validateRecipes(logger, recipes, engine)
+
+    # Stale recipes are validated in the summaries' order, so their results are interleaved with
+    # the cached ones and each entry is written to the report as soon as it's known
+    # Results are recorded with the validated body's update time, in case the recipe changed again
+    # since its summary was fetched
+    staleUpdateAts = {s["id"]: r.updateAt for s, r in zip(staleSummaries, recipes, strict=True)}
+    currentRecipes = {}
+
+    with NdjsonReportWriter("tags-report.ndjson", args.dryRun) as reportWriter:
+        for summary in summaries:
+            if summary["id"] in staleUpdateAts:
+                _, recipeIssues = next(validated)
+                issues = [i.to_json() for i in recipeIssues]
+                updateAt = staleUpdateAts[summary["id"]]
+            else:
+                issues = cachedRecipes[summary["id"]]["issues"]
+                updateAt = summary.get("updateAt")
+
+            currentRecipes[summary["id"]] = {
+                "slug": summary["slug"],
+                "updateAt": updateAt,
                 "issues": issues
             }
 
-    logger.info("Writing output file")
+            writeTagsReportEntry(reportWriter, currentRecipes[summary["id"]])
+
+    logger.info("Writing output files")
+    reportWriter.finaliseAsObject("tags-report.json", keyField="slug")
+
+    delta = buildDeltaReport(previousRecipes, currentRecipes)
+
+    logger.info(f"Delta: {len(delta['new'])} recipe(s) with new issues, "
+                f"{len(delta['resolved'])} with resolved issues, "
+                f"{len(delta['changed'])} with changed issues")
 
     if args.dryRun:
-        logger.warning("[DRY RUN] Would've written report file")
+        logger.warning("[DRY RUN] Would've written delta report file")
     else:
-        with open("tags-report.json", mode="w", encoding="utf-8") as jsonFile:
-            jsonFile.write(
-                json.dumps(report, default=lambda o: o.__dict__, indent=2, ensure_ascii=False)
-            )
+        with open("tags-report-delta.json", mode="w", encoding="utf-8") as jsonFile:
+            jsonFile.write(json.dumps(delta, indent=2, ensure_ascii=False))
+
+    saveResultCache(
+        logger,
+        args.cachePath,
+        {
+            "ruleSetHash": ruleSetHash,
+            "recipes": currentRecipes
+        },
+        args.dryRun
+    )
+
+    if args.fix:
+        recipeIssues = (r for r in currentRecipes.values() if r["issues"])
+        fixes = planTagFixes(logger, recipeIssues, engine)
+        recipesBySlug = {r.slug: r for r in recipes}
+        applyTagFixes(logger, mealieApi, fixes, recipesBySlug, args.dryRun)
+
+    logRuleStats(logger, engine)
+
+    if args.watch:
+        watchRecipes(logger, args, mealieApi, engine, ruleSetHash, currentRecipes)
 
     logger.info("Processing completed!")
 
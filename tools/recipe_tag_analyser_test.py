@@ -1,7 +1,119 @@
+import logging
 import unittest
 
 from models.Recipe import Recipe, RecipeTag
-from recipe_tag_analyser import TagValidationResultCode, checkField, checkMutuallyExclusiveTags
+from requests import RequestException
+from recipe_tag_analyser import (
+    TagValidationResultCode,
+    applyTagFixes,
+    buildDeltaReport,
+    computeRuleSetHash,
+    getReusableCachedRecipes,
+    groupTagFixes,
+    isCachedResultValid,
+    planTagFixes,
+    refreshRecipes,
+    validateRecipes,
+    validateRecipesInParallel
+)
+from TagRuleEngine import TagRuleEngine
+from TagRuleMatrix import TagRuleMatrix
+
+
+def checkMutuallyExclusiveTags(recipe: Recipe,
+                               validatedTag: RecipeTag,
+                               realTags: list[RecipeTag],
+                               isMandatory: bool = False):
+    ruleSet = {
+        "rules": [
+            {
+                "tag": validatedTag.slug,
+                "type": "exclusive",
+                "mandatory": isMandatory,
+                "tags": [t.slug for t in realTags]
+            }
+        ]
+    }
+    engine = TagRuleEngine(logging.getLogger(), ruleSet, [validatedTag, *realTags], [])
+    return engine.validate(recipe)[0]
+
+
+def checkField(recipe: Recipe, validatedTag: RecipeTag, fieldName: str):
+    ruleSet = {
+        "rules": [
+            {
+                "tag": validatedTag.slug,
+                "type": "field",
+                "field": fieldName
+            }
+        ]
+    }
+    engine = TagRuleEngine(logging.getLogger(), ruleSet, [validatedTag], [])
+    return engine.validate(recipe)[0]
+
+
+# Missing recipes are returned as None like Mealie's 404s; failingSlugs fail like other errors
+class FakeMealieApi():
+    def __init__(self, recipes: list[Recipe] = None, failingSlugs: list[str] = None) -> None:
+        self.recipes = {r.slug: r for r in recipes or []}
+        self.failingSlugs = failingSlugs or []
+        self.calls = []
+
+    def getRecipe(self, recipeTitle: str, useCache: bool = True) -> Recipe:
+        self.calls.append(("getRecipe", recipeTitle))
+
+        if recipeTitle in self.failingSlugs:
+            raise RequestException(f"503 Server Error for recipe '{recipeTitle}'")
+
+        return self.recipes.get(recipeTitle)
+
+    def tagRecipe(self, recipeSlug: str, tags: list[RecipeTag]) -> None:
+        self.calls.append(("tagRecipe", recipeSlug, sorted(t.slug for t in tags)))
+
+    def bulkTagRecipes(self, recipeSlugs: list[str], tags: list[RecipeTag]) -> None:
+        self.calls.append(("bulkTagRecipes", sorted(recipeSlugs), sorted(t.slug for t in tags)))
+
+    def patchRecipes(self, patches: list[dict]) -> None:
+        self.calls.append(("patchRecipes", [(p["slug"], sorted(t["slug"] for t in p["tags"])) for p in patches]))
+
+
+def createRecipe(slug: str, tags: list[RecipeTag], id: str = None, updateAt: str = None) -> Recipe:
+    recipe = Recipe()
+    recipe.id = id
+    recipe.slug = slug
+    recipe.tags = tags
+    recipe.categories = []
+    recipe.recipeYield = "4"
+    recipe.tools = []
+    recipe.extras = {}
+    recipe.updateAt = updateAt
+    return recipe
+
+
+def createIssue(tag: RecipeTag, code: TagValidationResultCode) -> dict:
+    return {"tagName": tag.name, "code": code, "reason": None}
+
+
+# Fixable "field" rules for missing yield and missing tools tags, and a non-fixable rule
+yieldTag = RecipeTag("foo", "missing-yield", "Missing Yield")
+toolsTag = RecipeTag("bar", "missing-tools", "Missing Tools")
+duplicateTag = RecipeTag("baz", "duplicate", "Duplicate")
+fixRuleSet = {
+    "rules": [
+        {"tag": yieldTag.slug, "type": "field", "field": "recipeYield"},
+        {"tag": toolsTag.slug, "type": "field", "field": "tools"},
+        {
+            "tag": duplicateTag.slug,
+            "type": "checks",
+            "fixable": False,
+            "whenPresent": [{"if": ["!hasDuplicateExtras"], "code": "MISSING", "reason": "Missing extras"}]
+        }
+    ]
+}
+
+
+def createFixEngine() -> TagRuleEngine:
+    return TagRuleEngine(logging.getLogger(), fixRuleSet, [yieldTag, toolsTag, duplicateTag], [])
 
 
 class TestMutuallyExclusiveTags(unittest.TestCase):
@@ -87,6 +199,23 @@ class TestMutuallyExclusiveTags(unittest.TestCase):
         # Assert
         self.assertEqual(result.code, expectedResult, f"Expected code to be: {expectedResult}")
 
+    def test_whenConflictThenFoundTagsInRuleOrder(self):
+        # Arrange
+        expectedResult = "Tag 'Validated Tag' is present but also found tag(s): 'Real Tag A, Real Tag B'"
+        validatedTag = RecipeTag("foo", "validated-tag", "Validated Tag")
+        realTags = [
+            RecipeTag("bar", "real-tag-a", "Real Tag A"),
+            RecipeTag("baz", "real-tag-b", "Real Tag B")
+        ]
+        recipe = Recipe()
+        recipe.tags = [realTags[1], validatedTag, realTags[0]]
+
+        # Act
+        result = checkMutuallyExclusiveTags(recipe, validatedTag, realTags)
+
+        # Assert
+        self.assertEqual(result.reason, expectedResult, f"Expected reason to be: {expectedResult}")
+
 
 class TestField(unittest.TestCase):
     def test_whenTagAndFieldThenConflict(self):
@@ -146,3 +275,496 @@ class TestField(unittest.TestCase):
 
         # Assert
         self.assertEqual(result.code, expectedResult, f"Expected code to be: {expectedResult}")
+
+
+class TestTagRuleEngine(unittest.TestCase):
+    def test_whenChecksMatchThenFirstMatchingCheckWins(self):
+        # Arrange
+        expectedResult = TagValidationResultCode.Missing
+        validatedTag = RecipeTag("foo", "validated-tag", "Validated Tag")
+        ruleSet = {
+            "rules": [
+                {
+                    "tag": validatedTag.slug,
+                    "type": "checks",
+                    "whenAbsent": [
+                        {"if": ["!hasIngredients"], "code": "MISSING", "reason": "No ingredients"},
+                        {"if": ["!allIngredientsValid"], "code": "UNKNOWN", "reason": "Invalid"}
+                    ]
+                }
+            ]
+        }
+        recipe = Recipe()
+        recipe.tags = []
+        recipe.ingredients = []
+
+        # Act
+        engine = TagRuleEngine(logging.getLogger(), ruleSet, [validatedTag], [])
+        result = engine.validate(recipe)[0]
+
+        # Assert
+        self.assertEqual(result.code, expectedResult, f"Expected code to be: {expectedResult}")
+
+    def test_whenTagNotInCatalogueThenRuleSkipped(self):
+        # Arrange
+        ruleSet = {
+            "rules": [
+                {
+                    "tag": "validated-tag",
+                    "type": "field",
+                    "field": "recipeYield"
+                }
+            ]
+        }
+
+        # Act
+        engine = TagRuleEngine(logging.getLogger(), ruleSet, [], [])
+
+        # Assert
+        self.assertEqual(len(engine.rules), 0, "Expected no compiled rule")
+
+    def test_whenRuleRunsThenHitIsCounted(self):
+        # Arrange
+        validatedTag = RecipeTag("foo", "validated-tag", "Validated Tag")
+        ruleSet = {
+            "rules": [
+                {
+                    "tag": validatedTag.slug,
+                    "type": "field",
+                    "field": "recipeYield"
+                }
+            ]
+        }
+        recipe = Recipe()
+        recipe.tags = []
+        recipe.recipeYield = None
+
+        # Act
+        engine = TagRuleEngine(logging.getLogger(), ruleSet, [validatedTag], [])
+        engine.validate(recipe)
+        engine.validate(recipe)
+
+        # Assert
+        self.assertEqual(engine.rules[0].hits[TagValidationResultCode.Missing], 2, "Expected 2 hits")
+
+    def test_whenUnknownFactThenError(self):
+        # Arrange
+        validatedTag = RecipeTag("foo", "validated-tag", "Validated Tag")
+        ruleSet = {
+            "rules": [
+                {
+                    "tag": validatedTag.slug,
+                    "type": "checks",
+                    "whenPresent": [
+                        {"if": ["notAFact"], "code": "CONFLICT", "reason": "Conflict"}
+                    ]
+                }
+            ]
+        }
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            TagRuleEngine(logging.getLogger(), ruleSet, [validatedTag], [])
+
+
+class TestTagRuleMatrix(unittest.TestCase):
+    def test_whenValidatedThenSameIssuesAsEngine(self):
+        # Arrange
+        validatedTag = RecipeTag("foo", "validated-tag", "Validated Tag")
+        fieldTag = RecipeTag("baz", "field-tag", "Field Tag")
+        realTag = RecipeTag("bar", "real-tag", "Real Tag")
+        ruleSet = {
+            "rules": [
+                {
+                    "tag": validatedTag.slug,
+                    "type": "exclusive",
+                    "mandatory": True,
+                    "tags": [realTag.slug]
+                },
+                {
+                    "tag": fieldTag.slug,
+                    "type": "field",
+                    "field": "recipeYield"
+                }
+            ]
+        }
+        recipes = []
+
+        for tags, recipeYield in [([], None), ([validatedTag, realTag], "4"), ([fieldTag], "4"), ([realTag], None)]:
+            recipe = Recipe()
+            recipe.tags = tags
+            recipe.categories = []
+            recipe.recipeYield = recipeYield
+            recipes.append(recipe)
+
+        engine = TagRuleEngine(logging.getLogger(), ruleSet, [validatedTag, fieldTag, realTag], [])
+        expectedResult = [
+            [r.to_json() for r in engine.validate(recipe) if r.code != TagValidationResultCode.OK]
+            for recipe in recipes
+        ]
+
+        # Act
+        issues = TagRuleMatrix(logging.getLogger(), engine).validate(recipes)
+
+        # Assert
+        self.assertEqual([[i.to_json() for i in r] for r in issues], expectedResult, "Expected same issues")
+
+
+class TestTagFixes(unittest.TestCase):
+    def test_whenConflictAndMissingThenTagsRemovedAndAdded(self):
+        # Arrange
+        recipeIssues = [{
+            "slug": "recipe-a",
+            "issues": [createIssue(yieldTag, TagValidationResultCode.Conflict),
+                       createIssue(toolsTag, TagValidationResultCode.Missing)]
+        }]
+
+        # Act
+        fixes = planTagFixes(logging.getLogger(), recipeIssues, createFixEngine())
+
+        # Assert
+        self.assertEqual(fixes, {"recipe-a": {"add": [toolsTag], "remove": [yieldTag]}}, "Expected one fix")
+
+    def test_whenUnknownOrNotFixableThenNoFix(self):
+        # Arrange
+        recipeIssues = [
+            {"slug": "recipe-a", "issues": [createIssue(yieldTag, TagValidationResultCode.Unknown)]},
+            {"slug": "recipe-b", "issues": [createIssue(duplicateTag, TagValidationResultCode.Missing)]}
+        ]
+
+        # Act
+        fixes = planTagFixes(logging.getLogger(), recipeIssues, createFixEngine())
+
+        # Assert
+        self.assertEqual(fixes, {}, "Expected no fix")
+
+    def test_whenSameChangesThenGroupedTogether(self):
+        # Arrange
+        fixes = {
+            "recipe-a": {"add": [yieldTag, toolsTag], "remove": []},
+            "recipe-b": {"add": [toolsTag, yieldTag], "remove": []},
+            "recipe-c": {"add": [yieldTag], "remove": []},
+            "recipe-d": {"add": [yieldTag], "remove": [toolsTag]}
+        }
+
+        # Act
+        groups = groupTagFixes(fixes)
+
+        # Assert
+        self.assertEqual([g["recipes"] for g in groups], [["recipe-a", "recipe-b"], ["recipe-c"], ["recipe-d"]],
+                         "Expected recipes with the same changes in the same group")
+
+    def test_whenOnlyAdditionsThenSingleBulkCall(self):
+        # Arrange
+        mealieApi = FakeMealieApi()
+        fixes = {
+            "recipe-a": {"add": [yieldTag], "remove": []},
+            "recipe-b": {"add": [yieldTag], "remove": []}
+        }
+
+        # Act
+        applyTagFixes(logging.getLogger(), mealieApi, fixes, {}, isDryRun=False)
+
+        # Assert
+        self.assertEqual(mealieApi.calls, [("bulkTagRecipes", ["recipe-a", "recipe-b"], [yieldTag.slug])],
+                         "Expected a single bulk call")
+
+    def test_whenRemovalsThenSingleBulkPatch(self):
+        # Arrange
+        recipeA = createRecipe("recipe-a", [yieldTag], id="1")
+        recipeB = createRecipe("recipe-b", [yieldTag, duplicateTag], id="2")
+        mealieApi = FakeMealieApi([recipeB])
+        fixes = {
+            "recipe-a": {"add": [toolsTag], "remove": [yieldTag]},
+            "recipe-b": {"add": [toolsTag], "remove": [yieldTag]}
+        }
+
+        # Act
+        applyTagFixes(logging.getLogger(), mealieApi, fixes, {"recipe-a": recipeA}, isDryRun=False)
+
+        # Assert
+        self.assertEqual(mealieApi.calls, [
+            ("getRecipe", "recipe-b"),
+            ("patchRecipes", [
+                ("recipe-a", [toolsTag.slug]),
+                ("recipe-b", [duplicateTag.slug, toolsTag.slug])
+            ])
+        ], "Expected the group's recipes to be patched together")
+
+    def test_whenRecipeNotFoundThenSkipped(self):
+        # Arrange
+        recipeA = createRecipe("recipe-a", [yieldTag], id="1")
+        mealieApi = FakeMealieApi()
+        fixes = {
+            "recipe-a": {"add": [], "remove": [yieldTag]},
+            "recipe-b": {"add": [], "remove": [yieldTag]}
+        }
+
+        # Act
+        applyTagFixes(logging.getLogger(), mealieApi, fixes, {"recipe-a": recipeA}, isDryRun=False)
+
+        # Assert
+        self.assertEqual(mealieApi.calls, [
+            ("getRecipe", "recipe-b"),
+            ("patchRecipes", [("recipe-a", [])])
+        ], "Expected missing recipe to be skipped")
+
+    def test_whenDryRunThenNoTagsChanged(self):
+        # Arrange
+        recipeA = createRecipe("recipe-a", [yieldTag])
+        mealieApi = FakeMealieApi()
+        fixes = {
+            "recipe-a": {"add": [], "remove": [yieldTag]},
+            "recipe-b": {"add": [toolsTag], "remove": []}
+        }
+
+        # Act
+        applyTagFixes(logging.getLogger(), mealieApi, fixes, {"recipe-a": recipeA}, isDryRun=True)
+
+        # Assert
+        self.assertEqual(mealieApi.calls, [], "Expected no API call")
+
+
+class TestParallelValidation(unittest.TestCase):
+    def test_whenValidatedInParallelThenSameIssuesAsSerial(self):
+        # Arrange
+        recipes = [
+            createRecipe("recipe-a", []),
+            createRecipe("recipe-b", [yieldTag]),
+            createRecipe("recipe-c", [yieldTag, toolsTag, duplicateTag]),
+            createRecipe("recipe-d", [toolsTag]),
+            createRecipe("recipe-e", [duplicateTag])
+        ]
+        recipes[1].recipeYield = None
+        recipes[3].tools = ["knife"]
+        expectedResult = [
+            (slug, [i.to_json() for i in issues])
+            for slug, issues in validateRecipes(logging.getLogger(), recipes, createFixEngine())
+        ]
+
+        # Act
+        results = validateRecipesInParallel(
+            logging.getLogger(),
+            "WARNING",
+            recipes,
+            2,
+            createFixEngine(),
+            fixRuleSet,
+            [yieldTag, toolsTag, duplicateTag],
+            []
+        )
+
+        # Assert
+        self.assertEqual([(slug, [i.to_json() for i in issues]) for slug, issues in results], expectedResult,
+                         "Expected same issues per recipe as the serial validation")
+
+
+def createEntry(slug: str, updateAt: str, issues: list[dict]) -> dict:
+    return {"slug": slug, "updateAt": updateAt, "issues": issues}
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    def test_whenIssuesDifferThenNewResolvedAndChanged(self):
+        # Arrange
+        conflict = createIssue(yieldTag, TagValidationResultCode.Conflict)
+        missing = createIssue(yieldTag, TagValidationResultCode.Missing)
+        toolsMissing = createIssue(toolsTag, TagValidationResultCode.Missing)
+        previousRecipes = {
+            "1": createEntry("recipe-a", "2024-01-01", [conflict]),
+            "2": createEntry("recipe-b", "2024-01-01", [toolsMissing]),
+            "3": createEntry("recipe-c", "2024-01-01", [conflict])
+        }
+        currentRecipes = {
+            "1": createEntry("recipe-a", "2024-01-02", [missing, toolsMissing]),
+            "2": createEntry("recipe-b", "2024-01-02", []),
+            "3": createEntry("recipe-c", "2024-01-01", [conflict]),
+            "4": createEntry("recipe-d", "2024-01-02", [missing])
+        }
+        expectedResult = {
+            "new": {"recipe-a": [toolsMissing], "recipe-d": [missing]},
+            "resolved": {"recipe-b": [toolsMissing]},
+            "changed": {"recipe-a": [{"before": conflict, "after": missing}]}
+        }
+
+        # Act
+        delta = buildDeltaReport(previousRecipes, currentRecipes)
+
+        # Assert
+        self.assertEqual(delta, expectedResult, "Expected new, resolved and changed issues")
+
+    def test_whenRecipeDeletedThenIssuesResolved(self):
+        # Arrange
+        conflict = createIssue(yieldTag, TagValidationResultCode.Conflict)
+        previousRecipes = {"1": createEntry("recipe-a", "2024-01-01", [conflict])}
+
+        # Act
+        delta = buildDeltaReport(previousRecipes, {})
+
+        # Assert
+        self.assertEqual(delta["resolved"], {"recipe-a": [conflict]}, "Expected deleted recipe's issues to be resolved")
+
+    def test_whenRuleSetChangedThenCacheNotReused(self):
+        # Arrange
+        cachedRecipes = {"1": createEntry("recipe-a", "2024-01-01", [])}
+        previousHash = computeRuleSetHash(fixRuleSet, [yieldTag, toolsTag, duplicateTag], [])
+        changedRuleSet = {"rules": fixRuleSet["rules"][:2]}
+        cache = {"ruleSetHash": previousHash, "recipes": cachedRecipes}
+
+        # Act
+        ruleSetHash = computeRuleSetHash(changedRuleSet, [yieldTag, toolsTag, duplicateTag], [])
+        reusedRecipes = getReusableCachedRecipes(logging.getLogger(), cache, ruleSetHash, isCacheDisabled=False)
+
+        # Assert
+        self.assertNotEqual(ruleSetHash, previousHash, "Expected a different rule set hash")
+        self.assertEqual(reusedRecipes, {}, "Expected no cached recipe to be reused")
+
+    def test_whenTagsChangedThenCacheNotReused(self):
+        # Arrange
+        renamedTag = RecipeTag(yieldTag.id, yieldTag.slug, "Renamed")
+
+        # Act
+        previousHash = computeRuleSetHash(fixRuleSet, [yieldTag], [])
+        ruleSetHash = computeRuleSetHash(fixRuleSet, [renamedTag], [])
+
+        # Assert
+        self.assertNotEqual(ruleSetHash, previousHash, "Expected a different rule set hash")
+
+    def test_whenSameRuleSetThenCacheReused(self):
+        # Arrange
+        cachedRecipes = {"1": createEntry("recipe-a", "2024-01-01", [])}
+        ruleSetHash = computeRuleSetHash(fixRuleSet, [yieldTag, toolsTag, duplicateTag], [])
+        cache = {"ruleSetHash": ruleSetHash, "recipes": cachedRecipes}
+
+        # Act
+        reusedRecipes = getReusableCachedRecipes(logging.getLogger(), cache, ruleSetHash, isCacheDisabled=False)
+
+        # Assert
+        self.assertEqual(reusedRecipes, cachedRecipes, "Expected cached recipes to be reused")
+
+    def test_whenCacheDisabledThenCacheNotReused(self):
+        # Arrange
+        ruleSetHash = computeRuleSetHash(fixRuleSet, [], [])
+        cache = {"ruleSetHash": ruleSetHash, "recipes": {"1": createEntry("recipe-a", "2024-01-01", [])}}
+
+        # Act
+        reusedRecipes = getReusableCachedRecipes(logging.getLogger(), cache, ruleSetHash, isCacheDisabled=True)
+
+        # Assert
+        self.assertEqual(reusedRecipes, {}, "Expected no cached recipe to be reused")
+
+    def test_whenUpdateAtChangedThenCachedResultInvalid(self):
+        # Arrange
+        cachedRecipe = createEntry("recipe-a", "2024-01-01T10:00:00", [])
+
+        # Act & Assert
+        self.assertTrue(isCachedResultValid(cachedRecipe, {"updateAt": "2024-01-01T10:00:00"}),
+                        "Expected result of unchanged recipe to be valid")
+        self.assertFalse(isCachedResultValid(cachedRecipe, {"updateAt": "2024-01-02T10:00:00"}),
+                         "Expected result of updated recipe to be invalid")
+        self.assertFalse(isCachedResultValid(cachedRecipe, {"updateAt": None}),
+                         "Expected result of recipe without update time to be invalid")
+        self.assertFalse(isCachedResultValid(None, {"updateAt": "2024-01-01T10:00:00"}),
+                         "Expected uncached recipe to be invalid")
+
+
+class TestRefreshRecipes(unittest.TestCase):
+    def test_whenRecipeUpdatedThenValidatedAgain(self):
+        # Arrange
+        previousEntry = createEntry("recipe-a", "2024-01-01", [])
+        currentRecipes = {"1": previousEntry}
+        recipe = createRecipe("recipe-a", [yieldTag], id="1", updateAt="2024-01-02")
+        mealieApi = FakeMealieApi([recipe])
+        changes = [{"id": "1", "slug": "recipe-a", "updateAt": "2024-01-02"}]
+
+        # Act
+        previousEntries, updatedEntries, recipes = refreshRecipes(
+            logging.getLogger(), mealieApi, createFixEngine(), changes, currentRecipes
+        )
+
+        # Assert
+        self.assertEqual(previousEntries, {"1": previousEntry}, "Expected entry before the update")
+        self.assertEqual(updatedEntries["1"]["updateAt"], "2024-01-02", "Expected updated entry")
+        self.assertEqual([i["tagName"] for i in updatedEntries["1"]["issues"]], [yieldTag.name, toolsTag.name],
+                         "Expected recipe's new issues")
+        self.assertIs(currentRecipes["1"], updatedEntries["1"], "Expected current recipes to be updated")
+        self.assertEqual(recipes, [recipe], "Expected fetched recipe")
+
+    def test_whenRecipeDeletedThenRemovedBySlug(self):
+        # Arrange
+        previousEntry = createEntry("recipe-a", "2024-01-01", [])
+        currentRecipes = {"1": previousEntry, "2": createEntry("recipe-b", "2024-01-01", [])}
+        mealieApi = FakeMealieApi()
+        changes = [{"slug": "recipe-a", "isDeleted": True}]
+
+        # Act
+        previousEntries, updatedEntries, recipes = refreshRecipes(
+            logging.getLogger(), mealieApi, createFixEngine(), changes, currentRecipes
+        )
+
+        # Assert
+        self.assertEqual(previousEntries, {"1": previousEntry}, "Expected deleted recipe's entry")
+        self.assertEqual(updatedEntries, {}, "Expected no updated entry")
+        self.assertEqual(list(currentRecipes.keys()), ["2"], "Expected deleted recipe to be removed")
+        self.assertEqual(mealieApi.calls, [], "Expected no API call")
+
+    def test_whenRecipeNotFoundThenRemoved(self):
+        # Arrange
+        currentRecipes = {"1": createEntry("recipe-a", "2024-01-01", [])}
+        mealieApi = FakeMealieApi()
+        changes = [{"slug": "recipe-a", "isDeleted": False}]
+
+        # Act
+        previousEntries, _, _ = refreshRecipes(logging.getLogger(), mealieApi, createFixEngine(), changes, currentRecipes)
+
+        # Assert
+        self.assertEqual(list(previousEntries.keys()), ["1"], "Expected missing recipe to be treated as deleted")
+        self.assertEqual(currentRecipes, {}, "Expected missing recipe to be removed")
+
+    def test_whenUpdateAtUnchangedThenSkipped(self):
+        # Arrange
+        currentRecipes = {"1": createEntry("recipe-a", "2024-01-01", [])}
+        mealieApi = FakeMealieApi([createRecipe("recipe-a", [], id="1", updateAt="2024-01-01")])
+        changes = [{"id": "1", "slug": "recipe-a", "updateAt": "2024-01-01"}]
+
+        # Act
+        previousEntries, updatedEntries, recipes = refreshRecipes(
+            logging.getLogger(), mealieApi, createFixEngine(), changes, currentRecipes
+        )
+
+        # Assert
+        self.assertEqual((previousEntries, updatedEntries, recipes), ({}, {}, []), "Expected nothing refreshed")
+        self.assertEqual(mealieApi.calls, [], "Expected no API call")
+
+    def test_whenRecipeRequestFailsThenRecipeKept(self):
+        # Arrange
+        previousEntry = createEntry("recipe-a", "2024-01-01", [])
+        currentRecipes = {"1": previousEntry}
+        mealieApi = FakeMealieApi(failingSlugs=["recipe-a"])
+        changes = [{"slug": "recipe-a", "isDeleted": False}]
+
+        # Act & Assert
+        with self.assertRaises(RequestException):
+            refreshRecipes(logging.getLogger(), mealieApi, createFixEngine(), changes, currentRecipes)
+
+        self.assertEqual(currentRecipes, {"1": previousEntry}, "Expected recipe not to be removed")
+
+    def test_whenLaterRequestFailsThenNoChangeApplied(self):
+        # Arrange
+        currentRecipes = {
+            "1": createEntry("recipe-a", "2024-01-01", []),
+            "2": createEntry("recipe-b", "2024-01-01", [])
+        }
+        expectedRecipes = dict(currentRecipes)
+        mealieApi = FakeMealieApi([createRecipe("recipe-a", [yieldTag], id="1", updateAt="2024-01-02")],
+                                  failingSlugs=["recipe-c"])
+        changes = [
+            {"slug": "recipe-a", "isDeleted": False},
+            {"slug": "recipe-b", "isDeleted": True},
+            {"slug": "recipe-c", "isDeleted": False}
+        ]
+
+        # Act & Assert
+        with self.assertRaises(RequestException):
+            refreshRecipes(logging.getLogger(), mealieApi, createFixEngine(), changes, currentRecipes)
+
+        self.assertEqual(currentRecipes, expectedRecipes, "Expected current recipes to be left untouched")